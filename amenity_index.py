@@ -0,0 +1,209 @@
+"""
+Amenity bitsets: each listing's has_* amenity flags packed into two uint64
+words, with popcount Jaccard similarity search and required-amenity filters
+over the whole dataset
+
+A listing costs 16 bytes instead of one int64 column per amenity, and a
+query is a handful of vectorised AND/OR/popcount passes over two words per
+listing, so millions of listings are searched in milliseconds.
+
+Run with: python amenity_index.py --amenities "Wifi, Kitchen, Hot tub, Free parking" --top 10
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import preprocessing
+
+TRAINING_DATA_PATH = 'airbnb_processed_data.csv'
+
+# Bit order: the extractor's amenity categories, then flags that only the
+# processed training data has (from an earlier extractor)
+EXTRACTED_FLAGS = [f'has_{amenity}' for category in preprocessing.all_amenity_categories.values() for amenity in category]
+LEGACY_FLAGS = ['has_breakfast', 'has_cable_tv', 'has_internet', 'has_wireless_internet', 'has_self_check_in',
+                'has_keypad']
+AMENITY_FLAGS = EXTRACTED_FLAGS + LEGACY_FLAGS
+BIT_OF = {flag: bit for bit, flag in enumerate(AMENITY_FLAGS)}
+
+WORDS = 2
+assert len(AMENITY_FLAGS) <= WORDS * 64
+
+# Listings scanned per step; keeps a query's temporaries in cache
+CHUNK_ROWS = 65536
+
+if hasattr(np, 'bitwise_count'):
+    _popcount = np.bitwise_count
+else:
+    # Fallback for NumPy < 2.0: per-byte lookup table
+    _BYTE_COUNTS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def _popcount(words):
+        counts = _BYTE_COUNTS[words.view(np.uint8)].reshape(*words.shape, 8)
+        return counts.sum(axis=-1, dtype=np.uint8)
+
+# Packing
+
+
+def pack_flags(flags):
+    """
+    Pack a (listings x len(AMENITY_FLAGS)) boolean matrix into bitsets
+
+    Returns:
+        C-contiguous (listings x WORDS) uint64 array; bit i of the 128-bit
+        little-endian value is AMENITY_FLAGS[i]
+    """
+    flags = np.asarray(flags, dtype=bool)
+    padded = np.zeros((len(flags), WORDS * 64), dtype=bool)
+    padded[:, :flags.shape[1]] = flags
+    return np.ascontiguousarray(np.packbits(padded, axis=1, bitorder='little').view('<u8'))
+
+def unpack_bits(bits):
+    """Boolean (listings x len(AMENITY_FLAGS)) matrix from bitsets"""
+    bits = np.ascontiguousarray(bits, dtype='<u8')
+    return np.unpackbits(bits.view(np.uint8), axis=1, bitorder='little')[:, :len(AMENITY_FLAGS)].astype(bool)
+
+def flag_bits(flags):
+    """Bitset (WORDS uint64 words) with the named has_* flags set"""
+    row = np.zeros((1, len(AMENITY_FLAGS)), dtype=bool)
+    for flag in flags:
+        if flag not in BIT_OF:
+            raise ValueError(f"Unknown amenity flag: {flag}")
+        row[0, BIT_OF[flag]] = True
+    return pack_flags(row)[0]
+
+def amenity_bits(amenities_str):
+    """Bitset for a raw amenities string, using the app's amenity matching"""
+    features = preprocessing.extract_all_amenity_features(amenities_str, include=set(AMENITY_FLAGS))
+    return flag_bits(flag for flag in AMENITY_FLAGS if features.get(flag))
+
+# Index
+
+
+class AmenityIndex:
+    """
+    Packed amenity bitsets for a set of listings with precomputed popcounts
+
+    Bitsets are stored word-major (one contiguous uint64 array per word) and
+    scanned in cache-sized chunks, so a query streams through memory once
+    without allocating dataset-sized temporaries. Similarity is Jaccard over
+    amenity sets: |a & b| / (|a| + |b| - |a & b|).
+    """
+
+    def __init__(self, bits, ids=None):
+        bits = np.asarray(bits, dtype=np.uint64)
+        self.words = np.ascontiguousarray(bits.T)
+        self.counts = _popcount(bits).sum(axis=1, dtype=np.uint8)
+        self.ids = np.arange(len(bits)) if ids is None else np.asarray(ids)
+
+    def __len__(self):
+        return self.words.shape[1]
+
+    @property
+    def bits(self):
+        """(listings x WORDS) view of the bitsets"""
+        return self.words.T
+
+    @property
+    def nbytes(self):
+        return self.words.nbytes + self.counts.nbytes
+
+    @classmethod
+    def from_processed(cls, data):
+        """Index over the has_* columns of the processed training data (absent flags are unset)"""
+        flags = data.reindex(columns=AMENITY_FLAGS, fill_value=0).to_numpy() != 0
+        return cls(pack_flags(flags), data.index.to_numpy())
+
+    @classmethod
+    def from_amenities(cls, amenities, ids=None):
+        """Index over raw amenities strings"""
+        return cls(np.stack([amenity_bits(value) for value in amenities]) if len(amenities) else
+                   np.empty((0, WORDS), dtype=np.uint64), ids)
+
+    def _chunks(self):
+        for lo in range(0, len(self), CHUNK_ROWS):
+            yield lo, min(lo + CHUNK_ROWS, len(self))
+
+    def _jaccard(self, query, query_count, lo, hi):
+        shared = _popcount(self.words[0, lo:hi] & query[0])
+        for word in range(1, WORDS):
+            shared += _popcount(self.words[word, lo:hi] & query[word])
+        union = (self.counts[lo:hi] + query_count - shared).astype(np.float32)
+        return np.divide(shared, union, out=np.ones(hi - lo, dtype=np.float32), where=union > 0)
+
+    def _matching(self, required_bits, excluded_bits, lo, hi):
+        mask = np.ones(hi - lo, dtype=bool)
+        for word in range(WORDS):
+            if required_bits[word]:
+                mask &= (self.words[word, lo:hi] & required_bits[word]) == required_bits[word]
+            if excluded_bits[word]:
+                mask &= (self.words[word, lo:hi] & excluded_bits[word]) == 0
+        return mask
+
+    def jaccard(self, query):
+        """float32 Jaccard similarity of every listing to a query bitset (1 when both are empty)"""
+        query_count = np.uint8(_popcount(query).sum())
+        out = np.empty(len(self), dtype=np.float32)
+        for lo, hi in self._chunks():
+            out[lo:hi] = self._jaccard(query, query_count, lo, hi)
+        return out
+
+    def matching(self, required=(), excluded=()):
+        """Boolean mask of listings with every required flag and none of the excluded ones"""
+        required_bits, excluded_bits = flag_bits(required), flag_bits(excluded)
+        out = np.empty(len(self), dtype=bool)
+        for lo, hi in self._chunks():
+            out[lo:hi] = self._matching(required_bits, excluded_bits, lo, hi)
+        return out
+
+    def most_similar(self, query, k=10, required=(), excluded=()):
+        """
+        The k listings whose amenities are most similar to a query bitset,
+        optionally only among those with every required and no excluded flag
+
+        Each chunk keeps its own k best, so only those are ranked at the end.
+
+        Returns:
+            (ids, similarities), most similar first
+        """
+        query_count = np.uint8(_popcount(query).sum())
+        filtered = bool(required or excluded)
+        required_bits, excluded_bits = flag_bits(required), flag_bits(excluded)
+        positions, similarities = [], []
+        for lo, hi in self._chunks():
+            similarity = self._jaccard(query, query_count, lo, hi)
+            if filtered:
+                similarity[~self._matching(required_bits, excluded_bits, lo, hi)] = -1
+            best = np.argpartition(similarity, len(similarity) - k)[-k:] if len(similarity) > k else np.arange(len(similarity))
+            positions.append(best + lo)
+            similarities.append(similarity[best])
+
+        positions = np.concatenate(positions) if positions else np.empty(0, dtype=np.int64)
+        similarities = np.concatenate(similarities) if similarities else np.empty(0, dtype=np.float32)
+        order = np.lexsort((positions, -similarities))[:k]
+        order = order[similarities[order] >= 0]
+        return self.ids[positions[order]], similarities[order]
+
+
+def load_amenity_index(data_path=TRAINING_DATA_PATH):
+    """Amenity index over the processed listings"""
+    return AmenityIndex.from_processed(pd.read_csv(data_path))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--amenities', default='Wifi, Kitchen, Heating, TV, Washer')
+    parser.add_argument('--require', nargs='*', default=[], help="has_* flags every result must have")
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    data = pd.read_csv(TRAINING_DATA_PATH)
+    index = AmenityIndex.from_processed(data)
+    query = amenity_bits(args.amenities)
+    print(f"query: {', '.join(np.array(AMENITY_FLAGS)[unpack_bits(query[None, :])[0]])}")
+    ids, similarity = index.most_similar(query, args.top, required=args.require)
+    print(f"{len(index):,} listings, {index.nbytes / 1024:.0f} KB; "
+          f"{index.matching(args.require).sum():,} have {args.require or 'no requirement'}")
+    for listing, value in zip(ids, similarity):
+        print(f"  listing {listing}: Jaccard {value:.2f}, £{data.loc[listing, 'price']:.0f}")
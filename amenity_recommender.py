@@ -0,0 +1,267 @@
+"""
+Amenity upgrade recommendations mined from the listings data
+
+An offline job measures, for every segment (neighbourhood x room type, with
+room type and whole-market fallbacks) and every amenity, how many comparable
+listings offer it, which amenity it most often comes with, and the price
+uplift of listings that have it over listings that do not. The uplift is
+compared within strata of capacity and amenity count, so an amenity is not
+credited with the premium of larger, better-equipped listings, and small
+segments are shrunk towards their parent segment.
+
+The best candidates per segment are saved as a small lookup table; at
+request time a recommendation is a dict lookup plus one bit test per
+candidate.
+
+Run with: python amenity_recommender.py
+"""
+
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import amenity_index
+import market
+import preprocessing
+
+TRAINING_DATA_PATH = 'airbnb_processed_data.csv'
+UPGRADES_PATH = 'amenity_upgrades.pkl'
+
+# Most to least specific; requests fall back until a segment was mined
+SEGMENT_LEVELS = [('neighbourhood', 'room_type'), ('room_type',), ()]
+MIN_SEGMENT_LISTINGS = 30
+
+# Listings needed on each side of a within-stratum comparison
+MIN_STRATUM_LISTINGS = 2
+# Listings with the amenity needed before it can be recommended in a segment
+MIN_SUPPORT = 8
+# Comparison weight at which a segment's own estimate counts as much as its parent's
+SHRINKAGE_WEIGHT = 20.0
+# Co-occurrence over chance needed to name an amenity's companion
+MIN_COMPANION_LIFT = 1.2
+# Amenity count bands (roughly the training data's terciles), so listings are
+# compared with similarly equipped ones
+AMENITY_COUNT_EDGES = [30, 42]
+
+# Candidates kept per segment; more than are shown, since a listing may already have some
+TOP_CANDIDATES = 8
+
+ENTRY_DTYPE = np.dtype([('amenity', 'u1'), ('uplift', 'f4'), ('support', '<i4'), ('adoption', 'f4'),
+                        ('companion', 'i1')])
+
+
+LABEL_WORDS = {'tv': 'TV', 'bbq': 'BBQ', 'ev': 'EV', 'wifi': 'WiFi'}
+
+
+def amenity_label(flag):
+    """has_free_parking -> Free Parking"""
+    return ' '.join(LABEL_WORDS.get(word, word.title()) for word in flag[len('has_'):].split('_'))
+
+# Mining
+
+
+def stratum_ids(data, segments):
+    """Capacity bucket x amenity count band per listing"""
+    counts = np.searchsorted(AMENITY_COUNT_EDGES, data['amenities_count'].to_numpy(), side='right')
+    return segments['capacity'].to_numpy() * (len(AMENITY_COUNT_EDGES) + 1) + counts
+
+def conditional_uplift(flags, log_price, strata):
+    """
+    Log-price difference between listings with and without each amenity,
+    averaged over strata where both sides have MIN_STRATUM_LISTINGS listings
+
+    Each stratum is weighted by n_with * n_without / (n_with + n_without),
+    the inverse variance of a difference of means.
+
+    Returns:
+        (uplift in log price, total weight, listings with the amenity in
+        the compared strata), one value per amenity
+    """
+    strata_onehot = np.zeros((len(strata), strata.max() + 1))
+    strata_onehot[np.arange(len(strata)), strata] = 1
+    flags = flags.astype(np.float64)
+
+    n_with = strata_onehot.T @ flags
+    n_without = strata_onehot.sum(axis=0)[:, None] - n_with
+    sum_with = strata_onehot.T @ (flags * log_price[:, None])
+    sum_without = (strata_onehot.T @ log_price)[:, None] - sum_with
+
+    valid = (n_with >= MIN_STRATUM_LISTINGS) & (n_without >= MIN_STRATUM_LISTINGS)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        difference = np.where(valid, sum_with / n_with - sum_without / n_without, 0.0)
+        weight = np.where(valid, n_with * n_without / (n_with + n_without), 0.0)
+    total_weight = weight.sum(axis=0)
+    uplift = np.divide((weight * difference).sum(axis=0), total_weight,
+                       out=np.zeros(flags.shape[1]), where=total_weight > 0)
+    return uplift, total_weight, np.where(valid, n_with, 0).sum(axis=0)
+
+def companions(flags):
+    """
+    For each amenity a, the amenity b most often offered alongside it,
+    P(b | a), among those it co-occurs with more than chance
+    (lift P(b | a) / P(b) >= MIN_COMPANION_LIFT) at least MIN_SUPPORT times
+
+    Returns:
+        int array of amenity positions (-1 where none qualifies)
+    """
+    flags = flags.astype(np.float64)
+    together = flags.T @ flags
+    n = np.diag(together)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        conditional = together / n[:, None]
+        lift = conditional * len(flags) / n[None, :]
+    qualifies = (together >= MIN_SUPPORT) & (lift >= MIN_COMPANION_LIFT) & ~np.eye(len(n), dtype=bool)
+    conditional = np.where(qualifies, conditional, 0)
+    return np.where(qualifies.any(axis=1), conditional.argmax(axis=1), -1)
+
+def mine_upgrades(data, candidate_flags=None, city=preprocessing.MANCHESTER):
+    """
+    Upgrade candidates for every segment with enough listings
+
+    Segment estimates are shrunk towards the parent level's:
+    (w * own + SHRINKAGE_WEIGHT * parent) / (w + SHRINKAGE_WEIGHT). city
+    (a preprocessing.City) names the whole-market segment.
+
+    Returns:
+        UpgradeTable
+    """
+    if candidate_flags is None:
+        candidate_flags = [flag for flag in amenity_index.EXTRACTED_FLAGS if flag in data.columns]
+    segments = market.decode_segments(data)
+    flags = data[candidate_flags].to_numpy() != 0
+    log_price = np.log(data['price'].to_numpy(dtype=np.float64))
+    strata = stratum_ids(data, segments)
+
+    estimates = {}
+    entries = {}
+    # Coarsest level first so every segment's parent estimate exists; small
+    # segments still get one for their children but are not stored
+    for depth, level in reversed(list(enumerate(SEGMENT_LEVELS))):
+        groups = segments.groupby(list(level)).indices if level else {(): np.arange(len(data))}
+        for key, rows in groups.items():
+            key = key if isinstance(key, tuple) else (key,)
+            uplift, weight, support = conditional_uplift(flags[rows], log_price[rows], strata[rows])
+            if level:
+                parent_level = SEGMENT_LEVELS[depth + 1]
+                parent = estimates[(parent_level, tuple(key[level.index(f)] for f in parent_level))]
+                uplift = (weight * uplift + SHRINKAGE_WEIGHT * parent) / (weight + SHRINKAGE_WEIGHT)
+            estimates[(level, key)] = uplift
+            if len(rows) < MIN_SEGMENT_LISTINGS:
+                continue
+
+            eligible = np.flatnonzero((support >= MIN_SUPPORT) & (uplift > 0))
+            best = eligible[np.argsort(-uplift[eligible], kind='stable')][:TOP_CANDIDATES]
+            segment_entries = np.zeros(len(best), dtype=ENTRY_DTYPE)
+            segment_entries['amenity'] = best
+            segment_entries['uplift'] = np.expm1(uplift[best])
+            segment_entries['support'] = support[best]
+            segment_entries['adoption'] = flags[rows][:, best].mean(axis=0)
+            segment_entries['companion'] = companions(flags[rows])[best]
+            entries[(level, key)] = segment_entries
+
+    return UpgradeTable(candidate_flags, entries, city.name)
+
+# Lookup table
+
+
+class UpgradeTable:
+    """
+    Ranked upgrade candidates per segment in one structured array
+
+    segments maps (level, key) to a slice of entries; entries hold the
+    amenity position in flags, the relative uplift, listings with the
+    amenity, share of the segment offering it and its companion amenity.
+    """
+
+    # Market the table was mined from (tables saved without one are Manchester's)
+    city_name = preprocessing.MANCHESTER.name
+
+    def __init__(self, flags, segment_entries, city_name=preprocessing.MANCHESTER.name):
+        self.flags = list(flags)
+        self.city_name = city_name
+        self.bits = np.array([amenity_index.BIT_OF[flag] for flag in self.flags])
+        self.segments = {}
+        offset = 0
+        for segment, rows in segment_entries.items():
+            self.segments[segment] = (offset, offset + len(rows))
+            offset += len(rows)
+        self.entries = (np.concatenate(list(segment_entries.values())) if segment_entries
+                        else np.zeros(0, dtype=ENTRY_DTYPE))
+
+    @property
+    def nbytes(self):
+        return self.entries.nbytes
+
+    def segment(self, neighbourhood, room_type):
+        """(level, key) of the most specific mined segment"""
+        values = {'neighbourhood': neighbourhood, 'room_type': room_type}
+        for level in SEGMENT_LEVELS:
+            key = tuple(values[f] for f in level)
+            if (level, key) in self.segments:
+                return level, key
+
+    def recommend(self, neighbourhood, room_type, listing_bits, price, limit=5):
+        """
+        Amenity upgrades for a listing, best first
+
+        Args:
+            listing_bits: the listing's amenity bitset (amenity_index.amenity_bits)
+            price: the listing's predicted nightly price, which uplifts scale
+
+        Returns:
+            list of dicts with flag, amenity, uplift (fraction), uplift_gbp,
+            support, adoption, companion (label or None) and segment
+        """
+        level, key = self.segment(neighbourhood, room_type)
+        start, stop = self.segments[(level, key)]
+        label = ', '.join(key) if key else f'all {self.city_name} listings'
+        words = np.asarray(listing_bits, dtype=np.uint64)
+
+        upgrades = []
+        for entry in self.entries[start:stop]:
+            bit = self.bits[entry['amenity']]
+            if (int(words[bit // 64]) >> (bit % 64)) & 1:
+                continue
+            companion = self.flags[entry['companion']] if entry['companion'] >= 0 else None
+            upgrades.append({
+                'flag': self.flags[entry['amenity']],
+                'amenity': amenity_label(self.flags[entry['amenity']]),
+                'uplift': float(entry['uplift']),
+                'uplift_gbp': float(price * entry['uplift']),
+                'support': int(entry['support']),
+                'adoption': float(entry['adoption']),
+                'companion': amenity_label(companion) if companion else None,
+                'segment': label
+            })
+            if len(upgrades) == limit:
+                break
+        return upgrades
+
+
+def load_upgrade_table(path=UPGRADES_PATH, data_path=TRAINING_DATA_PATH):
+    """Load the mined upgrade table, mining and saving it if missing"""
+    if os.path.exists(path):
+        return joblib.load(path)
+    table = mine_upgrades(pd.read_csv(data_path))
+    joblib.dump(table, path)
+    return table
+
+
+if __name__ == "__main__":
+    # Mine through the importable module so the pickled table does not reference __main__
+    import amenity_recommender
+    data = pd.read_csv(TRAINING_DATA_PATH)
+    table = amenity_recommender.mine_upgrades(data)
+    joblib.dump(table, UPGRADES_PATH)
+    print(f"{len(table.segments)} segments, {len(table.entries)} candidates ({table.nbytes / 1024:.1f} KB) "
+          f"saved to {UPGRADES_PATH}")
+
+    neighbourhood = sys.argv[1] if len(sys.argv) > 1 else 'City Centre'
+    room_type = sys.argv[2] if len(sys.argv) > 2 else 'Entire home/apt'
+    for upgrade in table.recommend(neighbourhood, room_type, amenity_index.amenity_bits('Wifi, Kitchen'), 100.0):
+        print(f"  {upgrade['amenity']}: {upgrade['uplift']:+.1%} (£{upgrade['uplift_gbp']:.0f} on £100), "
+              f"{upgrade['support']} listings, offered by {upgrade['adoption']:.0%} in {upgrade['segment']}"
+              + (f", usually with {upgrade['companion']}" if upgrade['companion'] else ''))
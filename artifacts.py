@@ -0,0 +1,98 @@
+"""
+Deployable artifact bundles: model, scaler, feature columns and defaults
+saved together with a manifest describing how they were produced
+"""
+
+import json
+import os
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import joblib
+
+import audit_log
+
+# Bundle file name -> field; the root directory holds the original deployment
+BUNDLE_FILES = {
+    'model': 'model.pkl',
+    'scaler': 'scaler.pkl',
+    'feature_columns': 'feature_columns.pkl',
+    'defaults': 'feature_defaults.pkl'
+}
+
+LEGACY_FILES = {
+    'model': 'original_airbnb_model.pkl',
+    'scaler': 'original_scaler.pkl',
+    'feature_columns': 'original_feature_columns.pkl',
+    'defaults': 'feature_defaults.pkl'
+}
+
+MANIFEST_FILE = 'manifest.json'
+
+Bundle = namedtuple('Bundle', ['model', 'scaler', 'feature_columns', 'defaults', 'manifest'])
+
+
+def bundle_paths(path=None):
+    """File path for every artifact in a bundle directory (None is the legacy root layout)"""
+    if path is None:
+        return dict(LEGACY_FILES)
+    return {field: os.path.join(path, name) for field, name in BUNDLE_FILES.items()}
+
+def save_bundle(path, model, scaler, feature_columns, defaults, metadata=None):
+    """
+    Write a bundle directory with a manifest of file versions
+
+    Args:
+        path: bundle directory (created if missing)
+        model, scaler, feature_columns, defaults: artifacts to deploy
+        metadata: JSON-serialisable details (params, scores, data version)
+
+    Returns:
+        the manifest dict
+    """
+    os.makedirs(path, exist_ok=True)
+    paths = bundle_paths(path)
+    artifacts = {'model': model, 'scaler': scaler, 'feature_columns': list(feature_columns), 'defaults': defaults}
+    for field, value in artifacts.items():
+        joblib.dump(value, paths[field])
+
+    manifest = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'n_features': len(feature_columns),
+        'files': {field: {'name': BUNDLE_FILES[field], 'version': audit_log.file_version(paths[field])}
+                  for field in BUNDLE_FILES},
+        'metadata': metadata or {}
+    }
+    with open(os.path.join(path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def load_bundle(path=None):
+    """
+    Load a bundle directory, or the legacy root artifacts when path is None
+
+    Raises:
+        ValueError if a file no longer matches the version in its manifest
+    """
+    paths = bundle_paths(path)
+    manifest = {}
+    manifest_path = os.path.join(path, MANIFEST_FILE) if path is not None else None
+
+    if manifest_path and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        for field, entry in manifest['files'].items():
+            if audit_log.file_version(paths[field]) != entry['version']:
+                raise ValueError(f"{paths[field]} does not match the bundle manifest")
+
+    return Bundle(
+        joblib.load(paths['model']),
+        joblib.load(paths['scaler']),
+        joblib.load(paths['feature_columns']),
+        joblib.load(paths['defaults']),
+        manifest
+    )
+
+def model_version(path=None):
+    """Content hash of a bundle's model file, as written to the audit log"""
+    return audit_log.file_version(bundle_paths(path)['model'])
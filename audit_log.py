@@ -0,0 +1,243 @@
+"""
+Prediction audit log with asynchronous, batched writes to SQLite
+"""
+
+import hashlib
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# SQLite synchronous pragma for each durability level
+DURABILITY_LEVELS = {
+    'off': 'OFF',        # hand writes to the OS, fastest, may lose data on power loss
+    'normal': 'NORMAL',  # WAL checkpointed lazily, survives process crashes
+    'full': 'FULL'       # fsync on every batch commit
+}
+
+AUDIT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    logged_at REAL NOT NULL,
+    input_hash TEXT NOT NULL,
+    feature_digest TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    prediction REAL NOT NULL,
+    latency_ms REAL NOT NULL
+)
+"""
+
+INSERT_PREDICTION = ('INSERT INTO predictions (logged_at, input_hash, feature_digest, model_version, '
+                     'prediction, latency_ms) VALUES (?, ?, ?, ?, ?, ?)')
+
+_STOP = object()
+
+# Hashing helpers
+
+
+def canonical_input_hash(user_data):
+    """Hash user input with sorted keys so equal inputs always hash the same"""
+    payload = json.dumps(user_data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def feature_vector_digest(features):
+    """Digest the float64 bytes of a feature vector or single-row DataFrame"""
+    values = np.ascontiguousarray(np.asarray(features, dtype=np.float64))
+    return hashlib.blake2b(values.tobytes(), digest_size=16).hexdigest()
+
+def file_version(path, length=12):
+    """Short content hash of an artifact file, used as the model version"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
+
+# Audit log
+
+
+class PredictionAuditLog:
+    """
+    Append-only prediction log written by a background thread
+
+    record() only enqueues the raw objects; hashing and SQLite writes happen
+    on the writer thread, which drains the queue in batches of up to
+    batch_size rows or every flush_interval seconds, whichever comes first.
+    If the database cannot be opened, failed holds the error and records are
+    counted as dropped.
+
+    Args:
+        path: SQLite database file
+        batch_size: maximum rows per transaction
+        flush_interval: seconds to wait before writing a partial batch
+        max_queue: bound on pending records (backpressure threshold)
+        durability: one of DURABILITY_LEVELS
+        on_full: 'drop' to discard records when the queue is full, or
+            'block' to wait up to block_timeout seconds for space
+        block_timeout: seconds record() may block when on_full='block'
+    """
+
+    def __init__(self, path='prediction_audit.db', batch_size=256, flush_interval=1.0,
+                 max_queue=10000, durability='normal', on_full='drop', block_timeout=0.05):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"durability must be one of {sorted(DURABILITY_LEVELS)}, got {durability!r}")
+        if on_full not in ('drop', 'block'):
+            raise ValueError(f"on_full must be 'drop' or 'block', got {on_full!r}")
+
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.on_full = on_full
+        self.block_timeout = block_timeout
+
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.failed = None
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name='prediction-audit-log', daemon=True)
+        self._writer.start()
+
+    def record(self, user_data, features, model_version, prediction, latency_ms):
+        """Queue one prediction for logging; never raises on a full queue or a failed database"""
+        if self._closed:
+            return False
+        if self.failed is not None:
+            self.dropped += 1
+            return False
+
+        item = (time.time(), user_data, features, model_version, float(prediction), float(latency_ms))
+        try:
+            if self.on_full == 'block':
+                self._queue.put(item, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def flush(self):
+        """Block until every queued record has been written"""
+        self._queue.join()
+
+    def close(self):
+        """Write outstanding records and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join()
+
+    def stats(self):
+        """Counters for monitoring the logger itself"""
+        return {
+            'written': self.written,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'pending': self._queue.qsize(),
+            'failed': self.failed
+        }
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={DURABILITY_LEVELS[self.durability]}')
+        conn.execute(AUDIT_SCHEMA)
+        conn.commit()
+        return conn
+
+    def _write(self, conn, records):
+        """Insert a batch in one transaction; if it fails, retry row by row so only bad rows are lost"""
+        rows = []
+        for logged_at, user_data, features, model_version, prediction, latency_ms in records:
+            try:
+                rows.append((logged_at, canonical_input_hash(user_data), feature_vector_digest(features),
+                             model_version, prediction, latency_ms))
+            except Exception:
+                logger.exception("Prediction audit log could not hash a record")
+                self.errors += 1
+
+        try:
+            conn.executemany(INSERT_PREDICTION, rows)
+            conn.commit()
+            self.written += len(rows)
+            return
+        except Exception:
+            conn.rollback()
+
+        failed = 0
+        for row in rows:
+            try:
+                conn.execute(INSERT_PREDICTION, row)
+                conn.commit()
+                self.written += 1
+            except Exception:
+                conn.rollback()
+                if not failed:
+                    logger.exception("Prediction audit log could not write a record")
+                failed += 1
+        self.errors += failed
+        if failed > 1:
+            logger.error("Prediction audit log could not write %d of %d records in a batch", failed, len(rows))
+
+    def _discard(self):
+        """Drop queued records until close(), once the database cannot be opened"""
+        while True:
+            item = self._queue.get()
+            if item is not _STOP:
+                self.dropped += 1
+            self._queue.task_done()
+            if item is _STOP:
+                return
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except Exception as exc:
+            # Keep draining so flush() and close() return instead of waiting on a dead writer
+            self.failed = f"{type(exc).__name__}: {exc}"
+            logger.error("Prediction audit log disabled, cannot open %s: %s", self.path, self.failed)
+            self._discard()
+            return
+        stopping = False
+
+        while not stopping:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if any(item is _STOP for item in batch):
+                stopping = True
+            records = [item for item in batch if item is not _STOP]
+
+            try:
+                self._write(conn, records)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+        conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,227 @@
+"""
+Batch preprocessing for many listings at once (re-ingestion, bulk scoring)
+"""
+
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import preprocessing
+import validation
+
+# Vectorised URL features
+
+URL_FEATURE_COLUMNS = ['has_picture', 'url_length', 'is_muscache', 'image_id_length', 'is_original',
+                       'file_extension', 'url_has_size_param', 'url_path_segments',
+                       'estimated_image_quality', 'url_complexity_score']
+
+_SIZE_PARAM_PATTERN = re.compile(r'w=|h=')
+_PATH_SEGMENT_PATTERN = re.compile(r'[^/]+')
+_LARGE_PATTERN = re.compile(r'_large|_xl|_xxl')
+_MEDIUM_PATTERN = re.compile(r'_medium|_med')
+
+
+def extract_url_features_batch(urls):
+    """
+    Vectorised extract_url_features over a Series of URLs
+
+    Categorical outputs are integer codes (preprocessing.FILE_EXTENSION_CODES,
+    preprocessing.IMAGE_QUALITY_CODES) so the result is one contiguous
+    float64 block.
+
+    Returns:
+        DataFrame with URL_FEATURE_COLUMNS, indexed like urls
+    """
+    urls = pd.Series(urls)
+    present = urls.notna().to_numpy()
+    text = urls.where(urls.notna(), '').astype(str)
+    lower = text.str.lower()
+
+    image_ids = text.str.extract(preprocessing.IMAGE_ID_PATTERN, expand=False)
+    extensions = text.str.extract(preprocessing.FILE_EXTENSION_PATTERN, expand=False).str.lower()
+
+    extension_codes = extensions.map(preprocessing.FILE_EXTENSION_CODES).to_numpy(dtype=np.float64, copy=True)
+    extension_codes[np.isnan(extension_codes)] = preprocessing.FILE_EXTENSION_CODES['other']
+    extension_codes[extensions.isna().to_numpy()] = preprocessing.FILE_EXTENSION_CODES['none']
+
+    codes = preprocessing.IMAGE_QUALITY_CODES
+    is_original_exact = text.str.contains('_original', regex=False).to_numpy()
+    quality = np.select(
+        [~present, is_original_exact,
+         text.str.contains(_LARGE_PATTERN).to_numpy(),
+         text.str.contains(_MEDIUM_PATTERN).to_numpy()],
+        [codes['unknown'], codes['original'], codes['large'], codes['medium']],
+        default=codes['standard']
+    )
+
+    out = np.empty((len(urls), len(URL_FEATURE_COLUMNS)), dtype=np.float64)
+    out[:, 0] = present
+    out[:, 1] = text.str.len().to_numpy()
+    out[:, 2] = lower.str.contains('muscache.com', regex=False).to_numpy()
+    out[:, 3] = image_ids.str.len().fillna(0).to_numpy()
+    out[:, 4] = lower.str.contains('_original', regex=False).to_numpy()
+    out[:, 5] = extension_codes
+    out[:, 6] = text.str.contains(_SIZE_PARAM_PATTERN).to_numpy()
+    out[:, 7] = text.str.count(_PATH_SEGMENT_PATTERN).to_numpy()
+    out[:, 8] = quality
+    out[:, 9] = out[:, 7] * 0.5 + out[:, 3] * 0.2 + out[:, 2] * 2 + out[:, 4] * 3
+
+    # Missing URLs get the all-zero row of the per-row extractor
+    out[~present] = 0
+    out[~present, 5] = preprocessing.FILE_EXTENSION_CODES['none']
+    out[~present, 8] = codes['unknown']
+
+    return pd.DataFrame(out, columns=URL_FEATURE_COLUMNS, index=urls.index)
+
+# Parallel text features
+
+# Group -> (user_data key, per-row extractor)
+TEXT_EXTRACTORS = {
+    'name': ('name', preprocessing.extract_name_features),
+    'description': ('description', preprocessing.extract_description_features)
+}
+
+TEXT_FEATURE_COLUMNS = {
+    group: list(extractor('Probe text.'))
+    for group, (_, extractor) in TEXT_EXTRACTORS.items()
+}
+
+
+def _extract_text_shard(shard):
+    """
+    Worker task: run the text extractors over one shard of rows
+
+    Args:
+        shard: dict of group -> list of raw texts (None for missing)
+
+    Returns:
+        dict of group -> float64 array (rows x TEXT_FEATURE_COLUMNS[group])
+    """
+    blocks = {}
+    for group, texts in shard.items():
+        extractor = TEXT_EXTRACTORS[group][1]
+        columns = TEXT_FEATURE_COLUMNS[group]
+        block = np.empty((len(texts), len(columns)), dtype=np.float64)
+        for i, text in enumerate(texts):
+            features = extractor(np.nan if text is None else text)
+            block[i] = [features[col] for col in columns]
+        blocks[group] = block
+    return blocks
+
+
+def _pool_context():
+    """Fork where available so workers share the imported keyword tables copy-on-write"""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('fork' if 'fork' in methods else None)
+
+
+def extract_text_features_batch(records, n_jobs=1, chunk_size=2000):
+    """
+    Name and description features for many rows, optionally across processes
+
+    Rows are split into contiguous shards of chunk_size. Workers receive only
+    the raw strings and return one float64 array per extractor, so pickling
+    cost is a list of strings in and a flat buffer out. Shards are reassembled
+    in submission order, so output order never depends on scheduling.
+
+    Args:
+        records: DataFrame with 'name' and/or 'description' columns
+        n_jobs: worker processes (1 runs in-process, None uses every core)
+        chunk_size: rows per shard
+
+    Returns:
+        dict of group -> DataFrame of text features indexed like records
+    """
+    groups = [group for group, (key, _) in TEXT_EXTRACTORS.items() if key in records.columns]
+    if not groups:
+        return {}
+
+    texts = {
+        group: records[TEXT_EXTRACTORS[group][0]].astype(object).where(records[TEXT_EXTRACTORS[group][0]].notna(), None).tolist()
+        for group in groups
+    }
+    shards = [
+        {group: texts[group][start:start + chunk_size] for group in groups}
+        for start in range(0, len(records), chunk_size)
+    ]
+
+    if n_jobs == 1 or len(shards) <= 1:
+        results = [_extract_text_shard(shard) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=_pool_context()) as pool:
+            results = list(pool.map(_extract_text_shard, shards))
+
+    return {
+        group: pd.DataFrame(
+            np.concatenate([result[group] for result in results]) if results else np.empty((0, len(TEXT_FEATURE_COLUMNS[group]))),
+            columns=TEXT_FEATURE_COLUMNS[group],
+            index=records.index
+        )
+        for group in groups
+    }
+
+# Batch pipeline
+
+
+def preprocess_batch(records, feature_columns, feature_defaults, n_jobs=1, city=preprocessing.MANCHESTER):
+    """
+    Validate and preprocess many user_data records
+
+    Invalid rows are rejected by the vectorised schema check before any
+    text extraction runs on them.
+
+    Args:
+        records: DataFrame with one row per listing (or list of user_data dicts)
+        feature_columns: list of expected feature names
+        feature_defaults: dict with default values for all features
+        n_jobs: worker processes for the text extractors (None uses every core)
+        city: preprocessing.City whose neighbourhoods and bounds the records
+            are validated and encoded against (service.bundle_city)
+
+    Returns:
+        (features, errors) where features is a DataFrame of model inputs
+        indexed like the accepted rows and errors maps rejected row index
+        -> list of validation messages
+    """
+    if not isinstance(records, pd.DataFrame):
+        records = pd.DataFrame(list(records))
+
+    valid, errors = validation.validate_batch(records, validation.city_schema(city))
+    accepted = records[valid.to_numpy()]
+
+    layout = preprocessing.compile_feature_layout(feature_columns, feature_defaults, city)
+    matrix = np.tile(layout.defaults_vector, (len(accepted), 1))
+
+    # Columnar extractors run once over the whole batch
+    batch_groups = {}
+    if 'picture_url' in accepted.columns:
+        batch_groups['url'] = extract_url_features_batch(accepted['picture_url'])
+    batch_groups.update(extract_text_features_batch(accepted, n_jobs=n_jobs))
+    _fill_group_columns(matrix, layout, batch_groups)
+
+    # Remaining nodes run per row; derived nodes read the columnar text results
+    row_nodes = {node.name for node in preprocessing.FEATURE_GRAPH} - set(batch_groups)
+    text_blocks = {group: (frame.columns.tolist(), frame.to_numpy()) for group, frame in batch_groups.items() if group in TEXT_EXTRACTORS}
+    for i, row in enumerate(accepted.to_dict('records')):
+        user_data = {key: value for key, value in row.items() if not _is_blank(value)}
+        results = {group: dict(zip(columns, block[i])) for group, (columns, block) in text_blocks.items()}
+        preprocessing.run_feature_graph(user_data, feature_defaults, layout, matrix[i], results, nodes=row_nodes)
+
+    features = layout.to_frame(matrix)
+    features.index = accepted.index
+    return features, errors
+
+
+def _fill_group_columns(matrix, layout, batch_groups):
+    """Copy columnar extractor output into the layout slots of a feature matrix"""
+    for group, frame in batch_groups.items():
+        for key, slot in layout.slots[group]:
+            matrix[:, slot] = frame[key].to_numpy()
+
+
+def _is_blank(value):
+    """Missing cells in a DataFrame fall back to the preprocessing defaults"""
+    return value is None or (isinstance(value, float) and value != value)
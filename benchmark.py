@@ -0,0 +1,415 @@
+"""
+Benchmarks for the preprocessing and prediction paths
+
+Run with: python benchmark.py <name> [size]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import batch_preprocessing
+import preprocessing
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def sample_urls(n, seed=0):
+    """Synthetic picture URLs in the Inside Airbnb formats"""
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(10**8, 10**12, size=n).astype(str)
+    suffixes = rng.choice(['_original.jpg', '.jpeg?im_w=720', '_large.png', '.webp', ''], size=n)
+    hosts = rng.choice(['https://a0.muscache.com/pictures/', 'https://a0.muscache.com/im/pictures/miso/Hosting-'], size=n)
+    urls = pd.Series(np.char.add(np.char.add(hosts, ids), np.char.add('/', np.char.add(ids, suffixes))), dtype=object)
+    urls[rng.random(n) < 0.02] = None
+    return urls
+
+def sample_descriptions(n, seed=0):
+    """Synthetic names and descriptions around the corpus average of ~400 characters"""
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(('Beautiful modern apartment in the heart of Manchester City Centre. Close to '
+                           'metro, shops and restaurants! Spacious 2 bedroom flat with fast wifi, clean '
+                           'kitchen and a quiet private balcony. Perfect for business or family stays.').split())
+    lengths = rng.integers(30, 100, size=n)
+    descriptions = [' '.join(rng.choice(vocabulary, size=length)) for length in lengths]
+    names = [' '.join(rng.choice(vocabulary, size=5)) for _ in range(n)]
+    return pd.DataFrame({'name': names, 'description': descriptions})
+
+def sample_user_data(n, seed=0):
+    """Synthetic form submissions covering the app's input ranges"""
+    rng = np.random.default_rng(seed)
+    descriptions = sample_descriptions(n, seed)
+    amenity_pool = np.array(['Wifi', 'Kitchen', 'TV', 'Heating', 'Washer', 'Dryer', 'Free parking',
+                             'Dedicated workspace', 'Hot tub', 'Pool', 'Gym', 'Smoke alarm'])
+    records = []
+    for i in range(n):
+        records.append({
+            'name': descriptions['name'][i],
+            'description': descriptions['description'][i],
+            'picture_url': 'https://a0.muscache.com/pictures/12345678/example_original.jpg',
+            'property_type': str(rng.choice(preprocessing.PROPERTY_TYPES)),
+            'room_type': str(rng.choice(preprocessing.ROOM_TYPES)),
+            'neighbourhood_cleansed': str(rng.choice(preprocessing.NEIGHBOURHOODS)),
+            'host_response_time': str(rng.choice(preprocessing.RESPONSE_TIMES)),
+            'accommodates': int(rng.integers(1, 9)),
+            'bedrooms': int(rng.integers(0, 5)),
+            'beds': int(rng.integers(1, 6)),
+            'bathrooms': float(rng.choice([1.0, 1.5, 2.0])),
+            'amenities': ', '.join(rng.choice(amenity_pool, size=rng.integers(2, 10), replace=False)),
+            'number_of_reviews': int(rng.integers(0, 300)),
+            **{col: round(float(rng.uniform(3.5, 5.0)), 1) for col in preprocessing.REVIEW_SCORE_COLUMNS},
+            'host_since': f"{rng.integers(2010, 2024)}-01-01",
+            'host_is_superhost': bool(rng.random() < 0.3),
+            'host_identity_verified': bool(rng.random() < 0.8),
+            'host_total_listings_count': int(rng.integers(1, 20)),
+            'latitude': float(rng.uniform(53.40, 53.55)),
+            'longitude': float(rng.uniform(-2.35, -2.15)),
+            'instant_bookable': bool(rng.random() < 0.5)
+        })
+    return records
+
+def latency_summary(latencies, elapsed):
+    """Throughput and latency percentiles (ms) for a list of latencies in seconds"""
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        'requests': len(latencies_ms),
+        'throughput_rps': len(latencies_ms) / elapsed,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99))
+    }
+
+# Benchmarks
+
+
+def benchmark_url_features(n=100000):
+    """Per-row extract_url_features vs the vectorised batch extractor"""
+    urls = sample_urls(n)
+
+    _, row_time = _timed(lambda: [preprocessing.extract_url_features(url) for url in urls])
+    _, batch_time = _timed(batch_preprocessing.extract_url_features_batch, urls)
+
+    return {
+        'rows': n,
+        'per_row_s': row_time,
+        'batch_s': batch_time,
+        'per_row_urls_per_s': n / row_time,
+        'batch_urls_per_s': n / batch_time,
+        'speedup': row_time / batch_time
+    }
+
+
+def benchmark_text_features(n=100000, n_jobs=None):
+    """In-process vs process-pool name and description extraction"""
+    records = sample_descriptions(n)
+
+    _, serial_time = _timed(batch_preprocessing.extract_text_features_batch, records, n_jobs=1)
+    _, pool_time = _timed(batch_preprocessing.extract_text_features_batch, records, n_jobs=n_jobs)
+
+    return {
+        'rows': n,
+        'workers': n_jobs or os.cpu_count(),
+        'serial_s': serial_time,
+        'pool_s': pool_time,
+        'serial_rows_per_s': n / serial_time,
+        'pool_rows_per_s': n / pool_time,
+        'speedup': serial_time / pool_time
+    }
+
+
+def benchmark_reduced_features(n=2000, bundle_path=os.path.join('bundles', 'reduced')):
+    """Preprocessing + scoring cost of the full bundle vs a feature-selected bundle"""
+    import tracemalloc
+
+    import artifacts
+
+    records = sample_user_data(n)
+    results = {}
+    for name, path in (('full', None), ('reduced', bundle_path)):
+        bundle = artifacts.load_bundle(path)
+        layout = preprocessing.compile_feature_layout(bundle.feature_columns, bundle.defaults)
+
+        _, preprocess_time = _timed(lambda: [preprocessing.build_feature_vector(r, bundle.defaults, layout) for r in records])
+        _, single_time = _timed(lambda: [
+            bundle.model.predict(bundle.scaler.transform(layout.to_frame(preprocessing.build_feature_vector(r, bundle.defaults, layout))))
+            for r in records[:500]
+        ])
+
+        tracemalloc.start()
+        matrix = np.empty((n, len(layout.feature_columns)))
+        for i, r in enumerate(records):
+            preprocessing.build_feature_vector(r, bundle.defaults, layout, out=matrix[i])
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results[f'{name}_features'] = len(layout.feature_columns)
+        results[f'{name}_keys_computed'] = sum(len(keys) for keys in layout.needed.values())
+        results[f'{name}_preprocess_ms'] = preprocess_time / n * 1000
+        results[f'{name}_end_to_end_ms'] = single_time / 500 * 1000
+        results[f'{name}_batch_peak_kb'] = peak / 1024
+        results[f'{name}_model_kb'] = len(bundle.model.get_booster().save_raw()) / 1024
+    return results
+
+
+def benchmark_ensemble(n=500, bundle_path=os.path.join('bundles', 'ensemble')):
+    """Prediction latency of the deployed single model vs the ensemble, serial and threaded"""
+    import artifacts
+
+    records = sample_user_data(n)
+    single = artifacts.load_bundle()
+    ensemble = artifacts.load_bundle(bundle_path)
+    layout = preprocessing.compile_feature_layout(ensemble.feature_columns, ensemble.defaults)
+    matrix = np.empty((n, len(layout.feature_columns)))
+    for i, r in enumerate(records):
+        preprocessing.build_feature_vector(r, ensemble.defaults, layout, out=matrix[i])
+    scaled = ensemble.scaler.transform(layout.to_frame(matrix))
+    single_scaled = single.scaler.transform(pd.DataFrame(scaled, columns=layout.feature_columns)[single.feature_columns])
+
+    models = {'single': (single.model, single_scaled)}
+    for name in ensemble.model.members:
+        models[name] = (ensemble.model.members[name], np.ascontiguousarray(scaled, dtype=np.float32))
+    results = {}
+    for batch_size in (1, 64):
+        timings = {}
+        for name, (model, X) in models.items():
+            _, elapsed = _timed(lambda: [model.predict(X[i:i + batch_size]) for i in range(0, n, batch_size)])
+            timings[name] = elapsed
+        for parallel in (False, True):
+            ensemble.model.parallel = parallel
+            _, elapsed = _timed(lambda: [ensemble.model.predict(scaled[i:i + batch_size]) for i in range(0, n, batch_size)])
+            timings['threaded' if parallel else 'serial'] = elapsed
+        calls = -(-n // batch_size)
+        summary = {name: elapsed / calls * 1000 for name, elapsed in timings.items()}
+        summary['overhead_x'] = timings['threaded'] / timings['single']
+        results[f'batch={batch_size} ms/call'] = summary
+    results['cpus'] = os.cpu_count()
+    return results
+
+
+def benchmark_calendar(nights=365):
+    """Pricing every night of a horizon: one predict per night vs one batched predict"""
+    import artifacts
+    import calendar_features
+
+    bundle = artifacts.load_bundle()
+    layout = preprocessing.compile_feature_layout(bundle.feature_columns, bundle.defaults)
+    user_data = sample_user_data(1)[0]
+    dates = calendar_features.stay_nights(None, nights)
+    calendar_features.join_calendar(dates)
+
+    def per_night():
+        prices = []
+        for night in dates:
+            row = preprocessing.build_feature_vector({**user_data, 'stay_date': night}, bundle.defaults, layout)
+            price = bundle.model.predict(bundle.scaler.transform(layout.to_frame(row)))[0]
+            prices.append(price * calendar_features.join_calendar([night])['multiplier'].iloc[0])
+        return np.array(prices)
+
+    looped, loop_time = _timed(per_night)
+    batched, batch_time = _timed(calendar_features.price_nights, bundle.model, bundle.scaler, layout,
+                                 bundle.defaults, user_data, None, nights)
+    return {
+        'nights': nights,
+        'per_night_ms': loop_time * 1000,
+        'batched_ms': batch_time * 1000,
+        'speedup': loop_time / batch_time,
+        'max_abs_diff': float(np.abs(looped - batched['price'].to_numpy()).max())
+    }
+
+
+def benchmark_calendar_job(n=20):
+    """
+    Calendar job vs price_nights on the same listings, for one night (the
+    chunk is then a reshape of a read-only broadcast) and for a month
+    """
+    import artifacts
+    import calendar_features
+    import calendar_job
+
+    class ArrayWriter:
+        def __init__(self):
+            self.blocks = []
+
+        def write(self, listing_ids, prices):
+            self.blocks.append(prices)
+
+        def close(self):
+            pass
+
+    bundle = artifacts.load_bundle()
+    layout = preprocessing.compile_feature_layout(bundle.feature_columns, bundle.defaults)
+    records = sample_user_data(n)
+    start = calendar_features.stay_nights(None, 1)[0]
+    inputs = calendar_job.record_listings(pd.DataFrame(records), bundle.feature_columns, bundle.defaults, start)
+
+    results = {'listings': n}
+    for nights in (1, 30):
+        writer = ArrayWriter()
+        calendar_job.generate_calendars(bundle.model, bundle.scaler, layout, *inputs, writer, start, nights)
+        job_prices = np.vstack(writer.blocks)
+        expected = np.vstack([calendar_features.price_nights(bundle.model, bundle.scaler, layout, bundle.defaults,
+                                                             records[i], start, nights)['price'].to_numpy()
+                              for i in inputs[0]])
+        results[f'nights={nights} max_abs_diff'] = float(np.abs(job_prices - expected).max())
+    return results
+
+def benchmark_flat(n=1000):
+    """Flattened trees vs the XGBoost booster: size, latency and drift on held-out listings"""
+    import artifacts
+    import flat_trees
+    import tuning
+
+    bundle = artifacts.load_bundle()
+    data = pd.read_csv(tuning.TRAINING_DATA_PATH)
+    X = bundle.scaler.transform(data[bundle.feature_columns]).astype(np.float32)
+    train, _, test = tuning.split_indices(len(X))
+    # float16 rounding sees only the training rows; drift is measured on the rest
+    forests = {precision: flat_trees.flatten_booster(bundle.model, precision, X[train])
+               for precision in flat_trees.PRECISIONS}
+    expected = bundle.model.predict(X[test])
+
+    results = {'booster_kb': len(bundle.model.get_booster().save_raw()) / 1024}
+    for precision, forest in forests.items():
+        drift = np.abs(forest.predict(X[test]) - expected)
+        results[precision] = {'kb': forest.nbytes / 1024, 'mean_drift': float(drift.mean()),
+                              'max_drift': float(drift.max()), 'rows_over_50p': int((drift > 0.5).sum())}
+
+    rows = X[np.resize(test, n)]
+    models = {'xgboost': bundle.model, **forests}
+    for batch_size in (1, n):
+        calls = range(0, min(n, 200 * batch_size), batch_size)
+        timings = {}
+        for name, model in models.items():
+            _, elapsed = _timed(lambda: [model.predict(rows[i:i + batch_size]) for i in calls])
+            timings[name] = elapsed / len(calls) * 1000
+        results[f'batch={batch_size} ms/call'] = timings
+    return results
+
+
+def benchmark_surrogate(n=365):
+    """Lookup-table surrogate vs the XGBoost model: fidelity on held-out inputs and latency per batch"""
+    import artifacts
+    import surrogate
+    import tuning
+
+    bundle = artifacts.load_bundle()
+    data = pd.read_csv(tuning.TRAINING_DATA_PATH)
+    model, fidelity = surrogate.distill(bundle, data)
+
+    results = {'surrogate_kb': model.nbytes / 1024, 'booster_kb': len(bundle.model.get_booster().save_raw()) / 1024}
+    for held_out, metrics in fidelity.items():
+        results.update({f'{held_out} {name}': value for name, value in metrics.items() if name != 'n_rows'})
+    X = bundle.scaler.transform(data[bundle.feature_columns]).astype(np.float32)
+    _, _, test = tuning.split_indices(len(X))
+    rows = X[np.resize(test, n)]
+    models = {'xgboost': bundle.model, 'surrogate': model}
+    # Single listings, and a year of calendar nights scored at once
+    for batch_size in (1, n):
+        calls = range(0, min(n, 200 * batch_size), batch_size)
+        timings = {}
+        for name, scorer in models.items():
+            _, elapsed = _timed(lambda: [scorer.predict(rows[i:i + batch_size]) for i in calls])
+            timings[name] = elapsed / len(calls) * 1e6
+        results[f'batch={batch_size} us/call'] = timings
+    return results
+
+
+def benchmark_amenities(n=2000000):
+    """Amenity similarity search over packed bitsets vs a boolean column matrix"""
+    import amenity_index
+
+    # Resample the training listings' amenity profiles up to n rows
+    data = pd.read_csv(amenity_index.TRAINING_DATA_PATH)
+    profiles = data.reindex(columns=amenity_index.AMENITY_FLAGS, fill_value=0).to_numpy() != 0
+    flags = profiles[np.random.default_rng(0).integers(0, len(profiles), size=n)]
+    index, build_time = _timed(amenity_index.AmenityIndex, amenity_index.pack_flags(flags))
+    query = index.bits[0].copy()
+    required = ['has_wifi', 'has_free_parking']
+
+    def column_top10():
+        shared = (flags & flags[0]).sum(axis=1)
+        similarity = shared / np.maximum((flags | flags[0]).sum(axis=1), 1)
+        return np.argpartition(similarity, n - 10)[-10:]
+
+    timings = {
+        'bitset_jaccard': lambda: index.jaccard(query),
+        'bitset_top10': lambda: index.most_similar(query, 10),
+        'bitset_filter': lambda: index.matching(required),
+        'bitset_filtered_top10': lambda: index.most_similar(query, 10, required=required),
+        'bool_columns_top10': column_top10
+    }
+    results = {'rows': n, 'bitset_mb': index.nbytes / 1e6, 'bool_columns_mb': flags.nbytes / 1e6,
+               'int64_columns_mb': flags.size * 8 / 1e6, 'build_s': build_time}
+    for name, func in timings.items():
+        func()
+        repeats = 3 if name.startswith('bool') else 20
+        _, elapsed = _timed(lambda: [func() for _ in range(repeats)])
+        results[f'{name}_ms'] = elapsed / repeats * 1000
+    return results
+
+
+async def _microbatch_load(batcher, records, concurrency):
+    """Closed-loop load: each client sends its next request when the last returns"""
+    latencies = []
+
+    async def client(client_records):
+        for user_data in client_records:
+            start = time.perf_counter()
+            await batcher.predict(user_data)
+            latencies.append(time.perf_counter() - start)
+
+    await batcher.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(client(records[i::concurrency]) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await batcher.stop()
+    return latency_summary(latencies, elapsed)
+
+def benchmark_microbatch(n=2000, concurrency=64):
+    """Throughput and p99 for micro-batching settings under concurrent load"""
+    import service
+
+    prediction_service = service.load_service()
+    records = sample_user_data(n)
+
+    configs = [(1, 0.0), (16, 2.0), (64, 2.0), (64, 5.0), (64, 10.0)]
+    results = {}
+    for max_batch_size, max_wait_ms in configs:
+        batcher = service.MicroBatcher(prediction_service, max_wait_ms=max_wait_ms, max_batch_size=max_batch_size)
+        summary = asyncio.run(_microbatch_load(batcher, records, concurrency))
+        summary['mean_batch'] = float(np.mean(batcher.batch_sizes))
+        results[f'batch={max_batch_size} wait={max_wait_ms}ms'] = summary
+    return results
+
+
+BENCHMARKS = {
+    'url': benchmark_url_features,
+    'text': benchmark_text_features,
+    'microbatch': benchmark_microbatch,
+    'reduced': benchmark_reduced_features,
+    'ensemble': benchmark_ensemble,
+    'calendar': benchmark_calendar,
+    'calendar_job': benchmark_calendar_job,
+    'flat': benchmark_flat,
+    'amenities': benchmark_amenities,
+    'surrogate': benchmark_surrogate
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"Usage: python benchmark.py <{'|'.join(BENCHMARKS)}> [size]")
+        sys.exit(1)
+
+    args = [int(sys.argv[2])] if len(sys.argv) > 2 else []
+    for key, value in BENCHMARKS[sys.argv[1]](*args).items():
+        if isinstance(value, dict):
+            value = ', '.join(f"{k}={v:,.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in value.items())
+        print(f"{key}: {value:,.3f}" if isinstance(value, float) else f"{key}: {value}")
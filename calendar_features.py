@@ -0,0 +1,274 @@
+"""
+Stay-date calendar: day of week, bank holidays and local events for every
+night, joined onto stay dates to adjust the static model's nightly price
+
+The model was trained on a single listings snapshot and has no date
+features, so the calendar does not feed the model. The stay date moves the
+date-dependent model inputs (host tenure, reviews per month), and the
+calendar multiplier is applied to the predicted price.
+
+Run with: python calendar_features.py [start date] [nights]
+"""
+
+import os
+import sys
+from datetime import date, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import preprocessing
+
+# One-off fixtures (Arena concerts, football, conferences); optional
+EVENTS_PATH = 'calendar_events.csv'
+EVENT_COLUMNS = ['start', 'end', 'name', 'multiplier']
+
+# Price adjustments, from the market patterns in the README: weekend premium,
+# summer above winter, events well above normal nights. Tune to local data.
+WEEKEND_NIGHTS = (4, 5)  # Friday and Saturday nights
+WEEKEND_MULTIPLIER = 1.25
+# The night before a bank holiday is an extra weekend night
+BANK_HOLIDAY_EVE_MULTIPLIER = 1.15
+# January to December
+MONTH_MULTIPLIERS = np.array([0.90, 0.90, 0.95, 1.00, 1.00, 1.10, 1.10, 1.10, 1.00, 1.00, 1.00, 1.05])
+
+
+def easter_sunday(year):
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month = (h + l - 7 * m + 90) // 25
+    return date(year, month, (h + l - 7 * m + 33 * month + 19) % 32)
+
+def _first_monday(year, month):
+    first = date(year, month, 1)
+    return first + timedelta(days=(7 - first.weekday()) % 7)
+
+def _last_monday(year, month):
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=last.weekday())
+
+def _weekday_substitute(day, days_if_saturday=2, days_if_sunday=1):
+    if day.weekday() == 5:
+        return day + timedelta(days=days_if_saturday)
+    if day.weekday() == 6:
+        return day + timedelta(days=days_if_sunday)
+    return day
+
+# Bank holidays that moved or were added by proclamation
+MOVED_BANK_HOLIDAYS = {
+    date(2020, 5, 4): date(2020, 5, 8),  # VE Day 75
+    date(2022, 5, 30): date(2022, 6, 2)  # Platinum Jubilee
+}
+EXTRA_BANK_HOLIDAYS = (date(2011, 4, 29), date(2012, 6, 5), date(2022, 6, 3), date(2022, 9, 19), date(2023, 5, 8))
+
+def bank_holidays(year):
+    """England and Wales bank holidays, with weekend substitutes and the actual Christmas/Boxing days"""
+    easter = easter_sunday(year)
+    christmas, boxing_day = date(year, 12, 25), date(year, 12, 26)
+    days = {
+        date(year, 1, 1), _weekday_substitute(date(year, 1, 1)),
+        easter - timedelta(days=2), easter + timedelta(days=1),
+        _first_monday(year, 5), _last_monday(year, 5), _last_monday(year, 8),
+        christmas, boxing_day,
+        # A weekend Christmas or Boxing Day moves to the 27th / 28th
+        christmas if christmas.weekday() < 5 else date(year, 12, 27),
+        boxing_day if boxing_day.weekday() < 5 else date(year, 12, 28)
+    }
+    days = {MOVED_BANK_HOLIDAYS.get(day, day) for day in days}
+    days.update(day for day in EXTRA_BANK_HOLIDAYS if day.year == year)
+    return sorted(days)
+
+# Events
+
+# Recurring events: name -> (function of year giving the first and last night, multiplier)
+RECURRING_EVENTS = {
+    'Christmas Markets': (lambda year: (date(year, 11, 8), date(year, 12, 21)), 1.15),
+    "New Year's Eve": (lambda year: (date(year, 12, 31), date(year, 12, 31)), 1.6),
+    # Friday to Sunday nights before the August bank holiday
+    'Manchester Pride': (lambda year: (_last_monday(year, 8) - timedelta(days=3),
+                                       _last_monday(year, 8) - timedelta(days=1)), 1.4)
+}
+
+def recurring_events(first_year, last_year):
+    """RECURRING_EVENTS expanded to dated rows for a range of years"""
+    rows = []
+    for year in range(first_year, last_year + 1):
+        for name, (nights, multiplier) in RECURRING_EVENTS.items():
+            start, end = nights(year)
+            rows.append({'start': start, 'end': end, 'name': name, 'multiplier': multiplier})
+    return pd.DataFrame(rows, columns=EVENT_COLUMNS)
+
+def load_events(path=EVENTS_PATH):
+    """
+    One-off events from a CSV with start, end (optional), name and multiplier
+    columns; lines starting with # are comments. A missing file means no events.
+    """
+    if not path or not os.path.exists(path):
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+    events = pd.read_csv(path, comment='#', skipinitialspace=True)
+    events['start'] = pd.to_datetime(events['start']).dt.date
+    events['end'] = pd.to_datetime(events['end'].fillna(events['start']) if 'end' in events else events['start']).dt.date
+    return events[EVENT_COLUMNS]
+
+# Calendar table
+
+
+def build_calendar(first_year, last_year, events=None):
+    """
+    One row per night from 1 January of first_year to 31 December of last_year
+
+    Args:
+        events: DataFrame with EVENT_COLUMNS added to the recurring events;
+            overlapping events take the largest multiplier
+
+    Returns:
+        DataFrame indexed by night with day_of_week, is_weekend_night, month,
+        is_bank_holiday, bank_holiday_eve, events, event_multiplier and the
+        combined multiplier
+    """
+    nights = pd.date_range(date(first_year, 1, 1), date(last_year, 12, 31), freq='D')
+    days = nights.to_numpy(dtype='datetime64[D]')
+    day_of_week = nights.dayofweek.to_numpy()
+    month = nights.month.to_numpy()
+
+    holidays = np.array([day for year in range(first_year, last_year + 2) for day in bank_holidays(year)],
+                        dtype='datetime64[D]')
+    is_bank_holiday = np.isin(days, holidays)
+    bank_holiday_eve = np.isin(days + 1, holidays)
+
+    all_events = recurring_events(first_year, last_year)
+    if events is not None and len(events):
+        all_events = pd.concat([all_events, events[EVENT_COLUMNS]], ignore_index=True)
+    event_multiplier = np.ones(len(days))
+    names = [[] for _ in range(len(days))]
+    starts = all_events['start'].to_numpy(dtype='datetime64[D]')
+    ends = all_events['end'].to_numpy(dtype='datetime64[D]')
+    for start, end, name, multiplier in zip(starts, ends, all_events['name'], all_events['multiplier']):
+        first, last = np.searchsorted(days, [start, end + 1])
+        event_multiplier[first:last] = np.maximum(event_multiplier[first:last], multiplier)
+        for i in range(first, last):
+            names[i].append(name)
+
+    is_weekend_night = np.isin(day_of_week, WEEKEND_NIGHTS)
+    multiplier = (MONTH_MULTIPLIERS[month - 1]
+                  * np.where(is_weekend_night, WEEKEND_MULTIPLIER, 1.0)
+                  * np.where(bank_holiday_eve & ~is_weekend_night, BANK_HOLIDAY_EVE_MULTIPLIER, 1.0)
+                  * event_multiplier)
+
+    return pd.DataFrame({
+        'day_of_week': day_of_week,
+        'is_weekend_night': is_weekend_night,
+        'month': month,
+        'is_bank_holiday': is_bank_holiday,
+        'bank_holiday_eve': bank_holiday_eve,
+        'events': [', '.join(n) for n in names],
+        'event_multiplier': event_multiplier,
+        'multiplier': multiplier
+    }, index=pd.Index(nights, name='night'))
+
+@lru_cache(maxsize=8)
+def load_calendar(first_year, last_year, events_path=EVENTS_PATH):
+    """Calendar table built once per year range and event file"""
+    return build_calendar(first_year, last_year, load_events(events_path))
+
+def join_calendar(nights, events_path=EVENTS_PATH):
+    """
+    Calendar rows for an array of nights, by integer offset into the table
+
+    Returns:
+        DataFrame aligned with nights (same order, duplicates allowed)
+    """
+    days = pd.DatetimeIndex(nights).to_numpy(dtype='datetime64[D]')
+    first_year = int(days.min().astype('datetime64[Y]').astype(int)) + 1970
+    last_year = int(days.max().astype('datetime64[Y]').astype(int)) + 1970
+    # Cover at least this year and the next two so most callers share one table
+    this_year = date.today().year
+    table = load_calendar(min(first_year, this_year), max(last_year, this_year + 2), events_path)
+    offsets = (days - table.index[0].to_datetime64().astype('datetime64[D]')).astype(np.int64)
+    return table.iloc[offsets]
+
+# Stay-date pricing
+
+
+def stay_nights(start=None, nights=365):
+    """Consecutive nights from start (default today)"""
+    start = pd.Timestamp(start if start is not None else date.today()).normalize()
+    return pd.date_range(start, periods=nights, freq='D')
+
+def stay_date_features(host_days, number_of_reviews, reviews_per_month):
+    """
+    host_days_active and reviews_per_month at stay dates
+
+    Matches extract_listing_features and derive_reviews_per_month. Inputs
+    broadcast, so per-listing (n, 1) columns against (nights,) day counts
+    give a listings x nights grid.
+
+    Args:
+        host_days: days from host_since to the stay date (negative before it)
+        number_of_reviews: the listing's review count
+        reviews_per_month: value kept while the host has not started
+
+    Returns:
+        dict of column -> array
+    """
+    host_days = np.maximum(0, host_days)
+    months_active = np.maximum(host_days / 30.44, 1)
+    return {
+        'host_days_active': host_days,
+        'reviews_per_month': np.where(host_days > 0, number_of_reviews / months_active, reviews_per_month)
+    }
+
+def stay_date_columns(user_data, nights, vector, layout):
+    """
+    Model inputs that depend on the stay date, vectorised over nights
+
+    Returns:
+        dict of column slot -> array of values per night
+    """
+    if 'host_since' not in user_data:
+        return {}
+    host_since = pd.to_datetime(user_data['host_since'])
+    host_days = (pd.DatetimeIndex(nights) - host_since).days.to_numpy()
+    reviews_per_month = vector[layout.index['reviews_per_month']] if 'reviews_per_month' in layout.index else 0.0
+    features = stay_date_features(host_days, user_data.get('number_of_reviews', 0), reviews_per_month)
+    return {layout.index[col]: values for col, values in features.items() if col in layout.index}
+
+def price_nights(model, scaler, layout, defaults, user_data, start=None, nights=365, events_path=EVENTS_PATH):
+    """
+    Nightly prices for consecutive stay dates from one batched predict
+
+    The listing is preprocessed once; only the stay-date columns vary by row.
+
+    Returns:
+        DataFrame indexed by night with the model price, calendar columns,
+        multiplier and adjusted price
+    """
+    dates = stay_nights(start, nights)
+    vector = preprocessing.build_feature_vector({**user_data, 'stay_date': dates[0]}, defaults, layout)
+    matrix = np.tile(vector, (len(dates), 1))
+    for slot, values in stay_date_columns(user_data, dates, vector, layout).items():
+        matrix[:, slot] = values
+
+    model_price = model.predict(scaler.transform(layout.to_frame(matrix)))
+    calendar = join_calendar(dates, events_path)
+    prices = calendar.copy()
+    prices.insert(0, 'model_price', model_price)
+    prices['price'] = model_price * calendar['multiplier'].to_numpy()
+    return prices
+
+
+if __name__ == "__main__":
+    start = sys.argv[1] if len(sys.argv) > 1 else None
+    nights = int(sys.argv[2]) if len(sys.argv) > 2 else 365
+    calendar = join_calendar(stay_nights(start, nights))
+    print(f"{len(calendar)} nights: mean multiplier {calendar['multiplier'].mean():.3f}, "
+          f"{calendar['is_bank_holiday'].sum()} bank holidays, {(calendar['events'] != '').sum()} event nights")
+    print(calendar.sort_values('multiplier', ascending=False).head(15).to_string())
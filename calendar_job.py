@@ -0,0 +1,235 @@
+"""
+Bulk nightly price calendars: every listing priced for every night of a
+horizon, written as a compact columnar file
+
+Each listing's static features are computed and scaled once. The scaled
+rows are broadcast across nights as a (listings x nights x features) view
+without copying; only one chunk of listings at a time is materialised,
+given its stay-date columns and scored, so memory is bounded by the chunk
+size rather than the number of listings.
+
+Run with: python calendar_job.py --output price_calendar.parquet
+          python calendar_job.py --listings listings.csv --start 2026-11-01 --nights 365
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import artifacts
+import batch_preprocessing
+import calendar_features
+import preprocessing
+import service
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Fallback if pyarrow not installed: compressed numpy archive
+    pa = None
+
+TRAINING_DATA_PATH = 'airbnb_processed_data.csv'
+
+# Rows (listing-nights) scored per predict call; bounds the working set
+CHUNK_ROWS = 16384
+
+
+def processed_listings(data, layout):
+    """
+    Static inputs for listings that are already model features (the processed training data)
+
+    host_days_active in the processed data is measured at the snapshot date.
+
+    Returns:
+        (listing ids, raw feature matrix, host days at the reference date,
+        reference date, number of reviews)
+    """
+    matrix = data.reindex(columns=layout.feature_columns).to_numpy(dtype=np.float64)
+    missing = np.isnan(matrix)
+    matrix[missing] = np.broadcast_to(layout.defaults_vector, matrix.shape)[missing]
+    host_days = data['host_days_active'].to_numpy(dtype=np.float64) if 'host_days_active' in data else np.full(len(data), np.nan)
+    reviews = data['number_of_reviews'].to_numpy(dtype=np.float64) if 'number_of_reviews' in data else np.zeros(len(data))
+    return data.index.to_numpy(), matrix, host_days, pd.Timestamp(preprocessing.SNAPSHOT_DATE), reviews
+
+def record_listings(records, feature_columns, defaults, start, n_jobs=1, city=preprocessing.MANCHESTER):
+    """
+    Static inputs for raw listing records (user_data columns), preprocessed
+    once in a batch with the first night as the stay date
+
+    Rejected records are reported and left out.
+
+    Returns:
+        (listing ids, raw feature matrix, host days at start, start, number of reviews)
+    """
+    records = records.assign(stay_date=start)
+    features, errors = batch_preprocessing.preprocess_batch(records, feature_columns, defaults, n_jobs=n_jobs, city=city)
+    for row, messages in errors.items():
+        print(f"listing {row} rejected: {'; '.join(messages)}")
+
+    accepted = records.loc[features.index]
+    host_since = pd.to_datetime(accepted['host_since'], errors='coerce') if 'host_since' in accepted else pd.Series(pd.NaT, index=accepted.index)
+    host_days = (start - host_since).dt.days.to_numpy(dtype=np.float64)
+    if 'number_of_reviews' in accepted:
+        reviews = pd.to_numeric(accepted['number_of_reviews'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+    else:
+        reviews = np.zeros(len(accepted))
+    return features.index.to_numpy(), features.to_numpy(dtype=np.float64), host_days, start, reviews
+
+def column_affine(scaler, n_features):
+    """
+    Per-column (scale, offset) so that transform(x) == x * scale + offset
+
+    Holds for the per-column scalers the bundles use (RobustScaler,
+    StandardScaler, MinMaxScaler); stay-date columns are scaled with it
+    directly instead of re-running the scaler on every chunk.
+    """
+    probe = scaler.transform(np.vstack([np.zeros(n_features), np.ones(n_features)]))
+    return probe[1] - probe[0], probe[0]
+
+# Writers
+
+
+class ParquetCalendarWriter:
+    """Long-format listing_id / night / price rows, one row group per chunk"""
+
+    def __init__(self, path, nights):
+        self.path = path
+        self.nights = nights.to_numpy(dtype='datetime64[D]')
+        self.schema = pa.schema([('listing_id', pa.int32()), ('night', pa.date32()), ('price', pa.float32())])
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, listing_ids, prices):
+        n_listings, n_nights = prices.shape
+        table = pa.table({
+            'listing_id': pa.array(np.repeat(listing_ids, n_nights).astype(np.int32)),
+            'night': pa.array(np.tile(self.nights, n_listings)),
+            'price': pa.array(prices.ravel())
+        }, schema=self.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        self.writer.close()
+
+
+class NpzCalendarWriter:
+    """listings x nights float32 price matrix saved as a compressed numpy archive on close"""
+
+    def __init__(self, path, nights):
+        self.path = path
+        self.nights = nights.to_numpy(dtype='datetime64[D]')
+        self.ids = []
+        self.blocks = []
+
+    def write(self, listing_ids, prices):
+        self.ids.append(np.asarray(listing_ids, dtype=np.int32))
+        self.blocks.append(prices)
+
+    def close(self):
+        np.savez_compressed(self.path, listing_id=np.concatenate(self.ids), night=self.nights,
+                            price=np.concatenate(self.blocks))
+
+
+def open_writer(path, nights):
+    """Parquet when pyarrow is installed, otherwise an .npz archive"""
+    if pa is not None and not path.endswith('.npz'):
+        return ParquetCalendarWriter(path, nights)
+    return NpzCalendarWriter(os.path.splitext(path)[0] + '.npz', nights)
+
+# Job
+
+
+def generate_calendars(model, scaler, layout, listing_ids, static, host_days, reference_date, reviews,
+                       writer, start=None, nights=365, chunk_rows=CHUNK_ROWS, events_path=calendar_features.EVENTS_PATH):
+    """
+    Score every listing for every night and hand price blocks to writer
+
+    Args:
+        static: raw (listings x features) matrix in layout order
+        host_days: days from host_since to reference_date per listing (NaN
+            where unknown; those listings keep their static stay-date columns)
+        reviews: number of reviews per listing
+
+    Returns:
+        dict of run statistics
+    """
+    dates = calendar_features.stay_nights(start, nights)
+    multipliers = calendar_features.join_calendar(dates, events_path)['multiplier'].to_numpy(dtype=np.float32)
+    offsets = (dates - reference_date).days.to_numpy(dtype=np.float64)
+    n_listings, n_features = static.shape
+
+    # Scale once; nights share each listing's scaled row through a broadcast view
+    scaled = np.ascontiguousarray(scaler.transform(layout.to_frame(static)), dtype=np.float32)
+    grid = np.broadcast_to(scaled[:, None, :], (n_listings, len(dates), n_features))
+    scale, offset = column_affine(scaler, n_features)
+
+    slots = {col: layout.index[col] for col in ('host_days_active', 'reviews_per_month') if col in layout.index}
+    known = ~np.isnan(host_days)
+    reviews_per_month = static[:, slots['reviews_per_month']] if 'reviews_per_month' in slots else np.zeros(n_listings)
+
+    listings_per_chunk = max(1, chunk_rows // len(dates))
+    predict_seconds = 0.0
+    for lo in range(0, n_listings, listings_per_chunk):
+        hi = min(lo + listings_per_chunk, n_listings)
+        # The only copy: one chunk (np.array, since with one night the reshape
+        # is still a read-only view of the broadcast)
+        block = np.array(grid[lo:hi]).reshape(-1, n_features)
+
+        if slots:
+            features = calendar_features.stay_date_features(
+                np.nan_to_num(host_days[lo:hi])[:, None] + offsets, reviews[lo:hi, None], reviews_per_month[lo:hi, None])
+            for col, slot in slots.items():
+                values = np.where(known[lo:hi, None], features[col], static[lo:hi, slot, None])
+                block[:, slot] = values.ravel() * scale[slot] + offset[slot]
+
+        predict_start = time.perf_counter()
+        model_price = model.predict(block)
+        predict_seconds += time.perf_counter() - predict_start
+        writer.write(listing_ids[lo:hi], model_price.reshape(hi - lo, len(dates)).astype(np.float32) * multipliers)
+    writer.close()
+
+    return {
+        'listings': n_listings,
+        'nights': len(dates),
+        'rows': n_listings * len(dates),
+        'chunk_rows': listings_per_chunk * len(dates),
+        'chunk_mb': listings_per_chunk * len(dates) * n_features * 4 / 1e6,
+        'predict_s': predict_seconds
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--listings', default=None,
+                        help="CSV of listing inputs (default: every listing in the processed training data)")
+    parser.add_argument('--bundle', default=None, help="artifact bundle directory (default: the original deployment)")
+    parser.add_argument('--start', default=None, help="first night (default: today)")
+    parser.add_argument('--nights', type=int, default=365)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--n-jobs', type=int, default=1, help="processes for text preprocessing of --listings")
+    parser.add_argument('--output', default='price_calendar.parquet')
+    args = parser.parse_args()
+
+    job_start = time.perf_counter()
+    bundle = artifacts.load_bundle(args.bundle)
+    city = service.bundle_city(bundle)
+    layout = preprocessing.compile_feature_layout(bundle.feature_columns, bundle.defaults, city)
+    start = calendar_features.stay_nights(args.start, 1)[0]
+
+    if args.listings:
+        inputs = record_listings(pd.read_csv(args.listings), bundle.feature_columns, bundle.defaults, start,
+                                 args.n_jobs, city)
+    else:
+        inputs = processed_listings(pd.read_csv(TRAINING_DATA_PATH), layout)
+
+    writer = open_writer(args.output, calendar_features.stay_nights(start, args.nights))
+    stats = generate_calendars(bundle.model, bundle.scaler, layout, *inputs, writer, start, args.nights, args.chunk_rows)
+    elapsed = time.perf_counter() - job_start
+
+    print(f"{stats['listings']:,} listings x {stats['nights']} nights = {stats['rows']:,} prices "
+          f"in {elapsed:.1f}s ({stats['rows'] / elapsed:,.0f}/s, predict {stats['predict_s']:.1f}s)")
+    print(f"chunks of {stats['chunk_rows']:,} rows ({stats['chunk_mb']:.0f} MB); "
+          f"wrote {writer.path} ({os.path.getsize(writer.path) / 1e6:.1f} MB)")
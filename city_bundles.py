@@ -0,0 +1,256 @@
+"""
+Per-city artifact bundles, loaded on first use and held in an LRU cache
+under a memory budget
+
+Each market is an artifact bundle under CITY_BUNDLES_DIR (bundles/cities/<slug>)
+whose manifest metadata carries the city's tables (preprocessing.City):
+neighbourhoods, fallback coordinates, bounding box and neighbourhood
+groups. A process serving many markets loads a city's PredictionService the
+first time it is asked for, and evicts the least recently used cities once
+the estimated footprint of those loaded exceeds the budget.
+
+Run with: python city_bundles.py export --city Manchester
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import artifacts
+import preprocessing
+import service
+
+CITY_BUNDLES_DIR = os.path.join('bundles', 'cities')
+DEFAULT_BUDGET_MB = 512
+
+# Loaded size relative to the bundle's pickles (measured: each further
+# Manchester-sized city adds about 1.5x its 0.7 MB of pickles to RSS, after
+# the one-off cost of importing the libraries)
+MEMORY_OVERHEAD = 1.5
+
+# Margin added around a city's listings when deriving its bounding box (degrees)
+BOUNDS_MARGIN = 0.05
+
+
+def city_slug(name):
+    """Bundle directory name for a city: 'Greater Manchester' -> 'greater-manchester'"""
+    return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+
+# Bundles
+
+
+def city_from_data(name, data):
+    """
+    City tables derived from a market's processed listings: its one-hot
+    neighbourhoods, each neighbourhood's mean coordinates and most common
+    neighbourhood group, and the listings' bounding box
+    """
+    prefix, group_prefix = 'neighbourhood_cleansed_', 'neighbourhood_group_cleansed_'
+    neighbourhoods = [col[len(prefix):] for col in data.columns if col.startswith(prefix)]
+    group_columns = [col for col in data.columns if col.startswith(group_prefix)]
+    latitude, longitude = data['latitude'].to_numpy(), data['longitude'].to_numpy()
+
+    coords, groups = {}, {}
+    for neighbourhood in neighbourhoods:
+        rows = data[prefix + neighbourhood].to_numpy() != 0
+        if not rows.any():
+            continue
+        coords[neighbourhood] = (round(float(latitude[rows].mean()), 4), round(float(longitude[rows].mean()), 4))
+        counts = data.loc[rows, group_columns].sum()
+        if len(counts) and counts.max() > 0:
+            groups[neighbourhood] = counts.idxmax()[len(group_prefix):]
+
+    default_group = max(set(groups.values()), key=list(groups.values()).count) if groups else name
+    return preprocessing.City(
+        name=name,
+        neighbourhoods=neighbourhoods,
+        neighbourhood_coords=coords,
+        default_coords=(round(float(np.median(latitude)), 4), round(float(np.median(longitude)), 4)),
+        bounds=(round(float(latitude.min()) - BOUNDS_MARGIN, 2), round(float(latitude.max()) + BOUNDS_MARGIN, 2),
+                round(float(longitude.min()) - BOUNDS_MARGIN, 2), round(float(longitude.max()) + BOUNDS_MARGIN, 2)),
+        neighbourhood_groups={n: g for n, g in groups.items() if g != default_group},
+        default_group=default_group
+    )
+
+def export_city_bundle(city, source=None, root=CITY_BUNDLES_DIR, metadata=None):
+    """
+    Save a bundle's artifacts (default: the original deployment) as a city
+    bundle carrying the city's tables
+
+    Returns:
+        the manifest dict
+    """
+    bundle = artifacts.load_bundle(source)
+    metadata = {
+        **bundle.manifest.get('metadata', {}),
+        'city': preprocessing.city_tables(city),
+        'source_version': artifacts.model_version(source),
+        **(metadata or {})
+    }
+    return artifacts.save_bundle(os.path.join(root, city_slug(city.name)), bundle.model, bundle.scaler,
+                                 bundle.feature_columns, bundle.defaults, metadata)
+
+def list_cities(root=CITY_BUNDLES_DIR):
+    """Slug -> city name for every city bundle under root, read from the manifests alone"""
+    cities = {}
+    if not os.path.isdir(root):
+        return cities
+    for slug in sorted(os.listdir(root)):
+        manifest_path = os.path.join(root, slug, artifacts.MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            continue
+        with open(manifest_path) as f:
+            tables = json.load(f).get('metadata', {}).get('city')
+        if tables:
+            cities[slug] = tables['name']
+    return cities
+
+def bundle_nbytes(path):
+    """Estimated resident size of a loaded city bundle"""
+    return int(sum(os.path.getsize(p) for p in artifacts.bundle_paths(path).values()) * MEMORY_OVERHEAD)
+
+def load_city_service(path, audit=None):
+    """PredictionService for one city bundle with the city's tables (only Manchester has a market index)"""
+    return service.load_service(path, audit=audit)
+
+# Cache
+
+
+class CityBundleCache:
+    """
+    City PredictionServices loaded on demand, least recently used evicted first
+
+    get() loads a city the first time it is requested; while the estimated
+    size of loaded cities exceeds budget_mb, the least recently used ones
+    are dropped (the city just requested is always kept). Loads of different
+    cities run concurrently; concurrent requests for the same city share
+    one load.
+
+    Args:
+        root: directory of city bundles
+        budget_mb: memory budget for loaded bundles
+        audit: optional audit_log.PredictionAuditLog shared by every city
+    """
+
+    def __init__(self, root=CITY_BUNDLES_DIR, budget_mb=DEFAULT_BUDGET_MB, audit=None):
+        self.root = root
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.audit = audit
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._services = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def __contains__(self, city):
+        return city_slug(city) in self._services
+
+    @property
+    def nbytes(self):
+        """Estimated size of the loaded cities"""
+        return sum(self._sizes.values())
+
+    def services(self):
+        """The PredictionServices currently loaded"""
+        with self._lock:
+            return list(self._services.values())
+
+    def cities(self):
+        """Slug -> name of every city that can be served"""
+        return list_cities(self.root)
+
+    def get(self, city):
+        """
+        PredictionService for a city (name or slug), loading it if needed
+
+        Raises:
+            ValueError if there is no bundle for the city
+        """
+        slug = city_slug(city)
+        path = os.path.join(self.root, slug)
+        with self._lock:
+            if slug in self._services:
+                self._services.move_to_end(slug)
+                self.hits += 1
+                return self._services[slug]
+        # Before taking a load lock, so unknown names leave nothing behind
+        if not os.path.exists(os.path.join(path, artifacts.MANIFEST_FILE)):
+            raise ValueError(f"No bundle for city: {city}")
+        with self._lock:
+            load_lock = self._loading.setdefault(slug, threading.Lock())
+
+        try:
+            with load_lock:
+                with self._lock:
+                    # Another request may have loaded it while this one waited
+                    if slug in self._services:
+                        self._services.move_to_end(slug)
+                        self.hits += 1
+                        return self._services[slug]
+
+                city_service = load_city_service(path, self.audit)
+
+                with self._lock:
+                    self.misses += 1
+                    self._services[slug] = city_service
+                    self._sizes[slug] = bundle_nbytes(path)
+                    self._evict()
+                return city_service
+        finally:
+            with self._lock:
+                if self._loading.get(slug) is load_lock:
+                    del self._loading[slug]
+
+    def _evict(self):
+        while self.nbytes > self.budget and len(self._services) > 1:
+            slug, _ = self._services.popitem(last=False)
+            del self._sizes[slug]
+            self.evictions += 1
+
+    def stats(self):
+        """Loaded cities (least recently used first), estimated size and hit/miss/eviction counts"""
+        with self._lock:
+            return {
+                'loaded': list(self._services),
+                'nbytes': self.nbytes,
+                'budget': self.budget,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    export = subcommands.add_parser('export', help="save a bundle as a city bundle")
+    export.add_argument('--city', default=preprocessing.MANCHESTER.name)
+    export.add_argument('--source', default=None, help="bundle to copy (default: the original deployment)")
+    export.add_argument('--data', default=None,
+                        help="the city's processed listings, to derive its tables (default: the built-in Manchester tables)")
+    export.add_argument('--root', default=CITY_BUNDLES_DIR)
+    listing = subcommands.add_parser('list', help="list city bundles and their estimated loaded size")
+    listing.add_argument('--root', default=CITY_BUNDLES_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        if args.data is not None:
+            import pandas as pd
+            city = city_from_data(args.city, pd.read_csv(args.data))
+        elif args.city == preprocessing.MANCHESTER.name:
+            city = preprocessing.MANCHESTER
+        else:
+            parser.error("--data is required for cities without built-in tables")
+        export_city_bundle(city, args.source, args.root)
+        print(f"Saved {city.name} ({len(city.neighbourhoods)} neighbourhoods) to "
+              f"{os.path.join(args.root, city_slug(city.name))}")
+    else:
+        for slug, name in list_cities(args.root).items():
+            print(f"  {slug}: {name}, ~{bundle_nbytes(os.path.join(args.root, slug)) / 1024 / 1024:.1f} MB loaded")
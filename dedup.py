@@ -0,0 +1,385 @@
+"""
+Near-duplicate listing detection with MinHash and locality-sensitive hashing
+
+Each listing becomes a set of tokens: word shingles of its description plus
+its amenities. A MinHash signature estimates the Jaccard similarity of two
+sets, and banding the signatures into an LSH index turns "find every
+listing similar to this one" into a few hash lookups, so checking a new
+scrape against everything seen so far costs time proportional to the
+scrape, not to the square of the dataset. The index is saved between runs
+and updated in place as new scrapes arrive.
+
+The processed training data no longer has the raw text, so its listings are
+tokenised from what survives preprocessing: amenity flags, property, room
+type and neighbourhood, and the exact description and name statistics
+(length, word and sentence counts), which copied listings share.
+
+Run with: python dedup.py                      (report duplicates in the training data)
+          python dedup.py --listings scrape.csv --index dedup_index.pkl
+"""
+
+import argparse
+import os
+import re
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import preprocessing
+
+TRAINING_DATA_PATH = 'airbnb_processed_data.csv'
+INDEX_PATH = 'dedup_index.pkl'
+
+# 128 hash functions in 16 bands of 8: pairs above ~0.7 Jaccard usually share
+# a band; candidates are then checked against THRESHOLD on the full signature
+NUM_PERM = 128
+BANDS = 16
+THRESHOLD = 0.8
+
+# Words per description shingle
+SHINGLE_WORDS = 3
+
+# Tokens hashed per signature block; bounds the (NUM_PERM x tokens) working array
+TOKENS_PER_BLOCK = 50000
+
+# Raw listings tokenised at a time when indexing a scrape
+CHUNK_ROWS = 10000
+
+_WORD_PATTERN = re.compile(r'\w+')
+
+# Processed-data proxy for the raw text: copies share these exact values
+PROXY_VALUE_COLUMNS = ['desc_length', 'desc_word_count', 'desc_sentence_count', 'avg_word_length',
+                       'name_length', 'name_word_count', 'accommodates', 'bedrooms', 'beds', 'bathrooms',
+                       'host_total_listings_count']
+# Column prefixes whose set flags (1) are tokens
+PROXY_FLAG_PREFIXES = ('has_', 'property_type_', 'room_type_', 'neighbourhood_cleansed_')
+
+# Tokens
+
+
+def record_tokens(user_data, shingle_words=SHINGLE_WORDS):
+    """
+    Token set for a raw listing: description word shingles and amenities
+
+    Returns:
+        set of strings
+    """
+    description = user_data.get('description')
+    words = _WORD_PATTERN.findall(description.lower()) if isinstance(description, str) else []
+    shingles = {' '.join(words[i:i + shingle_words]) for i in range(max(len(words) - shingle_words + 1, 1))} if words else set()
+    amenities = preprocessing.parse_amenities_simple(user_data.get('amenities'))
+    return {f'd:{shingle}' for shingle in shingles} | {f'a:{amenity}' for amenity in amenities}
+
+def hash_token_sets(token_sets):
+    """
+    Concatenated 64-bit token hashes and per-listing offsets
+
+    pandas' hash_array uses a fixed key, so (unlike hash()) a token hashes
+    the same in every process and run.
+
+    Returns:
+        (hashes, offsets) where listing i owns hashes[offsets[i]:offsets[i + 1]]
+    """
+    tokens = np.array([token for tokens in token_sets for token in tokens], dtype=object)
+    counts = np.fromiter((len(tokens) for tokens in token_sets), dtype=np.int64, count=len(token_sets))
+    return pd.util.hash_array(tokens), np.concatenate([[0], np.cumsum(counts)])
+
+def _mix64(x):
+    """splitmix64 finaliser over a uint64 array (wraps modulo 2**64)"""
+    with np.errstate(over='ignore'):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def processed_token_hashes(data):
+    """
+    Token hashes for rows of the processed training data, without building strings
+
+    Value tokens hash (column, exact value); flag tokens hash the column and
+    are present only when the flag is set.
+
+    Returns:
+        (hashes, offsets) as hash_token_sets
+    """
+    value_columns = [col for col in PROXY_VALUE_COLUMNS if col in data.columns]
+    flag_columns = [col for col in data.columns if col.startswith(PROXY_FLAG_PREFIXES)]
+    columns = value_columns + flag_columns
+    values = data[columns].to_numpy(dtype=np.float64)
+    present = np.ones(values.shape, dtype=bool)
+    present[:, len(value_columns):] = values[:, len(value_columns):] != 0
+    present &= ~np.isnan(values)
+
+    column_ids = pd.util.hash_array(np.array(columns, dtype=object))
+    bits = np.where(present[:, :len(value_columns)], values[:, :len(value_columns)], 0).view(np.uint64)
+    token_values = np.concatenate([bits, np.zeros((len(data), len(flag_columns)), dtype=np.uint64)], axis=1)
+    hashes = _mix64(_mix64(token_values) ^ column_ids)
+
+    counts = present.sum(axis=1)
+    return hashes[present], np.concatenate([[0], np.cumsum(counts)])
+
+# Signatures
+
+
+def hash_coefficients(num_perm=NUM_PERM, seed=1):
+    """
+    (a, b) of the multiply-shift hashes (a * x + b) mod 2**64 >> 32, a odd
+
+    Token hashes are mixed once first, so these cheap per-function hashes
+    see well-spread inputs.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64, endpoint=True) | np.uint64(1)
+    b = rng.integers(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64, endpoint=True)
+    return a, b
+
+def minhash_signatures(hashes, offsets, coefficients):
+    """
+    MinHash signature of each listing's token set
+
+    Listings are processed in blocks of about TOKENS_PER_BLOCK tokens; within
+    a block every hash function is applied to every token at once and
+    reduced per listing with np.minimum.reduceat.
+
+    Returns:
+        (listings x num_perm) uint32 array; listings without tokens get all
+        0xFFFFFFFF and never match anything
+    """
+    a, b = coefficients
+    n = len(offsets) - 1
+    signatures = np.full((n, len(a)), np.iinfo(np.uint32).max, dtype=np.uint32)
+    lo = 0
+    while lo < n:
+        # Listings whose tokens fit the block (at least one listing per block)
+        hi = max(int(np.searchsorted(offsets, offsets[lo] + TOKENS_PER_BLOCK, side='right')) - 1, lo + 1)
+        hi = min(hi, n)
+        starts, stop = offsets[lo:hi], offsets[hi]
+        if stop > starts[0]:
+            block = _mix64(hashes[starts[0]:stop])
+            with np.errstate(over='ignore'):
+                values = (a[:, None] * block[None, :] + b[:, None]) >> np.uint64(32)
+            has_tokens = offsets[lo + 1:hi + 1] > starts
+            # reduceat needs strictly valid starts; empty listings keep the fill value
+            mins = np.minimum.reduceat(values, (starts[has_tokens] - starts[0]), axis=1)
+            signatures[lo:hi][has_tokens] = mins.T
+        lo = hi
+    return signatures
+
+def estimated_jaccard(signature, others):
+    """Share of agreeing hash functions between one signature and each row of others"""
+    return (others == signature).mean(axis=1)
+
+# Index
+
+
+class MinHashLSH:
+    """
+    Banded LSH index over MinHash signatures, updatable one scrape at a time
+
+    Each band of rows_per_band hash values is reduced to one 64-bit key.
+    Every band keeps its keys sorted in a NumPy array alongside listing
+    positions (12 bytes per listing and band), so candidates for a whole
+    scrape come from searchsorted rather than per-listing dict lookups.
+    Candidates whose estimated Jaccard reaches threshold are near-duplicates.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, bands=BANDS, threshold=THRESHOLD, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.threshold = threshold
+        self.coefficients = hash_coefficients(num_perm, seed)
+        self.band_sorted_keys = [np.empty(0, dtype=np.uint64) for _ in range(bands)]
+        self.band_positions = [np.empty(0, dtype=np.int32) for _ in range(bands)]
+        self.keys = []
+        self.signatures = np.empty((0, num_perm), dtype=np.uint32)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def signatures_for(self, hashes, offsets):
+        return minhash_signatures(hashes, offsets, self.coefficients)
+
+    def band_keys(self, signatures):
+        """(listings x bands) uint64 bucket keys"""
+        bands = signatures.reshape(len(signatures), self.bands, self.rows_per_band).astype(np.uint64)
+        keys = np.zeros(bands.shape[:2], dtype=np.uint64)
+        for row in range(self.rows_per_band):
+            keys = _mix64(keys ^ bands[:, :, row])
+        return keys
+
+    def _candidate_pairs(self, band_keys, positions):
+        """
+        (listing, candidate) position pairs sharing a band key, each candidate
+        indexed before its listing
+        """
+        pairs = []
+        for band in range(self.bands):
+            sorted_keys, band_positions = self.band_sorted_keys[band], self.band_positions[band]
+            lo = np.searchsorted(sorted_keys, band_keys[:, band], side='left')
+            hi = np.searchsorted(sorted_keys, band_keys[:, band], side='right')
+            counts = hi - lo
+            # Expand each [lo, hi) range into its members
+            owners = np.repeat(positions, counts)
+            members = band_positions[np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())]
+            earlier = members < owners
+            pairs.append(owners[earlier].astype(np.int64) << 32 | members[earlier])
+        pairs = np.unique(np.concatenate(pairs))
+        return (pairs >> 32).astype(np.int64), (pairs & 0xFFFFFFFF).astype(np.int64)
+
+    def add(self, keys, signatures):
+        """
+        Insert listings and report the near-duplicates among them
+
+        Each listing is compared with everything indexed before it, including
+        earlier listings of the same batch. Listings without tokens are
+        stored but never bucketed.
+
+        Returns:
+            list of (key, matched key, estimated Jaccard)
+        """
+        signatures = np.asarray(signatures, dtype=np.uint32)
+        start = len(self.keys)
+        self.keys.extend(keys)
+        self.signatures = np.concatenate([self.signatures, signatures])
+
+        positions = np.arange(start, len(self.keys), dtype=np.int32)
+        bucketed = signatures[:, 0] != np.iinfo(np.uint32).max
+        band_keys = self.band_keys(signatures[bucketed])
+        positions = positions[bucketed]
+        for band in range(self.bands):
+            merged_keys = np.concatenate([self.band_sorted_keys[band], band_keys[:, band]])
+            order = np.argsort(merged_keys, kind='stable')
+            self.band_sorted_keys[band] = merged_keys[order]
+            self.band_positions[band] = np.concatenate([self.band_positions[band], positions])[order]
+
+        listings, candidates = self._candidate_pairs(band_keys, positions)
+        similarity = (self.signatures[listings] == self.signatures[candidates]).mean(axis=1)
+        similar = similarity >= self.threshold
+        return [(self.keys[i], self.keys[j], float(value))
+                for i, j, value in zip(listings[similar], candidates[similar], similarity[similar])]
+
+    def query(self, signature):
+        """
+        Indexed listings similar to one signature, without inserting it
+
+        Returns:
+            list of (key, estimated Jaccard), most similar first
+        """
+        candidates = []
+        for band, key in enumerate(self.band_keys(signature[None, :])[0]):
+            sorted_keys = self.band_sorted_keys[band]
+            lo, hi = np.searchsorted(sorted_keys, key, side='left'), np.searchsorted(sorted_keys, key, side='right')
+            candidates.append(self.band_positions[band][lo:hi])
+        candidates = np.unique(np.concatenate(candidates))
+        similarity = estimated_jaccard(signature, self.signatures[candidates])
+        order = np.argsort(-similarity)
+        return [(self.keys[candidates[i]], float(similarity[i])) for i in order if similarity[i] >= self.threshold]
+
+    def save(self, path=INDEX_PATH):
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path=INDEX_PATH):
+        return joblib.load(path)
+
+# Duplicate groups
+
+
+def duplicate_groups(n, matches, key_positions=None):
+    """
+    Group label per listing from near-duplicate pairs (union-find)
+
+    Args:
+        n: number of listings
+        matches: (key, matched key, similarity) pairs from MinHashLSH.add
+        key_positions: key -> position (default: keys are positions)
+
+    Returns:
+        int array where listings in a group share the label of its first member
+    """
+    parent = np.arange(n)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for key, other, _ in matches:
+        i, j = (key_positions[key], key_positions[other]) if key_positions is not None else (key, other)
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+    return np.array([find(i) for i in range(n)])
+
+def find_processed_duplicates(data, threshold=THRESHOLD):
+    """
+    Near-duplicate groups in the processed training data
+
+    Returns:
+        (group label per row, list of matched (row, row, similarity) pairs)
+    """
+    index = MinHashLSH(threshold=threshold)
+    signatures = index.signatures_for(*processed_token_hashes(data))
+    matches = index.add(list(range(len(data))), signatures)
+    return duplicate_groups(len(data), matches), matches
+
+def index_listings(index, path, chunk_rows=CHUNK_ROWS):
+    """
+    Check a CSV of raw listings against an index and add them, chunk by chunk
+
+    Only one chunk's token strings exist at a time; listings are keyed by
+    their id column (row number when there is none).
+
+    Returns:
+        (number of listings, list of (key, matched key, estimated Jaccard))
+    """
+    n_listings = 0
+    matches = []
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        keys = (chunk['id'] if 'id' in chunk else chunk.index).tolist()
+        hashes, offsets = hash_token_sets([record_tokens(row) for row in chunk.to_dict('records')])
+        matches.extend(index.add(keys, index.signatures_for(hashes, offsets)))
+        n_listings += len(chunk)
+    return n_listings, matches
+
+def drop_near_duplicates(data, threshold=THRESHOLD):
+    """Training data with only the first listing of each near-duplicate group"""
+    groups, _ = find_processed_duplicates(data, threshold)
+    return data[groups == np.arange(len(data))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--listings', default=None,
+                        help="CSV of raw listings (id, description, amenities) to check and add to the index")
+    parser.add_argument('--index', default=INDEX_PATH)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--output', default=None, help="CSV for the near-duplicate pairs found")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.listings:
+        index = MinHashLSH.load(args.index) if os.path.exists(args.index) else MinHashLSH(threshold=args.threshold)
+        indexed = len(index)
+        n_listings, matches = index_listings(index, args.listings)
+        index.save(args.index)
+        flagged = len({key for key, _, _ in matches})
+        print(f"{n_listings:,} listings checked against {indexed:,} indexed in {time.perf_counter() - start:.1f}s: "
+              f"{flagged:,} near-duplicates; index now holds {len(index):,} ({args.index})")
+    else:
+        data = pd.read_csv(TRAINING_DATA_PATH)
+        groups, matches = find_processed_duplicates(data, args.threshold)
+        sizes = pd.Series(groups).value_counts()
+        duplicated = sizes[sizes > 1]
+        print(f"{len(data):,} training listings in {time.perf_counter() - start:.2f}s: {len(matches):,} near-duplicate pairs, "
+              f"{len(duplicated):,} groups covering {duplicated.sum():,} listings; "
+              f"dedup keeps {len(sizes):,} ({len(data) - len(sizes):,} dropped)")
+        print(f"largest groups: {duplicated.head(10).tolist()}")
+
+    if args.output:
+        pd.DataFrame(matches, columns=['listing', 'matched_listing', 'similarity']).to_csv(args.output, index=False)
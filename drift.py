@@ -0,0 +1,208 @@
+"""
+Drift monitoring: fixed-bin histogram sketches of live model inputs compared
+against reference sketches built from the training data
+"""
+
+import os
+import threading
+
+import joblib
+import numpy as np
+import pandas as pd
+
+REFERENCE_PATH = 'drift_reference.pkl'
+TRAINING_DATA_PATH = 'airbnb_processed_data.csv'
+
+# PSI rule of thumb: < 0.1 stable, 0.1-0.25 moderate shift, > 0.25 major shift
+PSI_MODERATE = 0.1
+PSI_MAJOR = 0.25
+
+# Reference sketches
+
+
+def _feature_edges(values, n_bins):
+    """Interior bin edges for one feature: value midpoints for discrete features, quantiles otherwise"""
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return np.array([])
+
+    unique_values = np.unique(values)
+    if len(unique_values) <= n_bins:
+        return (unique_values[:-1] + unique_values[1:]) / 2
+
+    quantiles = np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1])
+    return np.unique(quantiles)
+
+def build_reference(data, feature_columns, n_bins=10):
+    """
+    Build reference sketches from training data
+
+    Args:
+        data: DataFrame containing every feature column
+        feature_columns: features to sketch, in model order
+        n_bins: maximum number of bins per feature
+
+    Returns:
+        dict with feature names, a padded edge matrix and reference counts
+    """
+    X = data[feature_columns].to_numpy(dtype=np.float64)
+
+    edges_list = [_feature_edges(X[:, i], n_bins) for i in range(X.shape[1])]
+    max_edges = max(len(e) for e in edges_list)
+
+    # Pad with +inf so every feature shares one (features, edges) matrix
+    edges = np.full((len(feature_columns), max_edges), np.inf)
+    for i, e in enumerate(edges_list):
+        edges[i, :len(e)] = e
+
+    sketch = HistogramSketch(edges)
+    sketch.update(X)
+
+    return {
+        'feature_columns': list(feature_columns),
+        'edges': edges,
+        'n_bins': np.array([len(e) + 1 for e in edges_list]),
+        'counts': sketch.counts,
+        'n_rows': len(X)
+    }
+
+def load_reference(feature_columns, path=REFERENCE_PATH, data_path=TRAINING_DATA_PATH):
+    """
+    Load precomputed reference sketches, building them if missing
+
+    A saved reference for different feature columns (e.g. a reduced bundle)
+    is left in place and the reference is built in memory instead.
+    """
+    if os.path.exists(path):
+        reference = joblib.load(path)
+        if reference['feature_columns'] == list(feature_columns):
+            return reference
+        return build_reference(pd.read_csv(data_path), feature_columns)
+
+    reference = build_reference(pd.read_csv(data_path), feature_columns)
+    joblib.dump(reference, path)
+    return reference
+
+# Streaming sketches
+
+
+class HistogramSketch:
+    """
+    Per-feature histograms over fixed bin edges
+
+    Memory is (features x bins) regardless of how many rows are added, and
+    sketches with the same edges can be merged by adding counts.
+    """
+
+    def __init__(self, edges):
+        self.edges = edges
+        self.counts = np.zeros((edges.shape[0], edges.shape[1] + 1), dtype=np.int64)
+        self.missing = np.zeros(edges.shape[0], dtype=np.int64)
+        self.n_rows = 0
+
+    def update(self, X, chunk_size=4096):
+        """Add a batch of rows (2D array or DataFrame in edge order)"""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        n_features, n_slots = self.counts.shape
+        offsets = np.arange(n_features) * n_slots
+
+        for start in range(0, len(X), chunk_size):
+            chunk = X[start:start + chunk_size]
+            missing = np.isnan(chunk)
+
+            # Bin index = number of edges <= value, for every feature at once
+            bins = (chunk[:, :, None] >= self.edges[None, :, :]).sum(axis=2)
+            flat = (bins + offsets)[~missing]
+            self.counts += np.bincount(flat, minlength=n_features * n_slots).reshape(n_features, n_slots)
+            self.missing += missing.sum(axis=0)
+
+        self.n_rows += len(X)
+
+    def merge(self, other):
+        """Add the counts of another sketch with identical edges"""
+        self.counts += other.counts
+        self.missing += other.missing
+        self.n_rows += other.n_rows
+
+# Drift scores
+
+
+def _proportions(counts, epsilon):
+    totals = counts.sum(axis=1, keepdims=True)
+    proportions = counts / np.maximum(totals, 1)
+    return np.clip(proportions, epsilon, None)
+
+def population_stability_index(reference_counts, live_counts, epsilon=1e-4):
+    """PSI per feature from two count matrices of the same shape"""
+    ref = _proportions(reference_counts, epsilon)
+    live = _proportions(live_counts, epsilon)
+    return ((live - ref) * np.log(live / ref)).sum(axis=1)
+
+def ks_statistic(reference_counts, live_counts):
+    """Binned Kolmogorov-Smirnov distance per feature"""
+    ref_cdf = np.cumsum(reference_counts, axis=1) / np.maximum(reference_counts.sum(axis=1, keepdims=True), 1)
+    live_cdf = np.cumsum(live_counts, axis=1) / np.maximum(live_counts.sum(axis=1, keepdims=True), 1)
+    return np.abs(ref_cdf - live_cdf).max(axis=1)
+
+
+class DriftMonitor:
+    """
+    Thread-safe live input sketch with on-demand drift scoring
+
+    Only bin counts are kept; raw inputs are never stored. Columns in
+    default_only (FeatureLayout.unfilled_columns) are always the stored
+    default for live inputs, so they are listed but not scored.
+    """
+
+    def __init__(self, reference, default_only=()):
+        self.reference = reference
+        self.default_only = set(default_only)
+        self.live = HistogramSketch(reference['edges'])
+        self._lock = threading.Lock()
+
+    def update(self, features):
+        """Add processed feature rows (DataFrame in model column order or 2D array)"""
+        if isinstance(features, pd.DataFrame):
+            features = features.to_numpy(dtype=np.float64)
+        with self._lock:
+            self.live.update(features)
+
+    def report(self):
+        """
+        Drift scores for every feature
+
+        Returns:
+            DataFrame indexed by feature with psi, ks and status, highest PSI
+            first; default-only columns come last with status 'default only'
+            and no scores
+        """
+        with self._lock:
+            live_counts = self.live.counts.copy()
+            n_live = self.live.n_rows
+
+        psi = population_stability_index(self.reference['counts'], live_counts)
+        ks = ks_statistic(self.reference['counts'], live_counts)
+
+        status = np.where(psi >= PSI_MAJOR, 'major', np.where(psi >= PSI_MODERATE, 'moderate', 'stable'))
+        default_only = np.isin(self.reference['feature_columns'], list(self.default_only))
+        psi, ks = np.where(default_only, np.nan, psi), np.where(default_only, np.nan, ks)
+        status = np.where(default_only, 'default only', status)
+        report = pd.DataFrame(
+            {'psi': psi, 'ks': ks, 'status': status},
+            index=pd.Index(self.reference['feature_columns'], name='feature')
+        )
+        report.attrs['n_live'] = n_live
+        return report.sort_values('psi', ascending=False)
+
+    def reset(self):
+        """Start a new monitoring window"""
+        with self._lock:
+            self.live = HistogramSketch(self.reference['edges'])
+
+
+if __name__ == "__main__":
+    columns = joblib.load('original_feature_columns.pkl')
+    reference = build_reference(pd.read_csv(TRAINING_DATA_PATH), columns)
+    joblib.dump(reference, REFERENCE_PATH)
+    print(f"Saved reference sketches for {len(columns)} features "
+          f"({reference['counts'].size} bins) to {REFERENCE_PATH}")
@@ -0,0 +1,221 @@
+"""
+Ensemble of gradient boosting, random forest, LightGBM and XGBoost members
+scored in parallel threads and combined with learned weights or a stacker
+
+The fitted ensemble is saved as the model of an ordinary artifact bundle, so
+the app and prediction service load and call it like a single model.
+
+Run with: python ensemble.py --bundle bundles/ensemble --combiner weights
+"""
+
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import lightgbm as lgb
+import numpy as np
+import xgboost as xgb
+from scipy.optimize import nnls
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import r2_score
+from sklearn.preprocessing import RobustScaler
+
+import artifacts
+import audit_log
+import tuning
+
+# Member configurations: the tuned settings from the notebook where there are any.
+# Every member predicts single-threaded; parallelism comes from scoring members concurrently.
+MEMBER_PARAMS = {
+    'gradient_boosting': {'n_estimators': 200, 'max_depth': 3, 'learning_rate': 0.1},
+    'random_forest': {'n_estimators': 300, 'max_depth': None, 'min_samples_split': 10,
+                      'min_samples_leaf': 2, 'max_features': None},
+    'lightgbm': {'n_estimators': 300, 'learning_rate': 0.05, 'num_leaves': 31},
+    'xgboost': {'n_estimators': 200, 'max_depth': 3, 'learning_rate': 0.2}
+}
+
+COMBINERS = ('weights', 'stacker')
+
+
+def build_member(name, params=None, seed=42):
+    """Unfitted single-threaded estimator for an ensemble member"""
+    params = MEMBER_PARAMS[name] if params is None else params
+    if name == 'gradient_boosting':
+        return GradientBoostingRegressor(random_state=seed, **params)
+    if name == 'random_forest':
+        return RandomForestRegressor(random_state=seed, n_jobs=1, **params)
+    if name == 'lightgbm':
+        return lgb.LGBMRegressor(random_state=seed, n_jobs=1, verbose=-1, **params)
+    if name == 'xgboost':
+        return xgb.XGBRegressor(objective='reg:squarederror', random_state=seed, n_jobs=1, **params)
+    raise ValueError(f"Unknown ensemble member: {name}")
+
+
+class EnsembleModel:
+    """
+    Weighted or stacked combination of fitted regressors
+
+    predict() converts the scaled input once to a C-contiguous float32
+    matrix shared by every member and scores the members in a thread pool.
+    All member libraries release the GIL while predicting, so members run
+    concurrently on a multi-core machine.
+    """
+
+    def __init__(self, members, weights=None, stacker=None, parallel=True):
+        if (weights is None) == (stacker is None):
+            raise ValueError("Provide exactly one of weights or stacker")
+        self.members = dict(members)
+        self.weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+        self.stacker = stacker
+        self.parallel = parallel
+        self._executor = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        return state
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.members), thread_name_prefix='ensemble')
+        return self._executor
+
+    def member_predictions(self, X):
+        """(n_rows, n_members) predictions in member order"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        models = list(self.members.values())
+        if self.parallel and len(models) > 1:
+            columns = list(self.executor.map(lambda model: model.predict(X), models))
+        else:
+            columns = [model.predict(X) for model in models]
+        return np.column_stack(columns).astype(np.float64)
+
+    def combine(self, member_predictions):
+        """Final prediction from a matrix of member predictions"""
+        if self.weights is not None:
+            return member_predictions @ self.weights
+        return self.stacker.predict(member_predictions)
+
+    def predict(self, X):
+        return self.combine(self.member_predictions(X))
+
+
+def fit_combiner(member_predictions, y, combiner='weights'):
+    """
+    Learn how to combine member predictions on held-out rows
+
+    weights: non-negative least squares weights, no intercept
+    stacker: linear regression with non-negative coefficients and an intercept
+
+    Returns:
+        dict of EnsembleModel keyword arguments (weights or stacker)
+    """
+    if combiner == 'weights':
+        weights, _ = nnls(member_predictions, np.asarray(y, dtype=np.float64))
+        return {'weights': weights}
+    if combiner == 'stacker':
+        return {'stacker': LinearRegression(positive=True).fit(member_predictions, y)}
+    raise ValueError(f"Unknown combiner: {combiner}")
+
+def _scores(y_true, predictions):
+    return {'rmse': tuning._rmse(y_true, predictions), 'r2': float(r2_score(y_true, predictions))}
+
+def train_ensemble(data, feature_columns, member_names=tuple(MEMBER_PARAMS), combiner='weights', seed=42):
+    """
+    Fit members and a combiner with the shared 60/20/20 split
+
+    Members are fit on train and the combiner on their validation
+    predictions; members with a zero weight are dropped, the rest are refit
+    on train + validation (with the scaler) and the held-out test split is
+    scored.
+
+    Returns:
+        (EnsembleModel, fitted scaler, metrics dict)
+    """
+    X = data[feature_columns].to_numpy(dtype=np.float64)
+    y = data[tuning.TARGET_COLUMN].to_numpy(dtype=np.float64)
+    train, val, test = tuning.split_indices(len(data), seed)
+
+    scaler = RobustScaler().fit(X[train])
+    X_train, X_val = scaler.transform(X[train]), scaler.transform(X[val])
+    members = {name: build_member(name, seed=seed).fit(X_train, y[train]) for name in member_names}
+    stage = EnsembleModel(members, weights=np.full(len(members), 1 / len(members)))
+    val_predictions = stage.member_predictions(X_val)
+    combination = fit_combiner(val_predictions, y[val], combiner)
+
+    metrics = {'members': {}}
+    for i, name in enumerate(member_names):
+        metrics['members'][name] = {'val': _scores(y[val], val_predictions[:, i])}
+
+    # Members the combiner gives no weight are not refit or served
+    coefficients = combination['weights'] if combiner == 'weights' else combination['stacker'].coef_
+    kept = np.flatnonzero(coefficients > 0)
+    metrics['dropped'] = [name for i, name in enumerate(member_names) if i not in kept]
+    member_names = [member_names[i] for i in kept]
+    combination = fit_combiner(val_predictions[:, kept], y[val], combiner)
+    metrics['val'] = _scores(y[val], EnsembleModel(members, **combination).combine(val_predictions[:, kept]))
+
+    fit_rows = np.concatenate([train, val])
+    scaler = RobustScaler().fit(X[fit_rows])
+    X_fit, X_test = scaler.transform(X[fit_rows]), scaler.transform(X[test])
+    members = {name: build_member(name, seed=seed).fit(X_fit, y[fit_rows]) for name in member_names}
+    model = EnsembleModel(members, **combination)
+
+    test_predictions = model.member_predictions(X_test)
+    for i, name in enumerate(member_names):
+        metrics['members'][name]['test'] = _scores(y[test], test_predictions[:, i])
+    metrics['test'] = _scores(y[test], model.combine(test_predictions))
+    return model, scaler, metrics
+
+def combination_summary(model):
+    """JSON-serialisable member -> weight (stacker coefficients plus intercept)"""
+    if model.weights is not None:
+        return {'weights': dict(zip(model.members, model.weights.tolist()))}
+    return {'weights': dict(zip(model.members, model.stacker.coef_.tolist())),
+            'intercept': float(model.stacker.intercept_)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bundle', default=os.path.join('bundles', 'ensemble'))
+    parser.add_argument('--members', nargs='+', default=list(MEMBER_PARAMS), choices=list(MEMBER_PARAMS))
+    parser.add_argument('--combiner', default='weights', choices=COMBINERS)
+    parser.add_argument('--features-from', default=None,
+                        help="bundle whose feature columns and defaults to use (default: the deployed model's)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--near-duplicates', default='keep', choices=['keep', 'drop'],
+                        help="drop keeps one listing per near-duplicate group (see dedup.py)")
+    args = parser.parse_args()
+
+    base = artifacts.load_bundle(args.features_from)
+    data = tuning.read_training_data(near_duplicates=args.near_duplicates)
+    # Train through the importable module so the pickled model does not reference __main__
+    import ensemble
+    model, scaler, metrics = ensemble.train_ensemble(data, base.feature_columns, args.members, args.combiner, args.seed)
+
+    for name, scores in metrics['members'].items():
+        test = (f"test RMSE £{scores['test']['rmse']:.2f} (R² {scores['test']['r2']:.3f})"
+                if 'test' in scores else 'dropped (zero weight)')
+        print(f"{name:>17}: val RMSE £{scores['val']['rmse']:.2f} (R² {scores['val']['r2']:.3f}), {test}")
+    print(f"{'ensemble':>17}: val RMSE £{metrics['val']['rmse']:.2f} (R² {metrics['val']['r2']:.3f}), "
+          f"test RMSE £{metrics['test']['rmse']:.2f} (R² {metrics['test']['r2']:.3f})")
+    summary = combination_summary(model)
+    print(', '.join(f"{name}={weight:.3f}" for name, weight in summary['weights'].items()))
+
+    metadata = {
+        'family': 'ensemble',
+        'combiner': args.combiner,
+        'members': {name: MEMBER_PARAMS[name] for name in model.members},
+        'dropped': metrics['dropped'],
+        **summary,
+        'member_scores': metrics['members'],
+        'val_rmse': metrics['val']['rmse'],
+        'test_rmse': metrics['test']['rmse'],
+        'test_r2': metrics['test']['r2'],
+        'data_version': audit_log.file_version(tuning.TRAINING_DATA_PATH),
+        'near_duplicates': args.near_duplicates
+    }
+    artifacts.save_bundle(args.bundle, model, scaler, base.feature_columns, base.defaults, metadata)
+    print(f"Saved ensemble bundle to {args.bundle}")
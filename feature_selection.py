@@ -0,0 +1,148 @@
+"""
+Leakage-safe feature selection: drops target-derived, constant, serve-time
+default-only and near-zero-importance columns and exports a reduced bundle
+whose feature list is the only manifest inference needs
+
+Run with: python feature_selection.py --bundle bundles/reduced
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import r2_score
+from sklearn.preprocessing import RobustScaler
+
+import artifacts
+import preprocessing
+import tuning
+
+# Column names containing this are derived from the target (e.g. price_per_person)
+TARGET_DERIVED_PATTERN = 'price'
+# Columns this rank-correlated with the target are treated as leaked
+LEAKAGE_CORRELATION = 0.95
+# Columns below this share of total split gain are dropped
+MIN_IMPORTANCE_SHARE = 0.001
+
+# Configuration of the original deployed model
+DEPLOYED_PARAMS = {'n_estimators': 200, 'max_depth': 6, 'learning_rate': 0.3}
+
+
+def target_derived_columns(data, feature_columns, target=tuning.TARGET_COLUMN):
+    """Columns named after the target or almost perfectly rank-correlated with it"""
+    named = [col for col in feature_columns if TARGET_DERIVED_PATTERN in col.lower()]
+    correlation = data[feature_columns].corrwith(data[target], method='spearman').abs()
+    correlated = correlation[correlation >= LEAKAGE_CORRELATION].index.tolist()
+    return sorted(set(named) | set(correlated))
+
+def constant_columns(data, feature_columns):
+    """Columns with a single value in the training data"""
+    return [col for col in feature_columns if data[col].nunique(dropna=False) <= 1]
+
+def default_only_columns(feature_columns, defaults):
+    """Columns no extractor fills, so inference always sends the training default"""
+    return preprocessing.compile_feature_layout(feature_columns, defaults).unfilled_columns
+
+def importance_shares(X, y, params, seed=42):
+    """Share of total split gain per column (0 for columns never split on)"""
+    model = xgb.XGBRegressor(objective='reg:squarederror', random_state=seed, **params)
+    model.fit(X, y)
+    gain = pd.Series(model.get_booster().get_score(importance_type='total_gain'))
+    shares = gain.reindex(X.columns, fill_value=0.0)
+    return shares / shares.sum()
+
+def evaluate(data, feature_columns, params, seed=42, serve_defaults=None):
+    """
+    Validation and test RMSE / R² with the scaler and model fit on the training split
+
+    serve_defaults: column -> value written into the evaluation rows, to score
+    the model as it is served when those columns only ever get defaults
+    """
+    train, val, test = tuning.split_indices(len(data), seed)
+    X = data[feature_columns]
+    if serve_defaults:
+        X = X.copy()
+        evaluation_rows = X.index[np.concatenate([val, test])]
+        for col, value in serve_defaults.items():
+            X.loc[evaluation_rows, col] = value
+    y = data[tuning.TARGET_COLUMN]
+    scaler = RobustScaler().fit(X.iloc[train])
+    model = tuning.build_model('xgboost', params, seed)
+    model.fit(scaler.transform(X.iloc[train]), y.iloc[train])
+
+    metrics = {'n_features': len(feature_columns)}
+    for name, rows in (('val', val), ('test', test)):
+        predictions = model.predict(scaler.transform(X.iloc[rows]))
+        metrics[f'{name}_rmse'] = tuning._rmse(y.iloc[rows], predictions)
+        metrics[f'{name}_r2'] = float(r2_score(y.iloc[rows], predictions))
+    return metrics
+
+def select_features(data, feature_columns, defaults, params=DEPLOYED_PARAMS,
+                    min_share=MIN_IMPORTANCE_SHARE, drop_default_only=True, seed=42):
+    """
+    Choose the columns to keep
+
+    Importance is measured on the training split only, after the
+    target-derived, constant and default-only columns are removed.
+
+    Returns:
+        (kept columns in original order, dict of reason -> dropped columns)
+    """
+    dropped = {
+        'target_derived': target_derived_columns(data, feature_columns),
+        'constant': constant_columns(data, feature_columns),
+        'default_only': default_only_columns(feature_columns, defaults) if drop_default_only else []
+    }
+    removed = set().union(*dropped.values())
+    candidates = [col for col in feature_columns if col not in removed]
+
+    train, _, _ = tuning.split_indices(len(data), seed)
+    X_train = data[candidates].iloc[train]
+    scaled = pd.DataFrame(RobustScaler().fit_transform(X_train), columns=candidates)
+    shares = importance_shares(scaled, data[tuning.TARGET_COLUMN].iloc[train], params, seed)
+
+    dropped['low_importance'] = shares[shares < min_share].index.tolist()
+    removed.update(dropped['low_importance'])
+    kept = [col for col in feature_columns if col not in removed]
+    return kept, dropped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bundle', default=os.path.join('bundles', 'reduced'))
+    parser.add_argument('--params-from', default=None,
+                        help="bundle whose manifest params to use (default: the deployed configuration)")
+    parser.add_argument('--min-share', type=float, default=MIN_IMPORTANCE_SHARE)
+    parser.add_argument('--keep-default-only', action='store_true')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    base = artifacts.load_bundle()
+    params = DEPLOYED_PARAMS
+    if args.params_from:
+        params = artifacts.load_bundle(args.params_from).manifest['metadata']['params']
+
+    data = pd.read_csv(tuning.TRAINING_DATA_PATH)
+    kept, dropped = select_features(data, base.feature_columns, base.defaults, params, args.min_share,
+                                    not args.keep_default_only, args.seed)
+
+    # The full model as served: default-only columns never vary at inference
+    layout = preprocessing.compile_feature_layout(base.feature_columns, base.defaults)
+    serve_defaults = {col: layout.defaults_vector[layout.index[col]] for col in layout.unfilled_columns}
+    full = evaluate(data, base.feature_columns, params, args.seed)
+    full_served = evaluate(data, base.feature_columns, params, args.seed, serve_defaults)
+    reduced = evaluate(data, kept, params, args.seed)
+    for reason, columns in dropped.items():
+        print(f"{reason}: {len(columns)} dropped")
+    for name, metrics in (('full', full), ('served', full_served), ('reduced', reduced)):
+        print(f"{name:>8}: {metrics['n_features']} features, val RMSE £{metrics['val_rmse']:.2f} "
+              f"(R² {metrics['val_r2']:.3f}), test RMSE £{metrics['test_rmse']:.2f} (R² {metrics['test_r2']:.3f})")
+
+    defaults = {col: base.defaults[col] for col in kept if col in base.defaults}
+    tuning.export_bundle(args.bundle, 'xgboost', params, kept, defaults,
+                         {'dropped': dropped, 'full': full, 'full_served': full_served, 'reduced': reduced}, seed=args.seed)
+    print(f"Saved reduced bundle to {args.bundle}")
+    print(json.dumps({reason: columns[:10] for reason, columns in dropped.items()}, indent=2))
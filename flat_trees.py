@@ -0,0 +1,228 @@
+"""
+Compact flattened tree ensembles: an XGBoost booster exported to one packed
+array of nodes and scored with vectorised level-by-level traversal in NumPy
+
+Run with: python flat_trees.py --bundle bundles/flat --precision float16
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+import artifacts
+
+PRECISIONS = ('float32', 'float16')
+
+# Node flags
+DEFAULT_LEFT = 1
+LEAF = 2
+
+
+def node_dtype(precision='float32'):
+    """
+    Packed node record (9 bytes as float32, 7 as float16)
+
+    feature: split feature index
+    child: offset from this node to its left child (the right child follows
+        it); 0 for leaves, which loop on themselves
+    flags: DEFAULT_LEFT | LEAF
+    value: split threshold, or the leaf value for leaves
+    """
+    return np.dtype([('feature', '<u2'), ('child', '<u2'), ('flags', 'u1'), ('value', precision)])
+
+
+class FlatForest:
+    """
+    Sum-of-trees regressor over a packed node array
+
+    Every row walks all trees at once: each level gathers the current nodes'
+    features and thresholds and steps to a child. Leaves point at
+    themselves, so after max_depth levels every row sits on a leaf.
+    """
+
+    def __init__(self, nodes, roots, base_score, max_depth, n_features):
+        self.nodes = nodes
+        self.roots = roots
+        self.base_score = float(base_score)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the node and root arrays"""
+        return self.nodes.nbytes + self.roots.nbytes
+
+    def predict(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        # Unpack the records into contiguous columns once per call: gathers
+        # from strided record fields are several times slower
+        feature = self.nodes['feature'].astype(np.intp)
+        child = self.nodes['child'].astype(np.intp)
+        value = self.nodes['value'].astype(np.float32)
+        is_split = (self.nodes['flags'] & LEAF) == 0
+        default_right = is_split & ((self.nodes['flags'] & DEFAULT_LEFT) == 0)
+
+        row_start = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        flat = X.ravel()
+        index = np.repeat(self.roots.astype(np.intp)[None, :], n_rows, axis=0)
+        for _ in range(self.max_depth):
+            x = flat[row_start + feature[index]]
+            # x < threshold goes left; missing values follow the default branch; leaves stay put
+            go_right = np.where(np.isnan(x), default_right[index], (x >= value[index]) & is_split[index])
+            index += child[index]
+            index += go_right
+        return self.base_score + value[index].sum(axis=1, dtype=np.float64)
+
+
+def _booster_trees(booster):
+    model = json.loads(booster.save_raw('json'))
+    learner = model['learner']
+    base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+    return learner['gradient_booster']['model']['trees'], base_score, int(learner['learner_model_param']['num_feature'])
+
+def quantize_thresholds(thresholds, features, reference=None):
+    """
+    float16 thresholds that keep as many split decisions as possible
+
+    The model is trained on RobustScaler output, so thresholds are already
+    centred on each feature's median in IQR units, where float16 is densest.
+    Each threshold becomes the nearest float16 below it (inputs equal to the
+    threshold still go right) unless reference shows the one above it moves
+    fewer known values across the split.
+
+    Args:
+        thresholds, features: float32 split thresholds and their feature indices
+        reference: scaled matrix of known inputs (e.g. the training data)
+    """
+    thresholds = np.clip(thresholds, -np.finfo(np.float16).max, np.finfo(np.float16).max)
+    half = thresholds.astype(np.float16)
+    down = np.where(half.astype(np.float32) > thresholds, np.nextafter(half, np.float16(-np.inf)), half)
+    if reference is None:
+        return down
+
+    up = np.where(down.astype(np.float32) < thresholds, np.nextafter(down, np.float16(np.inf)), down)
+    reference = np.asarray(reference, dtype=np.float32)
+    chosen = down.copy()
+    for j in np.unique(features):
+        values = np.sort(reference[:, j])
+        rows = features == j
+        t, d, u = thresholds[rows], down[rows].astype(np.float32), up[rows].astype(np.float32)
+        # Known values that change side: [down, t) go right instead of left, [t, up) go left instead of right
+        moved_down = np.searchsorted(values, t, side='left') - np.searchsorted(values, d, side='left')
+        moved_up = np.searchsorted(values, u, side='left') - np.searchsorted(values, t, side='left')
+        chosen[rows] = np.where(moved_up < moved_down, up[rows], down[rows])
+    return chosen
+
+def flatten_booster(booster, precision='float32', reference=None):
+    """
+    Export a single-target XGBoost tree booster to a FlatForest
+
+    Args:
+        booster: xgboost.Booster (or a fitted XGBRegressor)
+        precision: 'float32' keeps thresholds and leaves exact; 'float16'
+            halves them
+        reference: scaled known inputs used to choose float16 rounding
+
+    Raises:
+        ValueError for categorical splits or trees deeper than uint16 offsets allow
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}")
+    if hasattr(booster, 'get_booster'):
+        booster = booster.get_booster()
+    trees, base_score, n_features = _booster_trees(booster)
+
+    parts = []
+    for tree in trees:
+        if any(tree['split_type']):
+            raise ValueError("Categorical splits are not supported")
+        left = np.array(tree['left_children'], dtype=np.int64)
+        is_leaf = left == -1
+        positions = np.arange(len(left))
+        depth = np.zeros(len(left), dtype=np.int64)
+        for node in positions[~is_leaf]:
+            # Children always follow their parent, so one forward pass sets every depth
+            depth[left[node]] = depth[left[node] + 1] = depth[node] + 1
+        parts.append({
+            'feature': np.where(is_leaf, 0, tree['split_indices']),
+            'child': np.where(is_leaf, 0, left - positions),
+            'flags': np.where(tree['default_left'], DEFAULT_LEFT, 0) | np.where(is_leaf, LEAF, 0),
+            'value': np.array(tree['split_conditions'], dtype=np.float32),
+            'is_leaf': is_leaf,
+            'depth': int(depth.max())
+        })
+
+    feature = np.concatenate([p['feature'] for p in parts])
+    child = np.concatenate([p['child'] for p in parts])
+    if child.max() > np.iinfo(np.uint16).max:
+        raise ValueError("Tree too large for 16-bit child offsets")
+    splits = ~np.concatenate([p['is_leaf'] for p in parts])
+    value = np.concatenate([p['value'] for p in parts])
+
+    nodes = np.empty(len(feature), dtype=node_dtype(precision))
+    nodes['feature'] = feature
+    nodes['child'] = child
+    nodes['flags'] = np.concatenate([p['flags'] for p in parts])
+    nodes['value'] = value
+    if precision == 'float16':
+        nodes['value'][splits] = quantize_thresholds(value[splits], feature[splits], reference)
+
+    roots = np.cumsum([0] + [len(p['feature']) for p in parts[:-1]]).astype(np.int32)
+    max_depth = max(p['depth'] for p in parts)
+    return FlatForest(nodes, roots, base_score, max_depth, n_features)
+
+def export_flat_bundle(path, source=None, precision='float16', reference=None, metadata=None):
+    """
+    Save a bundle whose model is the flattened copy of a bundle's XGBoost model
+
+    Args:
+        reference: raw (unscaled) known inputs in the bundle's feature order,
+            used to choose float16 rounding
+
+    Returns:
+        the manifest dict
+    """
+    bundle = artifacts.load_bundle(source)
+    if reference is not None:
+        reference = bundle.scaler.transform(reference)
+    forest = flatten_booster(bundle.model, precision, reference)
+    metadata = {
+        'family': 'flat_trees',
+        'precision': precision,
+        'source_version': artifacts.model_version(source),
+        'n_nodes': len(forest.nodes),
+        'nbytes': forest.nbytes,
+        **(metadata or {})
+    }
+    return artifacts.save_bundle(path, forest, bundle.scaler, bundle.feature_columns, bundle.defaults, metadata)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bundle', default=os.path.join('bundles', 'flat'))
+    parser.add_argument('--source', default=None, help="bundle with the XGBoost model (default: the original deployment)")
+    parser.add_argument('--precision', default='float16', choices=PRECISIONS)
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    import tuning
+
+    # Flatten through the importable module so the pickled model does not reference __main__
+    import flat_trees
+    source = artifacts.load_bundle(args.source)
+    data = pd.read_csv(tuning.TRAINING_DATA_PATH)
+    X = source.scaler.transform(data[source.feature_columns])
+    forest = flat_trees.flatten_booster(source.model, args.precision, X)
+
+    drift = np.abs(forest.predict(X) - source.model.predict(X))
+    print(f"{len(forest.nodes):,} nodes, max depth {forest.max_depth}: {forest.nbytes / 1024:.0f} KB "
+          f"({args.precision}) vs {len(source.model.get_booster().save_raw()) / 1024:.0f} KB booster")
+    print(f"drift over {len(X):,} listings: mean £{drift.mean():.4f}, max £{drift.max():.4f}")
+
+    flat_trees.export_flat_bundle(args.bundle, args.source, args.precision, data[source.feature_columns],
+                                  {'mean_abs_drift': float(drift.mean()), 'max_abs_drift': float(drift.max())})
+    print(f"Saved flattened bundle to {args.bundle}")
@@ -0,0 +1,370 @@
+"""
+Incremental model updates: continue boosting a deployed XGBoost bundle on
+the listings that changed between two processed snapshots
+
+The scaler keeps a per-feature histogram of every row it has seen, so new
+rows are added and superseded rows removed without revisiting the history,
+and the median/IQR are re-read from it. The existing trees' thresholds are
+mapped into the new scaled space (an exact per-feature affine change), then
+new trees are boosted on the changed rows plus a small replay sample of
+unchanged ones. The result is only saved if it does at least as well as the
+deployed model on a holdout of both.
+
+Run with: python incremental_update.py new_snapshot.csv --previous airbnb_processed_data.csv --bundle bundles/updated
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.preprocessing import RobustScaler
+
+import artifacts
+import audit_log
+import drift
+import tuning
+
+# Histogram bins per feature kept by the scaler sketch
+SKETCH_BINS = 256
+
+# Most boosting rounds added per update and their learning rate; a few
+# hundred rows overfit quickly, so rounds stop once validation stops improving
+UPDATE_ROUNDS = 50
+UPDATE_LEARNING_RATE = 0.05
+EARLY_STOPPING_ROUNDS = 5
+# Share of the training rows used for early stopping
+VALIDATION_FRACTION = 0.2
+# Unchanged listings replayed per changed listing, so new trees do not fit the delta alone
+REPLAY_RATIO = 1.0
+# Share of changed listings held out for validation (an equal number of unchanged ones is added)
+HOLDOUT_FRACTION = 0.2
+# Fewest rows for early stopping and for the changed-listing holdout; smaller
+# deltas are refused, since a handful of rows neither stops boosting nor
+# measures it (one validation row let all rounds through and tripled RMSE)
+MIN_VALIDATION_ROWS = 15
+MIN_HOLDOUT_ROWS = 10
+# Largest relative RMSE increase on unchanged listings that still promotes the update
+MAX_REGRESSION = 0.02
+
+# Tree parameters carried over from the deployed booster
+CARRIED_PARAMS = ('max_depth', 'min_child_weight', 'lambda', 'alpha', 'gamma', 'subsample', 'colsample_bytree',
+                  'max_bin', 'grow_policy')
+
+# Scaler
+
+
+class QuantileSketch:
+    """
+    Per-feature histograms over fixed edges with per-bin value sums
+
+    Rows can be added and removed, so the sketch follows a changing set of
+    listings. Features with few distinct values get one bin per value and
+    their quantiles are exact; others are interpolated within a bin.
+    """
+
+    def __init__(self, X, n_bins=SKETCH_BINS):
+        X = np.asarray(X, dtype=np.float64)
+        edges = [drift._feature_edges(X[:, j], n_bins) for j in range(X.shape[1])]
+        # One bin per distinct value when every edge is a midpoint between values
+        self.discrete = np.array([len(np.unique(X[~np.isnan(X[:, j]), j])) <= n_bins for j in range(X.shape[1])])
+        self.edges = np.full((X.shape[1], max(max(len(e) for e in edges), 1)), np.inf)
+        for j, e in enumerate(edges):
+            self.edges[j, :len(e)] = e
+        self.n_edges = np.array([len(e) for e in edges])
+        self.low = np.nanmin(X, axis=0) if len(X) else np.zeros(X.shape[1])
+        self.high = np.nanmax(X, axis=0) if len(X) else np.zeros(X.shape[1])
+        self.counts = np.zeros((X.shape[1], self.edges.shape[1] + 1), dtype=np.int64)
+        self.sums = np.zeros(self.counts.shape)
+        self.add(X)
+
+    @property
+    def nbytes(self):
+        return self.edges.nbytes + self.counts.nbytes + self.sums.nbytes
+
+    def _update(self, X, sign):
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        n_slots = self.counts.shape[1]
+        for j in range(X.shape[1]):
+            values = X[:, j][~np.isnan(X[:, j])]
+            bins = np.searchsorted(self.edges[j, :self.n_edges[j]], values, side='right')
+            self.counts[j] += sign * np.bincount(bins, minlength=n_slots)
+            self.sums[j] += sign * np.bincount(bins, weights=values, minlength=n_slots)
+        if sign > 0 and len(X):
+            self.low = np.fmin(self.low, np.nanmin(X, axis=0))
+            self.high = np.fmax(self.high, np.nanmax(X, axis=0))
+
+    def add(self, X):
+        self._update(X, 1)
+
+    def remove(self, X):
+        """Take rows that were previously added back out"""
+        self._update(X, -1)
+
+    def quantiles(self, q):
+        """
+        Per-feature q-quantile (0-1), with np.quantile's linear
+        interpolation between order statistics
+        """
+        out = np.empty(len(self.counts))
+        for j, counts in enumerate(self.counts):
+            n = counts.sum()
+            if n == 0:
+                out[j] = np.nan
+                continue
+            position = q * (n - 1)
+            below, above = int(np.floor(position)), int(np.ceil(position))
+            out[j] = (self._order_statistic(j, below) * (above - position + (below == above))
+                      + self._order_statistic(j, above) * (position - below))
+        return out
+
+    def _order_statistic(self, j, rank):
+        """Estimated rank-th smallest value (0-based) of feature j"""
+        cumulative = np.cumsum(self.counts[j])
+        b = int(np.searchsorted(cumulative, rank, side='right'))
+        if self.discrete[j]:
+            return self.sums[j, b] / self.counts[j, b]
+        n_edges = self.n_edges[j]
+        lower = self.edges[j, b - 1] if b > 0 else self.low[j]
+        upper = self.edges[j, b] if b < n_edges else self.high[j]
+        before = cumulative[b] - self.counts[j, b]
+        return lower + (rank - before + 0.5) / self.counts[j, b] * (upper - lower)
+
+
+class IncrementalRobustScaler(RobustScaler):
+    """
+    RobustScaler whose median and IQR can be refit from added and removed
+    rows alone, via a QuantileSketch of everything it has seen
+    """
+
+    def fit(self, X, y=None):
+        super().fit(X, y)
+        self.sketch_ = QuantileSketch(np.asarray(X, dtype=np.float64))
+        return self
+
+    @classmethod
+    def from_history(cls, scaler, X):
+        """Incremental copy of a fitted RobustScaler, sketching the rows it was fit on"""
+        incremental = cls(**scaler.get_params())
+        incremental.fit(X)
+        # Keep the deployed statistics exactly until the first update
+        incremental.center_, incremental.scale_ = scaler.center_.copy(), scaler.scale_.copy()
+        incremental.feature_names_in_ = getattr(scaler, 'feature_names_in_', incremental.feature_names_in_)
+        return incremental
+
+    def update(self, added=None, removed=None):
+        """Add and remove rows (raw feature values), then refresh center_ and scale_"""
+        if added is not None and len(added):
+            self.sketch_.add(added)
+        if removed is not None and len(removed):
+            self.sketch_.remove(removed)
+        low, high = self.quantile_range
+        self.center_ = self.sketch_.quantiles(0.5)
+        scale = self.sketch_.quantiles(high / 100) - self.sketch_.quantiles(low / 100)
+        self.scale_ = np.where(scale == 0, 1.0, scale)
+        return self
+
+# Booster
+
+
+def _booster(model):
+    return model.get_booster() if hasattr(model, 'get_booster') else model
+
+def remap_thresholds(booster, old_center, old_scale, new_center, new_scale):
+    """
+    Copy of a booster trained on (x - old_center) / old_scale that gives the
+    same splits on (x - new_center) / new_scale
+
+    Each split threshold t on feature f becomes
+    (t * old_scale[f] + old_center[f] - new_center[f]) / new_scale[f];
+    leaf values are untouched.
+
+    Histogram cuts sit exactly on training values (x < t goes left, so the
+    value itself goes right), and t is float32, so the mapped threshold is
+    lowered by the rounding error it carries to keep those values right.
+    """
+    model = json.loads(_booster(booster).save_raw('json'))
+    for tree in model['learner']['gradient_booster']['model']['trees']:
+        is_split = np.array(tree['left_children']) != -1
+        feature = np.array(tree['split_indices'])[is_split]
+        threshold = np.array(tree['split_conditions'], dtype=np.float64)
+        ratio = old_scale[feature] / new_scale[feature]
+        mapped = threshold[is_split] * ratio + (old_center[feature] - new_center[feature]) / new_scale[feature]
+        error = (np.abs(threshold[is_split]) * ratio + np.abs(mapped)) * np.finfo(np.float32).eps
+        threshold[is_split] = mapped - error
+        tree['split_conditions'] = threshold.astype(np.float32).tolist()
+    remapped = xgb.Booster()
+    remapped.load_model(bytearray(json.dumps(model).encode()))
+    return remapped
+
+def training_params(booster, learning_rate=UPDATE_LEARNING_RATE):
+    """Objective and tree parameters of a booster, with a new learning rate"""
+    config = json.loads(_booster(booster).save_config())['learner']
+    tree_params = config['gradient_booster'].get('tree_train_param', {})
+    params = {name: tree_params[name] for name in CARRIED_PARAMS if name in tree_params}
+    params.update({'objective': config['objective']['name'], 'eta': learning_rate})
+    return params
+
+def to_regressor(booster):
+    """XGBRegressor around a booster, as bundles store it"""
+    model = xgb.XGBRegressor(objective='reg:squarederror', n_estimators=booster.num_boosted_rounds())
+    model.load_model(bytearray(booster.save_raw('ubj')))
+    return model
+
+# Update
+
+
+def diff_snapshots(previous, current, columns):
+    """
+    Rows of current that are not in previous (new or changed listings) and
+    rows of previous that are not in current (changed or delisted), compared
+    by a content hash of columns
+
+    Returns:
+        (added, removed, unchanged) DataFrames
+    """
+    previous_hash = pd.util.hash_pandas_object(previous[columns], index=False).to_numpy()
+    current_hash = pd.util.hash_pandas_object(current[columns], index=False).to_numpy()
+    in_previous = np.isin(current_hash, previous_hash)
+    return current[~in_previous], previous[~np.isin(previous_hash, current_hash)], current[in_previous]
+
+def _rmse(model, scaler, data, feature_columns):
+    if not len(data):
+        return None
+    predictions = model.predict(scaler.transform(data[feature_columns]))
+    return float(np.sqrt(np.mean((predictions - data[tuning.TARGET_COLUMN].to_numpy()) ** 2)))
+
+def update_bundle(path, source, added, removed, unchanged, history=None, rounds=UPDATE_ROUNDS,
+                  learning_rate=UPDATE_LEARNING_RATE, seed=42, metadata=None):
+    """
+    Continue training a bundle's XGBoost model on changed listings and save
+    it to path if it passes the holdout check
+
+    Args:
+        source: bundle directory (None is the original deployment)
+        added: new and changed listings (processed rows with the target)
+        removed: superseded and delisted listings, taken out of the scaler
+        unchanged: listings still present as before, sampled for replay and
+            holdout (only a delta-sized sample is read)
+        history: rows the source scaler was fit on; required the first time
+            a plain RobustScaler is updated, to build its sketch
+
+    Returns:
+        dict of update statistics, with promoted True if the bundle was saved
+
+    Raises:
+        ValueError if the delta is too small to validate and hold out
+    """
+    start = time.perf_counter()
+    bundle = artifacts.load_bundle(source)
+    columns = bundle.feature_columns
+    if not isinstance(bundle.scaler, IncrementalRobustScaler):
+        if history is None:
+            raise ValueError("The source scaler has no sketch yet; pass the rows it was fit on as history")
+        scaler = IncrementalRobustScaler.from_history(bundle.scaler, history[columns])
+    else:
+        scaler = bundle.scaler
+
+    rng = np.random.default_rng(seed)
+    added = added.iloc[rng.permutation(len(added))]
+    n_holdout = int(round(len(added) * HOLDOUT_FRACTION))
+    if n_holdout < MIN_HOLDOUT_ROWS:
+        raise ValueError(f"{len(added)} changed listings is too few to update from; need at least "
+                         f"{int(np.ceil(MIN_HOLDOUT_ROWS / HOLDOUT_FRACTION))} to hold out {MIN_HOLDOUT_ROWS}")
+    holdout_added, train_added = added.iloc[:n_holdout], added.iloc[n_holdout:]
+    n_replay = min(int(round(len(train_added) * REPLAY_RATIO)), max(len(unchanged) - n_holdout, 0))
+    sample = unchanged.iloc[rng.choice(len(unchanged), min(n_replay + n_holdout, len(unchanged)), replace=False)]
+    holdout_unchanged, replay = sample.iloc[:n_holdout], sample.iloc[n_holdout:]
+
+    before = {'changed': _rmse(bundle.model, bundle.scaler, holdout_added, columns),
+              'unchanged': _rmse(bundle.model, bundle.scaler, holdout_unchanged, columns)}
+
+    train = pd.concat([train_added, replay])
+    train = train.iloc[rng.permutation(len(train))]
+    n_val = int(round(len(train) * VALIDATION_FRACTION))
+    if n_val < MIN_VALIDATION_ROWS:
+        raise ValueError(f"{len(train)} training rows leave {n_val} for early stopping; need at least "
+                         f"{MIN_VALIDATION_ROWS} (more changed or unchanged listings)")
+
+    # The holdout stays out of the scaler until it has been scored
+    old_center, old_scale = scaler.center_.copy(), scaler.scale_.copy()
+    scaler.update(train_added[columns].to_numpy(dtype=np.float64), removed[columns].to_numpy(dtype=np.float64))
+    booster = remap_thresholds(bundle.model, old_center, old_scale, scaler.center_, scaler.scale_)
+    dtrain, dval = (xgb.DMatrix(scaler.transform(rows[columns]).astype(np.float32),
+                                label=rows[tuning.TARGET_COLUMN].to_numpy(dtype=np.float32))
+                    for rows in (train.iloc[n_val:], train.iloc[:n_val]))
+    n_before = booster.num_boosted_rounds()
+    booster = xgb.train(training_params(bundle.model, learning_rate), dtrain, num_boost_round=rounds,
+                        xgb_model=booster, evals=[(dval, 'validation')],
+                        early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False)
+    # best_iteration counts the source's rounds too; drop the rounds after it
+    booster = booster[:booster.best_iteration + 1]
+    model = to_regressor(booster)
+
+    after = {'changed': _rmse(model, scaler, holdout_added, columns),
+             'unchanged': _rmse(model, scaler, holdout_unchanged, columns)}
+    promoted = ((after['changed'] is None or after['changed'] <= before['changed'])
+                and (after['unchanged'] is None or after['unchanged'] <= before['unchanged'] * (1 + MAX_REGRESSION)))
+
+    stats = {
+        'promoted': bool(promoted),
+        'added': len(added),
+        'removed': len(removed),
+        'trained_rows': len(train),
+        'holdout_rows': n_holdout * 2,
+        'rounds_added': booster.num_boosted_rounds() - n_before,
+        'rmse_before': before,
+        'rmse_after': after,
+        'seconds': time.perf_counter() - start
+    }
+    if promoted:
+        # Now add the held-out listings, mapping the trees onto the final statistics
+        old_center, old_scale = scaler.center_.copy(), scaler.scale_.copy()
+        scaler.update(holdout_added[columns].to_numpy(dtype=np.float64))
+        model = to_regressor(remap_thresholds(model, old_center, old_scale, scaler.center_, scaler.scale_))
+        artifacts.save_bundle(path, model, scaler, columns, bundle.defaults, {
+            'family': 'xgboost',
+            'update_of': artifacts.model_version(source),
+            **{k: v for k, v in stats.items() if k not in ('promoted', 'seconds')},
+            **(metadata or {})
+        })
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('snapshot', help="processed listings CSV of the new scrape")
+    parser.add_argument('--previous', default=tuning.TRAINING_DATA_PATH, help="processed CSV the source was trained on")
+    parser.add_argument('--source', default=None, help="bundle to update (default: the original deployment)")
+    parser.add_argument('--bundle', default=os.path.join('bundles', 'updated'))
+    parser.add_argument('--rounds', type=int, default=UPDATE_ROUNDS)
+    parser.add_argument('--learning-rate', type=float, default=UPDATE_LEARNING_RATE)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    # Update through the importable module so the pickled scaler does not reference __main__
+    import incremental_update
+    source = artifacts.load_bundle(args.source)
+    previous, current = pd.read_csv(args.previous), pd.read_csv(args.snapshot)
+    added, removed, unchanged = incremental_update.diff_snapshots(
+        previous, current, source.feature_columns + [tuning.TARGET_COLUMN])
+    print(f"{len(current):,} listings: {len(added):,} new or changed, {len(removed):,} superseded or delisted")
+    if not len(added):
+        raise SystemExit("Nothing to update")
+
+    try:
+        stats = incremental_update.update_bundle(
+            args.bundle, args.source, added, removed, unchanged,
+            history=None if isinstance(source.scaler, incremental_update.IncrementalRobustScaler) else previous,
+            rounds=args.rounds, learning_rate=args.learning_rate, seed=args.seed,
+            metadata={'data_version': audit_log.file_version(args.snapshot)})
+    except ValueError as exc:
+        raise SystemExit(f"Update refused: {exc}")
+    before, after = stats['rmse_before'], stats['rmse_after']
+    print(f"{stats['trained_rows']:,} rows trained, {stats['rounds_added']} rounds added in {stats['seconds']:.1f}s")
+    print(f"holdout RMSE changed £{before['changed']:.2f} -> £{after['changed']:.2f}, "
+          f"unchanged £{before['unchanged']:.2f} -> £{after['unchanged']:.2f}")
+    print(f"Saved updated bundle to {args.bundle}" if stats['promoted'] else "Update rejected; bundle not saved")
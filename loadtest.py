@@ -0,0 +1,448 @@
+"""
+Load generator for the prediction service and the Streamlit app: replays
+form submissions sampled from the processed listings at a fixed concurrency
+and (optionally) a Poisson arrival rate
+
+An HTTP target gets each submission as a JSON POST (see service.py). A
+Streamlit target is driven like a browser tab: every virtual user opens a
+session over the app's websocket, then submits the listing form by setting
+its widget states and waits for the rerun to finish.
+
+With an arrival rate, latency is measured from each request's scheduled
+start, so time spent waiting for a free virtual user counts against the
+server instead of silently lowering the offered load.
+
+Run with: python loadtest.py http://127.0.0.1:8000/predict --concurrency 8 --rate 50 --requests 1000
+          python loadtest.py http://localhost:8501 --kind streamlit --concurrency 4 --requests 100
+"""
+
+import argparse
+import http.client
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+
+import benchmark
+import market
+import preprocessing
+
+TRAINING_DATA_PATH = 'airbnb_processed_data.csv'
+RESULTS_DIR = 'loadtest_results'
+
+# App amenity checkboxes with a processed has_* flag: (label, amenity, flag)
+FORM_AMENITIES = [
+    ('WiFi', 'Wifi', 'has_wifi'), ('Kitchen', 'Kitchen', 'has_kitchen'), ('TV', 'TV', 'has_tv'),
+    ('Heating', 'Heating', 'has_heating'), ('Air Conditioning', 'Air conditioning', 'has_air_conditioning'),
+    ('Essentials', 'Essentials', 'has_essentials'), ('Washer', 'Washer', 'has_washer'),
+    ('Dryer', 'Dryer', 'has_dryer'), ('Hair Dryer', 'Hair dryer', 'has_hair_dryer'), ('Iron', 'Iron', 'has_iron'),
+    ('Hangers', 'Hangers', 'has_hangers'), ('Shampoo', 'Shampoo', 'has_shampoo'),
+    ('Free Parking', 'Free parking', 'has_free_parking'),
+    ('Workspace', 'Dedicated workspace', 'has_dedicated_workspace'), ('Pool', 'Pool', 'has_pool'),
+    ('Hot Tub', 'Hot tub', 'has_hot_tub'), ('Gym', 'Gym', 'has_gym'), ('Breakfast', 'Breakfast', 'has_breakfast'),
+    ('Self Check-in', 'Self check-in', 'has_self_check_in'),
+    ('Private Entrance', 'Private entrance', 'has_private_entrance'), ('Lockbox', 'Lockbox', 'has_lockbox')
+]
+
+# App form widget label -> user_data key
+FORM_FIELDS = {
+    'Listing Name': 'name',
+    'Description': 'description',
+    'Picture URL': 'picture_url',
+    'Property Type': 'property_type',
+    'Room Type': 'room_type',
+    'Accommodates': 'accommodates',
+    'Beds': 'beds',
+    'Bedrooms': 'bedrooms',
+    'Bathrooms': 'bathrooms',
+    'Neighbourhood': 'neighbourhood_cleansed',
+    'Latitude': 'latitude',
+    'Longitude': 'longitude',
+    'Host Since': 'host_since',
+    'Total Listings': 'host_total_listings_count',
+    'Response Time': 'host_response_time',
+    'Superhost': 'host_is_superhost',
+    'Identity Verified': 'host_identity_verified',
+    'Instant Bookable': 'instant_bookable',
+    'Number of Reviews': 'number_of_reviews',
+    'Overall Rating': 'review_scores_rating',
+    'Cleanliness': 'review_scores_cleanliness',
+    'Accuracy': 'review_scores_accuracy',
+    'Check-in': 'review_scores_checkin',
+    'Communication': 'review_scores_communication',
+    'Location': 'review_scores_location',
+    'Value': 'review_scores_value'
+}
+
+# Property types the app form offers; others are submitted as 'Other'
+FORM_PROPERTY_TYPES = ['Entire home', 'Entire condo', 'Private room', 'Entire rental unit', 'Entire serviced apartment',
+                       'Entire townhouse']
+
+# Largest values the app form accepts
+FORM_LIMITS = {'accommodates': 16, 'beds': 20, 'bedrooms': 10, 'bathrooms': 10, 'number_of_reviews': 1000,
+               'host_total_listings_count': 100}
+
+# Submissions
+
+
+def sample_submissions(n, data_path=TRAINING_DATA_PATH, seed=0):
+    """
+    Form submissions rebuilt from randomly sampled processed listings
+
+    Numbers, categories, host details and amenities come from the listing,
+    limited to what the app form can express, so every target scores the
+    same inputs; the processed data keeps no text, so names and
+    descriptions are synthetic.
+
+    Returns:
+        list of JSON-serialisable user_data dicts
+    """
+    data = pd.read_csv(data_path)
+    neighbourhood = market.decode_onehot(data, 'neighbourhood_cleansed_', market.OTHER_NEIGHBOURHOOD)
+    data = data[np.isin(neighbourhood, preprocessing.NEIGHBOURHOODS)]
+    rows = data.iloc[np.random.default_rng(seed).choice(len(data), n, replace=n > len(data))]
+    texts = benchmark.sample_descriptions(n, seed)
+
+    neighbourhoods = market.decode_onehot(rows, 'neighbourhood_cleansed_', market.OTHER_NEIGHBOURHOOD)
+    room_types = market.decode_onehot(rows, 'room_type_', preprocessing.ROOM_TYPES[0])
+    property_types = market.decode_onehot(rows, 'property_type_', 'Other')
+    snapshot = date.fromisoformat(preprocessing.SNAPSHOT_DATE)
+
+    records = []
+    for i, (_, row) in enumerate(rows.iterrows()):
+        record = {
+            'name': texts['name'][i],
+            'description': texts['description'][i],
+            'picture_url': 'https://a0.muscache.com/pictures/12345678/example_original.jpg',
+            'property_type': property_types[i] if property_types[i] in FORM_PROPERTY_TYPES else 'Other',
+            'room_type': room_types[i],
+            'neighbourhood_cleansed': neighbourhoods[i],
+            'accommodates': int(row['accommodates']),
+            'bedrooms': int(row['bedrooms']),
+            'beds': int(row['beds']),
+            'bathrooms': float(round(row['bathrooms'] * 2) / 2),
+            'amenities': ', '.join(amenity for _, amenity, flag in FORM_AMENITIES if row[flag]),
+            'number_of_reviews': int(row['number_of_reviews']),
+            **{col: float(np.clip(round(row[col], 1), 1.0, 5.0)) for col in preprocessing.REVIEW_SCORE_COLUMNS},
+            'host_since': max(snapshot - timedelta(days=int(row['host_days_active'])), date(2008, 1, 1)).isoformat(),
+            'host_is_superhost': bool(row['host_is_superhost']),
+            'host_identity_verified': bool(row['host_identity_verified']),
+            'host_total_listings_count': int(max(row['host_total_listings_count'], 1)),
+            'latitude': float(row['latitude']),
+            'longitude': float(row['longitude']),
+            'instant_bookable': bool(row['instant_bookable'])
+        }
+        for field, limit in FORM_LIMITS.items():
+            record[field] = min(record[field], limit)
+        # Code 4 is 'unknown', which the form cannot express; the field is optional
+        if int(row['host_response_time_encoded']) < len(preprocessing.RESPONSE_TIMES):
+            record['host_response_time'] = preprocessing.RESPONSE_TIMES[int(row['host_response_time_encoded'])]
+        records.append(record)
+    return records
+
+# Targets
+
+
+class TargetError(Exception):
+    """A request that completed without a prediction"""
+
+
+class HttpClient:
+    """One keep-alive connection posting submissions as JSON"""
+
+    def __init__(self, url, timeout=30.0):
+        parts = urlsplit(url)
+        self.path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        connection = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection(parts.hostname, parts.port, timeout=timeout)
+
+    def submit(self, record):
+        try:
+            self.connection.request('POST', self.path, json.dumps(record), {'Content-Type': 'application/json'})
+            response = self.connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            raise
+        if response.status != 200:
+            raise TargetError(f"HTTP {response.status}")
+        return json.loads(body)['price']
+
+    def close(self):
+        self.connection.close()
+
+
+class StreamlitClient:
+    """
+    One Streamlit session, like a browser tab, that submits the listing form
+
+    Opening the session runs the app once to learn the form's widgets; each
+    submission then sends a rerun with every form widget's state and the
+    submit button triggered, and reads messages until the run finishes.
+    """
+
+    def __init__(self, url, timeout=60.0, submit_label='Get Price Prediction'):
+        # Streamlit dependencies, only needed for this target
+        from websockets.sync.client import connect
+
+        parts = urlsplit(url)
+        scheme = 'wss' if parts.scheme in ('https', 'wss') else 'ws'
+        self.timeout = timeout
+        self.submit_label = submit_label
+        self.websocket = connect(f"{scheme}://{parts.netloc}{parts.path.rstrip('/')}/_stcore/stream",
+                                 subprotocols=['streamlit'], max_size=None, open_timeout=timeout)
+        self.widgets = {}
+        self._run(())
+        if self.submit_label not in self.widgets:
+            raise TargetError(f"No '{submit_label}' button in the app")
+
+    def _run(self, widget_states):
+        """Rerun the script with widget states; returns the markdown texts it rendered"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.widget_states.widgets.extend(widget_states)
+        self.websocket.send(message.SerializeToString())
+
+        texts = []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self.websocket.recv(timeout=self.timeout))
+            kind = forward.WhichOneof('type')
+            if kind == 'script_finished':
+                return texts
+            if kind != 'delta' or forward.delta.WhichOneof('type') != 'new_element':
+                continue
+            element = forward.delta.new_element
+            element_type = element.WhichOneof('type')
+            if element_type == 'exception':
+                raise TargetError(f"{element.exception.type}: {element.exception.message}")
+            if element_type == 'alert' and element.alert.format == element.alert.ERROR:
+                raise TargetError(element.alert.body)
+            if element_type == 'markdown':
+                texts.append(element.markdown.body)
+            widget = getattr(element, element_type)
+            if getattr(widget, 'form_id', '') and getattr(widget, 'label', ''):
+                self.widgets[widget.label] = (element_type, widget)
+
+    def _state(self, element_type, widget, value):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        state = WidgetState(id=widget.id)
+        if element_type in ('text_input', 'text_area', 'selectbox'):
+            if element_type == 'selectbox' and value not in widget.options:
+                return None
+            state.string_value = str(value)
+        elif element_type == 'number_input':
+            state.double_value = float(value)
+        elif element_type == 'checkbox':
+            state.bool_value = bool(value)
+        elif element_type == 'slider':
+            state.double_array_value.data.append(float(value))
+        elif element_type == 'date_input':
+            state.string_array_value.data.append(str(value))
+        else:
+            return None
+        return state
+
+    def submit(self, record):
+        amenities = set(record.get('amenities', '').split(', '))
+        checkboxes = {label: amenity in amenities for label, amenity, _ in FORM_AMENITIES}
+        states = []
+        for label, (element_type, widget) in self.widgets.items():
+            if label == self.submit_label:
+                from streamlit.proto.WidgetStates_pb2 import WidgetState
+                states.append(WidgetState(id=widget.id, trigger_value=True))
+                continue
+            if label in FORM_FIELDS and FORM_FIELDS[label] in record:
+                state = self._state(element_type, widget, record[FORM_FIELDS[label]])
+            elif label in checkboxes:
+                state = self._state(element_type, widget, checkboxes[label])
+            else:
+                continue
+            if state is not None:
+                states.append(state)
+
+        for text in self._run(states):
+            if 'Recommended Price: £' in text:
+                return float(text.split('£', 1)[1].split()[0])
+        raise TargetError("Run finished without a prediction")
+
+    def close(self):
+        self.websocket.close()
+
+
+TARGETS = {
+    'http': HttpClient,
+    'streamlit': StreamlitClient
+}
+
+# Load generation
+
+
+def run_load(connect, records, concurrency=4, rate=None, seed=0):
+    """
+    Replay records with concurrency virtual users, each holding one client
+
+    Args:
+        connect: zero-argument callable returning a client with submit()
+            and close()
+        rate: mean arrivals per second (Poisson); None sends back to back
+            (closed loop, concurrency requests in flight)
+
+    Returns:
+        dict with per-request latencies (s), error messages and wall time
+    """
+    offsets = None
+    if rate:
+        offsets = np.cumsum(np.random.default_rng(seed).exponential(1 / rate, len(records)))
+
+    lock = threading.Lock()
+    state = {'next': 0}
+    latencies = np.full(len(records), np.nan)
+    errors = {}
+    connect_errors = []
+    connect_seconds = []
+    start = [None]
+    ready = threading.Barrier(concurrency + 1)
+
+    def open_client():
+        try:
+            opened = time.perf_counter()
+            client = connect()
+            connect_seconds.append(time.perf_counter() - opened)
+            return client
+        except Exception as e:
+            connect_errors.append(f"{type(e).__name__}: {e}")
+            return None
+
+    def user():
+        client = open_client()
+        ready.wait()
+        if client is None:
+            return
+        try:
+            while True:
+                with lock:
+                    i = state['next']
+                    state['next'] += 1
+                if i >= len(records):
+                    return
+                scheduled = start[0] + offsets[i] if offsets is not None else time.perf_counter()
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                try:
+                    client.submit(records[i])
+                    latencies[i] = time.perf_counter() - scheduled
+                except Exception as e:
+                    errors[i] = f"{type(e).__name__}: {e}"
+                    if not isinstance(e, TargetError):
+                        # Transport failure: reconnect so the user keeps generating load
+                        client.close()
+                        client = open_client()
+                        if client is None:
+                            return
+        finally:
+            if client is not None:
+                client.close()
+
+    threads = [threading.Thread(target=user, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    start[0] = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return {
+        'latencies': latencies,
+        'errors': errors,
+        'connect_errors': connect_errors,
+        'elapsed': time.perf_counter() - start[0],
+        'connect_seconds': connect_seconds
+    }
+
+def summarise(run, requests):
+    """Throughput, latency percentiles and error rate of a run"""
+    latencies = run['latencies'][~np.isnan(run['latencies'])]
+    request_errors = list(run['errors'].values())
+    summary = benchmark.latency_summary(latencies, run['elapsed']) if len(latencies) else {
+        'requests': 0, 'throughput_rps': 0.0, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    summary.update({
+        'sent': requests,
+        'errors': len(request_errors),
+        'error_rate': len(request_errors) / requests if requests else 0.0,
+        'error_types': dict(Counter(message.split(':')[0] for message in request_errors).most_common(5)),
+        'connect_errors': len(run['connect_errors']),
+        'connect_ms': float(np.mean(run['connect_seconds']) * 1000) if run['connect_seconds'] else None,
+        'elapsed_s': run['elapsed']
+    })
+    return summary
+
+# Results
+
+
+def save_results(summary, settings, directory=RESULTS_DIR):
+    """Write a run's settings and summary as JSON; returns the file path"""
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    path = os.path.join(directory, f"{stamp}-{settings['kind']}-c{settings['concurrency']}.json")
+    with open(path, 'w') as f:
+        json.dump({'created': stamp, 'settings': settings, 'summary': summary}, f, indent=2)
+    return path
+
+def compare_results(baseline, current):
+    """
+    Metric-by-metric comparison of two saved runs
+
+    Returns:
+        list of (metric, baseline value, current value, relative change)
+    """
+    rows = []
+    for metric in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'error_rate'):
+        before, after = baseline['summary'].get(metric), current['summary'].get(metric)
+        change = (after - before) / before if before and after is not None else None
+        rows.append((metric, before, after, change))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('url', help="prediction endpoint (http) or app address (streamlit)")
+    parser.add_argument('--kind', default='http', choices=list(TARGETS))
+    parser.add_argument('--concurrency', type=int, default=4, help="virtual users (connections or sessions)")
+    parser.add_argument('--rate', type=float, default=None, help="mean requests per second (default: back to back)")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=RESULTS_DIR, help="directory for the results JSON")
+    parser.add_argument('--compare', default=None, help="earlier results JSON to compare with")
+    args = parser.parse_args()
+
+    records = sample_submissions(args.requests, seed=args.seed)
+    client_class = TARGETS[args.kind]
+    run = run_load(lambda: client_class(args.url), records, args.concurrency, args.rate, args.seed)
+    summary = summarise(run, len(records))
+    settings = {'kind': args.kind, 'url': args.url, 'concurrency': args.concurrency, 'rate': args.rate,
+                'requests': args.requests, 'seed': args.seed}
+    path = save_results(summary, settings, args.output)
+
+    fmt = lambda value: '-' if value is None else f"{value:.1f}"
+    print(f"{summary['requests']}/{summary['sent']} ok in {summary['elapsed_s']:.1f}s: "
+          f"{summary['throughput_rps']:.1f} req/s, p50 {fmt(summary['p50_ms'])} ms, p95 {fmt(summary['p95_ms'])} ms, "
+          f"p99 {fmt(summary['p99_ms'])} ms, errors {summary['error_rate']:.1%} {summary['error_types'] or ''}")
+    print(f"Saved results to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for metric, before, after, change in compare_results(baseline, {'summary': summary}):
+            print(f"  {metric:<15} {fmt(before):>10} -> {fmt(after):>10}"
+                  + (f" ({change:+.0%})" if change is not None else ''))
@@ -0,0 +1,212 @@
+"""
+Market positioning: percentile rank of a price within the empirical price
+distribution of comparable listings
+"""
+
+import numpy as np
+import pandas as pd
+
+import dedup
+import preprocessing
+
+TRAINING_DATA_PATH = 'airbnb_processed_data.csv'
+
+# Capacity buckets by guests: 1-2, 3-4, 5-6, 7+
+CAPACITY_BUCKET_EDGES = np.array([2, 4, 6])
+CAPACITY_BUCKET_LABELS = ['1-2 guests', '3-4 guests', '5-6 guests', '7+ guests']
+
+# Listings whose neighbourhood is the dropped one-hot category
+OTHER_NEIGHBOURHOOD = 'Other'
+
+# Segments are tried from most to least specific until one has enough listings
+SEGMENT_LEVELS = [
+    ('neighbourhood', 'room_type', 'capacity'),
+    ('neighbourhood', 'room_type'),
+    ('room_type', 'capacity'),
+    ('room_type',),
+    ()
+]
+
+MIN_SEGMENT_LISTINGS = 20
+
+
+def capacity_bucket(accommodates):
+    """Capacity bucket index (0-3) for one value or an array of guest counts"""
+    return np.searchsorted(CAPACITY_BUCKET_EDGES, accommodates, side='left')
+
+def decode_onehot(data, prefix, baseline):
+    """Category per row from the one-hot columns starting with prefix"""
+    columns = [c for c in data.columns if c.startswith(prefix)]
+    onehot = data[columns].to_numpy()
+    labels = np.array([c[len(prefix):] for c in columns] + [baseline], dtype=object)
+    # Rows with no flag set belong to the dropped baseline category
+    return labels[np.where(onehot.any(axis=1), onehot.argmax(axis=1), len(columns))]
+
+def decode_segments(data):
+    """
+    Recover neighbourhood, room type and capacity bucket from the one-hot
+    columns of the processed training data
+
+    Returns:
+        DataFrame with neighbourhood, room_type and capacity columns
+    """
+    return pd.DataFrame({
+        'neighbourhood': decode_onehot(data, 'neighbourhood_cleansed_', OTHER_NEIGHBOURHOOD),
+        'room_type': decode_onehot(data, 'room_type_', preprocessing.ROOM_TYPES[0]),
+        'capacity': capacity_bucket(data['accommodates'].to_numpy())
+    }, index=data.index)
+
+
+class MarketIndex:
+    """
+    Presorted nightly prices for every segment at every fallback level
+
+    Ranking a price is one binary search in the sorted prices of the most
+    specific segment with at least min_listings listings.
+    """
+
+    def __init__(self, segments, prices, min_listings=MIN_SEGMENT_LISTINGS):
+        self.min_listings = min_listings
+        self.prices = {}
+        prices = np.asarray(prices, dtype=np.float64)
+
+        for level in SEGMENT_LEVELS:
+            if level:
+                groups = pd.Series(prices, index=segments.index).groupby([segments[f] for f in level])
+                for key, group in groups:
+                    key = key if isinstance(key, tuple) else (key,)
+                    self.prices[(level, key)] = np.sort(group.to_numpy())
+            else:
+                self.prices[((), ())] = np.sort(prices)
+
+    def pack(self):
+        """
+        The index as flat arrays for saving or sharing between processes
+
+        Returns:
+            (segment keys as [level, key] lists, offsets into prices, all
+            segments' sorted prices concatenated)
+        """
+        keys = [[list(level), list(key)] for level, key in self.prices]
+        lengths = [len(prices) for prices in self.prices.values()]
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        return keys, offsets, np.concatenate(list(self.prices.values()))
+
+    @classmethod
+    def from_packed(cls, keys, offsets, prices, min_listings=MIN_SEGMENT_LISTINGS):
+        """Rebuild an index whose segments are views into prices (e.g. a read-only memmap)"""
+        index = cls.__new__(cls)
+        index.min_listings = min_listings
+        index.prices = {}
+        for (level, key), start, end in zip(keys, offsets[:-1], offsets[1:]):
+            key = tuple(int(value) if field == 'capacity' else value for field, value in zip(level, key))
+            index.prices[(tuple(level), key)] = prices[start:end]
+        return index
+
+    def segment(self, neighbourhood, room_type, capacity):
+        """(level, key, sorted prices) of the most specific segment with enough listings"""
+        values = {'neighbourhood': neighbourhood, 'room_type': room_type, 'capacity': int(capacity)}
+        for level in SEGMENT_LEVELS:
+            key = tuple(values[f] for f in level)
+            prices = self.prices.get((level, key))
+            if prices is not None and (len(prices) >= self.min_listings or not level):
+                return level, key, prices
+
+    def percentile_rank(self, price, neighbourhood, room_type, accommodates):
+        """
+        Position of one price among comparable listings
+
+        Returns:
+            dict with percentile (0-100, ties counted as half), the segment
+            label, number of listings and the segment's P10/median/P90
+        """
+        level, key, prices = self.segment(neighbourhood, room_type, capacity_bucket(accommodates))
+        low, median, high = np.percentile(prices, [10, 50, 90])
+        return {
+            'percentile': float(_midrank(prices, price)),
+            'segment': segment_label(level, key),
+            'n_listings': len(prices),
+            'low': float(low),
+            'median': float(median),
+            'high': float(high)
+        }
+
+    def percentile_ranks(self, prices, neighbourhoods, room_types, accommodates):
+        """
+        Percentile ranks for many listings, one vectorised search per segment
+
+        Returns:
+            DataFrame with percentile, segment and n_listings per listing
+        """
+        frame = pd.DataFrame({
+            'price': np.asarray(prices, dtype=np.float64),
+            'neighbourhood': np.asarray(neighbourhoods, dtype=object),
+            'room_type': np.asarray(room_types, dtype=object),
+            'capacity': capacity_bucket(np.asarray(accommodates))
+        })
+        percentile = np.empty(len(frame))
+        segment = np.empty(len(frame), dtype=object)
+        n_listings = np.empty(len(frame), dtype=np.int64)
+
+        groups = frame.groupby(['neighbourhood', 'room_type', 'capacity'], sort=False).indices
+        for (neighbourhood, room_type, capacity), rows in groups.items():
+            level, key, sorted_prices = self.segment(neighbourhood, room_type, capacity)
+            percentile[rows] = _midrank(sorted_prices, frame['price'].to_numpy()[rows])
+            segment[rows] = segment_label(level, key)
+            n_listings[rows] = len(sorted_prices)
+
+        return pd.DataFrame({'percentile': percentile, 'segment': segment, 'n_listings': n_listings})
+
+
+def _midrank(sorted_prices, price):
+    """Percentage of prices below, counting ties as half"""
+    below = np.searchsorted(sorted_prices, price, side='left')
+    at_or_below = np.searchsorted(sorted_prices, price, side='right')
+    return 100 * (below + at_or_below) / (2 * len(sorted_prices))
+
+def segment_label(level, key):
+    """Readable description of a segment, e.g. 'Entire home/apt, 3-4 guests in Hulme'"""
+    values = dict(zip(level, key))
+    if not values:
+        return 'All listings'
+    parts = [values['room_type']]
+    if 'capacity' in values:
+        parts.append(CAPACITY_BUCKET_LABELS[values['capacity']])
+    label = ', '.join(parts)
+    if 'neighbourhood' in values:
+        label += f" in {values['neighbourhood']}"
+    return label
+
+def market_position(percentile):
+    """Plain-language band for a percentile rank"""
+    if percentile < 25:
+        return 'significantly below'
+    if percentile < 45:
+        return 'slightly below'
+    if percentile > 75:
+        return 'significantly above'
+    if percentile > 55:
+        return 'slightly above'
+    return 'at'
+
+def load_market_index(data_path=TRAINING_DATA_PATH, min_listings=MIN_SEGMENT_LISTINGS, near_duplicates='keep'):
+    """
+    Build the market index from the processed listings data
+
+    near_duplicates='drop' counts each group of near-identical listings
+    (one host's copied units) once, so it does not skew the distribution.
+    """
+    data = pd.read_csv(data_path)
+    if near_duplicates == 'drop':
+        data = dedup.drop_near_duplicates(data)
+    return MarketIndex(decode_segments(data), data['price'], min_listings=min_listings)
+
+
+if __name__ == "__main__":
+    data = pd.read_csv(TRAINING_DATA_PATH)
+    segments = decode_segments(data)
+    index = MarketIndex(segments, data['price'])
+    ranks = index.percentile_ranks(data['price'], segments['neighbourhood'], segments['room_type'], data['accommodates'])
+    summary = ranks.groupby('segment')['n_listings'].first().sort_values(ascending=False)
+    print(f"{len(summary)} segments used for {len(data)} listings")
+    print(summary.head(20).to_string())
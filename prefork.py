@@ -0,0 +1,274 @@
+"""
+Pre-fork serving: load the model and reference data once in a parent
+process and fork workers that share them copy-on-write
+
+The market reference data is packed into flat arrays saved as .npy files
+(in /dev/shm where available) and memory-mapped read-only, so even workers
+that are not forked share its pages through the page cache. Each worker runs
+a warm-up prediction before it reports ready.
+
+Run with: python prefork.py --workers 4 (or python service.py --workers 4 to serve HTTP)
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+import numpy as np
+
+import market
+import service
+
+# RAM-backed when available so mapped reference data never touches disk
+REFERENCE_DIR = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else '/tmp', 'airbnb_reference')
+
+# Representative listing scored by every worker before it reports ready
+WARMUP_RECORD = {
+    'name': 'Modern City Centre Apartment',
+    'description': 'Bright, spacious flat close to shops, restaurants and the tram. Fast wifi and a full kitchen.',
+    'picture_url': 'https://a0.muscache.com/pictures/12345678/warmup_original.jpg',
+    'amenities': 'Wifi, Kitchen, Washer, Heating, TV',
+    'property_type': 'Entire rental unit',
+    'room_type': 'Entire home/apt',
+    'neighbourhood_cleansed': 'City Centre',
+    'accommodates': 2,
+    'bedrooms': 1,
+    'host_since': '2020-01-01'
+}
+
+# Shared reference data
+
+
+def export_market(index, directory=REFERENCE_DIR):
+    """Write a market index as a flat price array plus a JSON segment table"""
+    os.makedirs(directory, exist_ok=True)
+    keys, offsets, prices = index.pack()
+    np.save(os.path.join(directory, 'market_prices.npy'), prices)
+    with open(os.path.join(directory, 'market_segments.json'), 'w') as f:
+        json.dump({'keys': keys, 'offsets': offsets.tolist(), 'min_listings': index.min_listings}, f)
+
+def map_market(directory=REFERENCE_DIR):
+    """Market index whose prices are a read-only memory map of the exported array"""
+    with open(os.path.join(directory, 'market_segments.json')) as f:
+        segments = json.load(f)
+    prices = np.load(os.path.join(directory, 'market_prices.npy'), mmap_mode='r')
+    return market.MarketIndex.from_packed(segments['keys'], segments['offsets'], prices, segments['min_listings'])
+
+def memory_usage(pid='self'):
+    """
+    Resident memory of a process in MB from /proc (Linux)
+
+    pss splits shared pages between the processes sharing them, so summing
+    it over workers gives their real combined footprint; private is what
+    the process alone holds.
+    """
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if value.strip().endswith('kB'):
+                    fields[name] = int(value.split()[0]) / 1024
+    except OSError:
+        return {}
+    return {
+        'rss': fields['Rss'],
+        'pss': fields['Pss'],
+        'shared': fields['Shared_Clean'] + fields['Shared_Dirty'],
+        'private': fields['Private_Clean'] + fields['Private_Dirty']
+    }
+
+# Workers
+
+# Service loaded in the parent and inherited by forked workers
+_SERVICE = None
+
+
+def _worker_main(conn, started_at, bundle_path, reference_dir):
+    """
+    Worker loop: warm up, report ready, then score record batches from the pipe
+
+    Forked workers use the inherited _SERVICE; spawned workers load their own.
+    """
+    prediction_service = _SERVICE
+    if prediction_service is None:
+        market_index = map_market(reference_dir) if reference_dir else None
+        prediction_service = service.load_service(bundle_path, market_index=market_index)
+
+    predictions, _ = prediction_service.score_records([WARMUP_RECORD])
+    prediction_service.market_positions([WARMUP_RECORD], predictions)
+    conn.send({'pid': os.getpid(), 'ready_s': time.time() - started_at})
+
+    while True:
+        records = conn.recv()
+        if records is None:
+            break
+        predictions, errors = prediction_service.score_records(records)
+        # Validation errors travel as their messages
+        conn.send((predictions, {i: e.errors for i, e in errors.items()}))
+    conn.close()
+
+
+class PreforkPool:
+    """
+    Worker processes that each score records with the deployed model
+
+    preload=True loads the service once in the parent and forks workers,
+    which share the model, libraries and mapped reference data copy-on-write.
+    preload=False spawns workers that each load everything themselves, as
+    independent Streamlit or service processes do.
+
+    The parent must not predict before forking: XGBoost's OpenMP runtime is
+    not fork-safe once its thread pool has started, so warm-up runs in the
+    workers.
+    """
+
+    def __init__(self, n_workers=None, bundle_path=None, preload=True, reference_dir=REFERENCE_DIR):
+        self.n_workers = n_workers or os.cpu_count()
+        self.bundle_path = bundle_path
+        self.preload = preload
+        self.reference_dir = reference_dir
+        self.workers = []
+        self._next = 0
+
+    def start(self):
+        """
+        Start the workers and wait until each has warmed up
+
+        Returns:
+            list of readiness reports (pid, ready_s, memory)
+        """
+        global _SERVICE
+        if self.preload:
+            export_market(market.load_market_index(), self.reference_dir)
+            _SERVICE = service.load_service(self.bundle_path, market_index=map_market(self.reference_dir))
+            # Move everything loaded so far out of the collector's reach so
+            # collections in the workers do not write to (and copy) shared pages
+            gc.collect()
+            gc.freeze()
+            context = multiprocessing.get_context('fork')
+            reference_dir = self.reference_dir
+        else:
+            context = multiprocessing.get_context('spawn')
+            reference_dir = None
+
+        for _ in range(self.n_workers):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_worker_main, daemon=True,
+                                      args=(child_conn, time.time(), self.bundle_path, reference_dir))
+            process.start()
+            child_conn.close()
+            self.workers.append((process, parent_conn))
+
+        reports = []
+        for process, conn in self.workers:
+            report = conn.recv()
+            report['memory'] = memory_usage(process.pid)
+            reports.append(report)
+        return reports
+
+    def predict(self, records):
+        """
+        Score records on the next worker (round robin)
+
+        Returns:
+            (predictions, errors) where errors maps row position -> messages
+        """
+        process, conn = self.workers[self._next]
+        self._next = (self._next + 1) % len(self.workers)
+        conn.send(list(records))
+        return conn.recv()
+
+    def memory(self):
+        """Current memory usage per worker"""
+        return [memory_usage(process.pid) for process, _ in self.workers]
+
+    def stop(self):
+        """Ask every worker to exit and wait for them"""
+        for process, conn in self.workers:
+            conn.send(None)
+            conn.close()
+        for process, _ in self.workers:
+            process.join()
+        self.workers = []
+        if self.preload:
+            gc.unfreeze()
+
+# HTTP
+
+
+def _serve_worker(server, prediction_service):
+    """Forked HTTP worker: warm up, then accept from the inherited listening socket"""
+    predictions, _ = prediction_service.score_records([WARMUP_RECORD])
+    if prediction_service.market_index is not None:
+        prediction_service.market_positions([WARMUP_RECORD], predictions)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def serve_forked(server, prediction_service, n_workers=None):
+    """
+    Serve an HTTP server (service.make_http_server) from forked workers
+
+    The server is bound and listening before the fork, so every worker
+    accepts connections from the same socket and the kernel spreads them;
+    the service is shared copy-on-write. Blocks until interrupted, then
+    stops the workers.
+    """
+    gc.collect()
+    gc.freeze()
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_serve_worker, args=(server, prediction_service), daemon=True)
+               for _ in range(n_workers or os.cpu_count())]
+    for process in workers:
+        process.start()
+    # Stopping the parent stops the workers rather than orphaning them
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        for process in workers:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in workers:
+            process.terminate()
+            process.join()
+        server.server_close()
+        gc.unfreeze()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--bundle', default=None)
+    parser.add_argument('--requests', type=int, default=200, help="listings scored per worker after start-up")
+    args = parser.parse_args()
+
+    import benchmark
+
+    records = benchmark.sample_user_data(args.requests)
+    for preload in (False, True):
+        mode = 'fork (preloaded)' if preload else 'spawn (per-process load)'
+        pool = PreforkPool(args.workers, args.bundle, preload=preload)
+        started = time.perf_counter()
+        reports = pool.start()
+        start_s = time.perf_counter() - started
+        for _ in range(args.workers):
+            pool.predict(records)
+        memory = pool.memory()
+        pool.stop()
+
+        print(f"{mode}: {args.workers} workers ready in {start_s:.2f}s")
+        for report, usage in zip(reports, memory):
+            print(f"  pid {report['pid']}: first prediction after {report['ready_s']:.2f}s, "
+                  f"rss {usage['rss']:.0f} MB, pss {usage['pss']:.0f} MB, private {usage['private']:.0f} MB")
+        print(f"  total pss {sum(u['pss'] for u in memory):.0f} MB, "
+              f"total private {sum(u['private'] for u in memory):.0f} MB")
@@ -5,6 +5,11 @@ Complete preprocessing pipeline for Airbnb price prediction
 import pandas as pd
 import numpy as np
 import re
+import logging
+from collections import namedtuple
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
 
 # Amenity Categories
 
@@ -152,6 +157,197 @@ all_amenity_categories = {
     'Climate_Environment': climate_environment
 }
 
+# Categorical options (one-hot encoded in preprocess_user_input)
+
+ROOM_TYPES = ['Entire home/apt', 'Private room', 'Shared room', 'Hotel room']
+
+PROPERTY_TYPES = ['Entire home', 'Entire condo', 'Private room', 'Entire rental unit',
+                  'Entire serviced apartment', 'Entire townhouse', 'Private room in home',
+                  'Private room in townhouse', 'Private room in condo',
+                  'Private room in rental unit', 'Entire cottage',
+                  'Private room in bed and breakfast', 'Room in hotel']
+
+RESPONSE_TIMES = ['within an hour', 'within a few hours', 'within a day', 'a few days or more']
+
+# City tables: everything location-specific about a market's inputs
+#   neighbourhoods: one-hot encoded neighbourhood_cleansed values
+#   neighbourhood_coords: neighbourhood -> (latitude, longitude) used when
+#       the form leaves the coordinates blank; others use default_coords
+#   bounds: (min latitude, max latitude, min longitude, max longitude)
+#   neighbourhood_groups: neighbourhood -> neighbourhood_group_cleansed
+#       value; neighbourhoods not listed belong to default_group
+
+City = namedtuple('City', ['name', 'neighbourhoods', 'neighbourhood_coords', 'default_coords', 'bounds',
+                           'neighbourhood_groups', 'default_group'])
+
+MANCHESTER = City(
+    name='Manchester',
+    neighbourhoods=[
+        'City Centre', 'Trafford District', 'Bury District', 'Bolton District',
+        'Salford District', 'Stockport District', 'Tameside District',
+        'Rochdale District', 'Oldham District', 'Wigan District',
+        'Harpurhey', 'Longsight', 'Hulme', 'Old Moat', 'Fallowfield',
+        'Whalley Range', 'Levenshulme', 'Didsbury West', 'Crumpsall',
+        'Moss Side', 'Bradford', 'Miles Platting and Newton Heath',
+        'Rusholme', 'Withington', 'Gorton South', 'Chorlton Park',
+        'Chorlton', 'Cheetham', 'Ardwick', 'Gorton North',
+        'Northenden', 'Woodhouse Park', 'Didsbury East'
+    ],
+    neighbourhood_coords={
+        'City Centre': (53.4808, -2.2426),
+        'Bolton District': (53.5768, -2.4282),
+        'Bury District': (53.5933, -2.2958),
+        'Salford District': (53.4875, -2.2901),
+        'Stockport District': (53.4106, -2.1575),
+        'Trafford District': (53.4233, -2.3533),
+        'Rochdale District': (53.6097, -2.1561),
+        'Oldham District': (53.5409, -2.1114),
+        'Tameside District': (53.4804, -2.0809),
+        'Wigan District': (53.5450, -2.6318),
+    },
+    default_coords=(53.4808, -2.2426),
+    # Greater Manchester bounding box
+    bounds=(53.30, 53.70, -2.75, -1.90),
+    # The districts outside Manchester proper are their own groups in the
+    # training data (as city_bundles.city_from_data derives them); the
+    # remaining neighbourhoods are in the Manchester group
+    neighbourhood_groups={
+        'Bury District': 'Bury',
+        'Oldham District': 'Oldham',
+        'Rochdale District': 'Rochdale',
+        'Salford District': 'Salford',
+        'Stockport District': 'Stockport',
+        'Tameside District': 'Tameside',
+        'Trafford District': 'Trafford',
+        'Wigan District': 'Wigan',
+    },
+    default_group='Manchester'
+)
+
+# The original single-market tables
+NEIGHBOURHOODS = MANCHESTER.neighbourhoods
+
+def city_tables(city):
+    """JSON-serialisable dict of a City, as stored in a bundle manifest"""
+    return city._asdict()
+
+def city_from_tables(tables):
+    """City from city_tables output (JSON turns its tuples into lists)"""
+    return City(
+        name=tables['name'],
+        neighbourhoods=list(tables['neighbourhoods']),
+        neighbourhood_coords={n: tuple(coords) for n, coords in tables['neighbourhood_coords'].items()},
+        default_coords=tuple(tables['default_coords']),
+        bounds=tuple(tables['bounds']),
+        neighbourhood_groups=dict(tables.get('neighbourhood_groups', {})),
+        default_group=tables['default_group']
+    )
+
+def neighbourhood_coords(neighbourhood, city=MANCHESTER):
+    """(latitude, longitude) for a neighbourhood, the city's default when it has none"""
+    return city.neighbourhood_coords.get(neighbourhood, city.default_coords)
+
+# Date of the listings snapshot the model was trained on; host tenure is
+# measured from here when no stay date is given
+SNAPSHOT_DATE = '2024-01-01'
+
+REVIEW_SCORE_COLUMNS = ['review_scores_rating', 'review_scores_cleanliness',
+                        'review_scores_checkin', 'review_scores_communication',
+                        'review_scores_location', 'review_scores_accuracy', 'review_scores_value']
+
+# Picture URL patterns and categorical codes
+
+IMAGE_ID_PATTERN = re.compile(r'/([a-f0-9]{8,}|[0-9]{8,})[\/_]')
+FILE_EXTENSION_PATTERN = re.compile(r'\.([a-zA-Z]{3,4})(?:\?|$)')
+
+FILE_EXTENSIONS = ['none', 'jpg', 'jpeg', 'png', 'webp', 'gif', 'other']
+FILE_EXTENSION_CODES = {ext: code for code, ext in enumerate(FILE_EXTENSIONS)}
+
+# Ordinal, lowest to highest quality
+IMAGE_QUALITY_LEVELS = ['unknown', 'standard', 'medium', 'large', 'original']
+IMAGE_QUALITY_CODES = {level: code for code, level in enumerate(IMAGE_QUALITY_LEVELS)}
+
+# Keyword tables for text analysis (immutable so worker processes can share them read-only)
+
+POSITIVE_WORDS = (
+    'amazing', 'beautiful', 'perfect', 'excellent', 'wonderful', 'fantastic',
+    'great', 'awesome', 'lovely', 'stunning', 'spectacular', 'incredible',
+    'comfortable', 'cosy', 'cozy', 'charming', 'peaceful', 'relaxing',
+    'enjoyable', 'delightful', 'convenient', 'spacious', 'bright', 'clean',
+    'modern', 'stylish', 'elegant', 'sophisticated', 'luxury', 'premium',
+    'superb', 'outstanding', 'exceptional', 'brilliant', 'magnificent',
+    'gorgeous', 'fabulous', 'splendid', 'marvellous', 'marvelous'
+)
+
+NEGATIVE_WORDS = (
+    'terrible', 'awful', 'bad', 'horrible', 'disappointing', 'dirty',
+    'noisy', 'uncomfortable', 'small', 'cramped', 'old', 'outdated',
+    'inconvenient', 'difficult', 'problems', 'issues', 'broken',
+    'poor', 'worst', 'unpleasant', 'disgusting', 'nasty', 'dreadful'
+)
+
+# Theme -> words counted into desc_{theme}_mentions
+DESCRIPTION_THEME_WORDS = MappingProxyType({
+    'luxury': ('luxury', 'luxurious', 'premium', 'upscale', 'high-end', 'exclusive', 'elegant'),
+    'location': ('location', 'neighbourhood', 'neighborhood', 'area', 'district', 'zone',
+                 'close', 'near', 'walking', 'minutes', 'central', 'convenient'),
+    'transport': ('metro', 'tube', 'underground', 'subway', 'bus', 'train', 'station',
+                  'transport', 'uber', 'taxi', 'airport', 'railway'),
+    'experience': ('experience', 'enjoy', 'relax', 'explore', 'discover', 'adventure',
+                   'stay', 'visit', 'holiday', 'vacation', 'getaway'),
+    'facility': ('kitchen', 'bathroom', 'bedroom', 'living', 'dining', 'balcony',
+                 'garden', 'parking', 'wifi', 'pool', 'gym'),
+    'business': ('business', 'work', 'workspace', 'office', 'meetings', 'conference',
+                 'professional', 'corporate'),
+    'safety': ('safe', 'secure', 'security', 'safety', 'protected', 'gated', 'keyless'),
+    'cleanliness': ('clean', 'fresh', 'spotless', 'sanitised', 'sanitized', 'hygienic', 'tidy'),
+    'comfort': ('comfortable', 'cosy', 'cozy', 'relaxing', 'peaceful', 'quiet', 'serene'),
+    'view': ('view', 'views', 'overlook', 'facing', 'panoramic', 'scenic'),
+    'activity': ('restaurant', 'shopping', 'museum', 'theatre', 'theater', 'park', 'beach',
+                 'nightlife', 'entertainment', 'attractions'),
+    'food': ('restaurant', 'food', 'dining', 'cafe', 'coffee', 'breakfast', 'kitchen'),
+    'family': ('family', 'children', 'kids', 'child-friendly', 'family-friendly'),
+    'romantic': ('romantic', 'couple', 'honeymoon', 'intimate', 'private')
+})
+
+NAME_LUXURY_WORDS = ('luxury', 'luxurious', 'premium', 'deluxe', 'executive',
+                     'penthouse', 'villa', 'mansion', 'suite', 'presidential')
+
+NAME_LOCATION_WORDS = ('central', 'centre', 'center', 'downtown', 'city centre',
+                       'city center', 'heart of', 'near', 'close to', 'walking distance',
+                       'zone 1', 'zone 2', 'prime location')
+
+NAME_COMFORT_WORDS = ('cosy', 'cozy', 'comfortable', 'spacious', 'bright', 'modern',
+                      'stylish', 'beautiful', 'charming', 'elegant', 'sophisticated')
+
+NAME_VIEW_WORDS = ('view', 'garden', 'balcony', 'terrace', 'sea view', 'ocean view',
+                   'mountain view', 'city view', 'river view', 'park view', 'skyline')
+
+# Aggregated description scores -> themes summed into them (and weight if not 1)
+DESCRIPTION_THEME_SCORES = MappingProxyType({
+    'desc_luxury_themes_score': ('luxury',),
+    'desc_location_themes_score': ('location', 'transport'),
+    'desc_experience_themes_score': ('experience',),
+    'desc_amenity_themes_score': ('facility',),
+    'desc_comfort_themes_score': ('comfort',),
+    'desc_space_themes_score': ('view',),
+    'desc_cleanliness_score': ('cleanliness',),
+    'desc_business_score': ('business',)
+})
+DESCRIPTION_THEME_SCORE_WEIGHTS = MappingProxyType({
+    'desc_luxury_themes_score': 2,
+    'desc_cleanliness_score': 2,
+    'desc_business_score': 2
+})
+
+# Amenity scores -> flags summed into them
+AMENITY_SCORES = MappingProxyType({
+    'basic_amenities_score': ('has_wifi', 'has_kitchen', 'has_tv', 'has_essentials', 'has_heating'),
+    'luxury_amenities_score': ('has_pool', 'has_hot_tub', 'has_gym', 'has_concierge', 'has_room_service'),
+    'convenience_amenities_score': ('has_washer', 'has_dryer', 'has_dishwasher', 'has_free_parking'),
+    'comfort_amenities_count': ('has_air_conditioning', 'has_heating', 'has_fireplace', 'has_fan')
+})
+
 # Text analysis functions
 
 
@@ -167,8 +363,7 @@ def calculate_readability_score(text):
     if sentences == 0 or words == 0:
         return 0
     
-    vowels = 'aeiouAEIOU'
-    syllables = sum(1 for char in text_str if char in vowels)
+    syllables = sum(text_str.count(vowel) for vowel in 'aeiouAEIOU')
     
     if syllables == 0:
         syllables = words
@@ -186,25 +381,8 @@ def calculate_sentiment_score(text):
     
     text_lower = str(text).lower()
     
-    positive_words = [
-        'amazing', 'beautiful', 'perfect', 'excellent', 'wonderful', 'fantastic', 
-        'great', 'awesome', 'lovely', 'stunning', 'spectacular', 'incredible',
-        'comfortable', 'cosy', 'cozy', 'charming', 'peaceful', 'relaxing', 
-        'enjoyable', 'delightful', 'convenient', 'spacious', 'bright', 'clean', 
-        'modern', 'stylish', 'elegant', 'sophisticated', 'luxury', 'premium',
-        'superb', 'outstanding', 'exceptional', 'brilliant', 'magnificent',
-        'gorgeous', 'fabulous', 'splendid', 'marvellous', 'marvelous'
-    ]
-    
-    negative_words = [
-        'terrible', 'awful', 'bad', 'horrible', 'disappointing', 'dirty',
-        'noisy', 'uncomfortable', 'small', 'cramped', 'old', 'outdated',
-        'inconvenient', 'difficult', 'problems', 'issues', 'broken',
-        'poor', 'worst', 'unpleasant', 'disgusting', 'nasty', 'dreadful'
-    ]
-    
-    positive_count = sum(1 for word in positive_words if word in text_lower)
-    negative_count = sum(1 for word in negative_words if word in text_lower)
+    positive_count = sum(1 for word in POSITIVE_WORDS if word in text_lower)
+    negative_count = sum(1 for word in NEGATIVE_WORDS if word in text_lower)
     
     total_words = len(text_lower.split())
     if total_words == 0:
@@ -213,8 +391,13 @@ def calculate_sentiment_score(text):
     sentiment_score = (positive_count - negative_count) / max(total_words / 20, 1)
     return max(-1, min(1, sentiment_score))
 
-def extract_description_features(description):
-    """Extract features from description"""
+def extract_description_features(description, include=None):
+    """
+    Extract features from description
+    
+    include: optional set of output keys to compute; keyword families whose
+    outputs are not needed are skipped
+    """
     if pd.isna(description):
         return {
             'desc_length': 0, 'desc_word_count': 0, 'desc_sentence_count': 0,
@@ -237,6 +420,12 @@ def extract_description_features(description):
     desc_lower = desc_str.lower()
     words = desc_str.split()
     
+    # Only outputs in include are computed (all of them when include is None)
+    wanted = (lambda key: True) if include is None else include.__contains__
+    themes = [theme for theme in DESCRIPTION_THEME_WORDS
+              if wanted(f'desc_{theme}_mentions')
+              or any(wanted(score) and theme in score_themes for score, score_themes in DESCRIPTION_THEME_SCORES.items())]
+    
     features = {}
     
     # Basic text statistics
@@ -246,87 +435,43 @@ def extract_description_features(description):
     features['avg_word_length'] = np.mean([len(word) for word in words]) if words else 0
     
     # Character diversity
-    unique_chars = len(set(desc_str.lower()))
-    features['desc_char_diversity'] = unique_chars / len(desc_str) if len(desc_str) > 0 else 0
+    if wanted('desc_char_diversity'):
+        unique_chars = len(set(desc_str.lower()))
+        features['desc_char_diversity'] = unique_chars / len(desc_str) if len(desc_str) > 0 else 0
     
     # Readability and sentiment
-    features['desc_readability'] = calculate_readability_score(desc_str)
-    features['desc_sentiment_score'] = calculate_sentiment_score(desc_str)
+    if wanted('desc_readability'):
+        features['desc_readability'] = calculate_readability_score(desc_str)
+    if wanted('desc_sentiment_score') or wanted('desc_emotional_score'):
+        features['desc_sentiment_score'] = calculate_sentiment_score(desc_str)
     
     # Theme-based mentions
-    luxury_words = ['luxury', 'luxurious', 'premium', 'upscale', 'high-end', 'exclusive', 'elegant']
-    features['desc_luxury_mentions'] = sum(1 for word in luxury_words if word in desc_lower)
-    
-    location_words = ['location', 'neighbourhood', 'neighborhood', 'area', 'district', 'zone',
-                     'close', 'near', 'walking', 'minutes', 'central', 'convenient']
-    features['desc_location_mentions'] = sum(1 for word in location_words if word in desc_lower)
-    
-    transport_words = ['metro', 'tube', 'underground', 'subway', 'bus', 'train', 'station', 
-                      'transport', 'uber', 'taxi', 'airport', 'railway']
-    features['desc_transport_mentions'] = sum(1 for word in transport_words if word in desc_lower)
-    
-    experience_words = ['experience', 'enjoy', 'relax', 'explore', 'discover', 'adventure', 
-                       'stay', 'visit', 'holiday', 'vacation', 'getaway']
-    features['desc_experience_mentions'] = sum(1 for word in experience_words if word in desc_lower)
-    
-    facility_words = ['kitchen', 'bathroom', 'bedroom', 'living', 'dining', 'balcony', 
-                     'garden', 'parking', 'wifi', 'pool', 'gym']
-    features['desc_facility_mentions'] = sum(1 for word in facility_words if word in desc_lower)
-    
-    business_words = ['business', 'work', 'workspace', 'office', 'meetings', 'conference', 
-                     'professional', 'corporate']
-    features['desc_business_mentions'] = sum(1 for word in business_words if word in desc_lower)
-    
-    safety_words = ['safe', 'secure', 'security', 'safety', 'protected', 'gated', 'keyless']
-    features['desc_safety_mentions'] = sum(1 for word in safety_words if word in desc_lower)
-    
-    cleanliness_words = ['clean', 'fresh', 'spotless', 'sanitised', 'sanitized', 'hygienic', 'tidy']
-    features['desc_cleanliness_mentions'] = sum(1 for word in cleanliness_words if word in desc_lower)
-    
-    comfort_words = ['comfortable', 'cosy', 'cozy', 'relaxing', 'peaceful', 'quiet', 'serene']
-    features['desc_comfort_mentions'] = sum(1 for word in comfort_words if word in desc_lower)
-    
-    view_words = ['view', 'views', 'overlook', 'facing', 'panoramic', 'scenic']
-    features['desc_view_mentions'] = sum(1 for word in view_words if word in desc_lower)
-    
-    activity_words = ['restaurant', 'shopping', 'museum', 'theatre', 'theater', 'park', 'beach', 
-                     'nightlife', 'entertainment', 'attractions']
-    features['desc_activity_mentions'] = sum(1 for word in activity_words if word in desc_lower)
-    
-    food_words = ['restaurant', 'food', 'dining', 'cafe', 'coffee', 'breakfast', 'kitchen']
-    features['desc_food_mentions'] = sum(1 for word in food_words if word in desc_lower)
-    
-    family_words = ['family', 'children', 'kids', 'child-friendly', 'family-friendly']
-    features['desc_family_mentions'] = sum(1 for word in family_words if word in desc_lower)
-    
-    romantic_words = ['romantic', 'couple', 'honeymoon', 'intimate', 'private']
-    features['desc_romantic_mentions'] = sum(1 for word in romantic_words if word in desc_lower)
+    for theme in themes:
+        features[f'desc_{theme}_mentions'] = sum(1 for word in DESCRIPTION_THEME_WORDS[theme] if word in desc_lower)
     
     # Punctuation and formatting
     features['desc_exclamation_count'] = desc_str.count('!')
     features['desc_question_count'] = desc_str.count('?')
     
-    caps_count = sum(1 for char in desc_str if char.isupper())
-    features['desc_caps_ratio'] = caps_count / len(desc_str) if len(desc_str) > 0 else 0
+    if wanted('desc_caps_ratio'):
+        caps_count = sum(map(str.isupper, desc_str))
+        features['desc_caps_ratio'] = caps_count / len(desc_str) if len(desc_str) > 0 else 0
     
-    features['desc_number_count'] = sum(1 for word in words if any(char.isdigit() for char in word))
+    if wanted('desc_number_count'):
+        features['desc_number_count'] = sum(1 for word in words if any(map(str.isdigit, word)))
     
     # Theme scores (aggregated)
-    features['desc_luxury_themes_score'] = features['desc_luxury_mentions'] * 2
-    features['desc_location_themes_score'] = features['desc_location_mentions'] + features['desc_transport_mentions']
-    features['desc_experience_themes_score'] = features['desc_experience_mentions']
-    features['desc_amenity_themes_score'] = features['desc_facility_mentions']
-    features['desc_comfort_themes_score'] = features['desc_comfort_mentions']
-    features['desc_space_themes_score'] = features['desc_view_mentions']
-    features['desc_emotional_score'] = features['desc_sentiment_score'] * 10
+    for score, score_themes in DESCRIPTION_THEME_SCORES.items():
+        if wanted(score):
+            features[score] = sum(features[f'desc_{theme}_mentions'] for theme in score_themes) * DESCRIPTION_THEME_SCORE_WEIGHTS.get(score, 1)
+    if 'desc_sentiment_score' in features:
+        features['desc_emotional_score'] = features['desc_sentiment_score'] * 10
     features['desc_urgency_score'] = features['desc_exclamation_count']
-    features['desc_cleanliness_score'] = features['desc_cleanliness_mentions'] * 2
-    features['desc_business_score'] = features['desc_business_mentions'] * 2
     
     return features
 
-def extract_name_features(name):
-    """Extract features from listing name"""
+def extract_name_features(name, include=None):
+    """Extract features from listing name (include: optional set of output keys to compute)"""
     if pd.isna(name):
         return {
             'name_length': 0, 'name_word_count': 0, 'name_luxury_score': 0,
@@ -344,14 +489,11 @@ def extract_name_features(name):
     features['name_length'] = len(name)
     features['name_word_count'] = len(name.split())
     
-    luxury_words = ['luxury', 'luxurious', 'premium', 'deluxe', 'executive', 
-                   'penthouse', 'villa', 'mansion', 'suite', 'presidential']
-    features['name_luxury_score'] = sum(1 for word in luxury_words if word in name_lower)
+    if include is None or 'name_luxury_score' in include:
+        features['name_luxury_score'] = sum(1 for word in NAME_LUXURY_WORDS if word in name_lower)
     
-    location_words = ['central', 'centre', 'center', 'downtown', 'city centre', 
-                     'city center', 'heart of', 'near', 'close to', 'walking distance',
-                     'zone 1', 'zone 2', 'prime location']
-    features['name_location_score'] = sum(1 for word in location_words if word in name_lower)
+    if include is None or 'name_location_score' in include:
+        features['name_location_score'] = sum(1 for word in NAME_LOCATION_WORDS if word in name_lower)
     
     features['name_mentions_apartment'] = any(word in name_lower for word in ['apartment', 'flat', 'apt'])
     features['name_mentions_house'] = any(word in name_lower for word in ['house', 'home', 'cottage', 'townhouse'])
@@ -359,16 +501,14 @@ def extract_name_features(name):
     features['name_mentions_loft'] = 'loft' in name_lower
     features['name_mentions_room'] = 'room' in name_lower and 'bedroom' not in name_lower
     
-    comfort_words = ['cosy', 'cozy', 'comfortable', 'spacious', 'bright', 'modern', 
-                    'stylish', 'beautiful', 'charming', 'elegant', 'sophisticated']
-    features['name_comfort_score'] = sum(1 for word in comfort_words if word in name_lower)
+    if include is None or 'name_comfort_score' in include:
+        features['name_comfort_score'] = sum(1 for word in NAME_COMFORT_WORDS if word in name_lower)
     
     features['name_mentions_private'] = 'private' in name_lower
     features['name_mentions_entire'] = any(word in name_lower for word in ['entire', 'whole', 'full'])
     
-    view_words = ['view', 'garden', 'balcony', 'terrace', 'sea view', 'ocean view', 
-                 'mountain view', 'city view', 'river view', 'park view', 'skyline']
-    features['name_view_score'] = sum(1 for word in view_words if word in name_lower)
+    if include is None or 'name_view_score' in include:
+        features['name_view_score'] = sum(1 for word in NAME_VIEW_WORDS if word in name_lower)
     
     features['name_mentions_central'] = any(word in name_lower for word in ['central', 'centre', 'center'])
     features['name_mentions_modern'] = any(word in name_lower for word in ['modern', 'contemporary', 'new', 'renovated'])
@@ -376,13 +516,14 @@ def extract_name_features(name):
     return features
 
 def extract_url_features(url):
-    """Extract features from picture URL"""
+    """Extract features from picture URL (categorical outputs as integer codes)"""
     if pd.isna(url):
         return {
             'has_picture': False, 'url_length': 0, 'is_muscache': False,
-            'image_id_length': 0, 'is_original': False, 'file_extension': 'none',
+            'image_id_length': 0, 'is_original': False,
+            'file_extension': FILE_EXTENSION_CODES['none'],
             'url_has_size_param': False, 'url_path_segments': 0,
-            'estimated_image_quality': 'unknown', 'url_complexity_score': 0
+            'estimated_image_quality': IMAGE_QUALITY_CODES['unknown'], 'url_complexity_score': 0
         }
     
     url_str = str(url)
@@ -392,7 +533,7 @@ def extract_url_features(url):
     features['url_length'] = len(url_str)
     features['is_muscache'] = 'muscache.com' in url_str.lower()
     
-    image_id_match = re.search(r'/([a-f0-9]{8,}|[0-9]{8,})[\/_]', url_str)
+    image_id_match = IMAGE_ID_PATTERN.search(url_str)
     if image_id_match:
         features['image_id_length'] = len(image_id_match.group(1))
     else:
@@ -400,23 +541,25 @@ def extract_url_features(url):
     
     features['is_original'] = '_original' in url_str.lower()
     
-    extension_match = re.search(r'\.([a-zA-Z]{3,4})(?:\?|$)', url_str)
+    extension_match = FILE_EXTENSION_PATTERN.search(url_str)
     if extension_match:
-        features['file_extension'] = extension_match.group(1).lower()
+        extension = extension_match.group(1).lower()
+        features['file_extension'] = FILE_EXTENSION_CODES.get(extension, FILE_EXTENSION_CODES['other'])
     else:
-        features['file_extension'] = 'none'
+        features['file_extension'] = FILE_EXTENSION_CODES['none']
     
     features['url_has_size_param'] = any(param in url_str for param in ['im_w=', 'im_h=', 'w=', 'h='])
     features['url_path_segments'] = len([seg for seg in url_str.split('/') if seg])
     
     if '_original' in url_str:
-        features['estimated_image_quality'] = 'original'
+        quality = 'original'
     elif any(size in url_str for size in ['_large', '_xl', '_xxl']):
-        features['estimated_image_quality'] = 'large'
+        quality = 'large'
     elif any(size in url_str for size in ['_medium', '_med']):
-        features['estimated_image_quality'] = 'medium'
+        quality = 'medium'
     else:
-        features['estimated_image_quality'] = 'standard'
+        quality = 'standard'
+    features['estimated_image_quality'] = IMAGE_QUALITY_CODES[quality]
     
     complexity_score = 0
     complexity_score += features['url_path_segments'] * 0.5
@@ -464,36 +607,44 @@ def has_amenity_flexible(amenities_list, amenity_terms):
     
     return False
 
-def extract_all_amenity_features(amenities_str):
-    """Extract all amenity features from amenities string"""
+def extract_all_amenity_features(amenities_str, include=None):
+    """
+    Extract all amenity features from amenities string
+    
+    include: optional set of output keys to compute; amenity flags that no
+    requested output depends on are not searched for
+    """
     amenities_list = parse_amenities_simple(amenities_str)
     features = {'amenities_count': len(amenities_list)}
     
+    wanted = (lambda key: True) if include is None else include.__contains__
+    needed_flags = None
+    if include is not None:
+        needed_flags = {key for key in include if key.startswith('has_')}
+        for category_name, category_amenities in all_amenity_categories.items():
+            if wanted(f"{category_name.lower()}_amenities_count"):
+                needed_flags.update(f"has_{amenity}" for amenity in category_amenities)
+        for score, score_flags in AMENITY_SCORES.items():
+            if wanted(score):
+                needed_flags.update(score_flags)
+    
     # Create binary features for all amenities
     for category_name, category_amenities in all_amenity_categories.items():
         for amenity, search_terms in category_amenities.items():
             col_name = f"has_{amenity}"
-            features[col_name] = has_amenity_flexible(amenities_list, search_terms)
+            if needed_flags is None or col_name in needed_flags:
+                features[col_name] = has_amenity_flexible(amenities_list, search_terms)
     
     # Create category counts
     for category_name, category_amenities in all_amenity_categories.items():
-        category_cols = [f"has_{amenity}" for amenity in category_amenities.keys()]
         count_col = f"{category_name.lower()}_amenities_count"
-        features[count_col] = sum(features.get(col, 0) for col in category_cols)
+        if wanted(count_col):
+            features[count_col] = sum(features.get(f"has_{amenity}", 0) for amenity in category_amenities)
     
     # Create amenity scores
-    basic_features = ['has_wifi', 'has_kitchen', 'has_tv', 'has_essentials', 'has_heating']
-    features['basic_amenities_score'] = sum(features.get(col, 0) for col in basic_features)
-    
-    luxury_features = ['has_pool', 'has_hot_tub', 'has_gym', 'has_concierge', 'has_room_service']
-    features['luxury_amenities_score'] = sum(features.get(col, 0) for col in luxury_features)
-    
-    convenience_features = ['has_washer', 'has_dryer', 'has_dishwasher', 'has_free_parking']
-    features['convenience_amenities_score'] = sum(features.get(col, 0) for col in convenience_features)
-    
-    # Comfort amenities count
-    comfort_features = ['has_air_conditioning', 'has_heating', 'has_fireplace', 'has_fan']
-    features['comfort_amenities_count'] = sum(features.get(col, 0) for col in comfort_features)
+    for score, score_flags in AMENITY_SCORES.items():
+        if wanted(score):
+            features[score] = sum(features.get(col, 0) for col in score_flags)
     
     return features
 
@@ -561,216 +712,397 @@ def categorize_text_appeal(text_quality_score):
     else:
         return 'Basic'
 
-# Complete preprocessing
+# Listing and derived features
+
+def extract_listing_features(user_data, city=MANCHESTER):
+    """Extract numeric, host and one-hot encoded features from form inputs"""
+    features = {}
+    
+    # Basic numeric inputs
+    features['accommodates'] = user_data.get('accommodates', 2)
+    features['bedrooms'] = user_data.get('bedrooms', 1)
+    features['bathrooms'] = user_data.get('bathrooms', 1.0)
+    features['beds'] = user_data.get('beds', 1)
+    features['latitude'] = user_data.get('latitude', city.default_coords[0])
+    features['longitude'] = user_data.get('longitude', city.default_coords[1])
+    features['number_of_reviews'] = user_data.get('number_of_reviews', 0)
+    features['host_total_listings_count'] = user_data.get('host_total_listings_count', 1)
+    
+    # Review scores
+    for col in REVIEW_SCORE_COLUMNS:
+        features[col] = user_data.get(col, 4.5)
+    
+    # Host information
+    features['host_is_superhost'] = 1 if user_data.get('host_is_superhost', False) else 0
+    features['host_identity_verified'] = 1 if user_data.get('host_identity_verified', False) else 0
+    features['host_has_profile_pic'] = 1
+    
+    # Host days active at the stay date (the training snapshot date without one)
+    if 'host_since' in user_data:
+        host_since = pd.to_datetime(user_data['host_since'])
+        reference_date = pd.to_datetime(user_data.get('stay_date', SNAPSHOT_DATE))
+        features['host_days_active'] = max(0, (reference_date - host_since).days)
+    
+    # One-hot encodings
+    for rt in ROOM_TYPES:
+        features[f'room_type_{rt}'] = 1 if user_data.get('room_type') == rt else 0
+    for pt in PROPERTY_TYPES:
+        features[f'property_type_{pt}'] = 1 if user_data.get('property_type') == pt else 0
+    for neighbourhood in city.neighbourhoods:
+        features[f'neighbourhood_cleansed_{neighbourhood}'] = 1 if user_data.get('neighbourhood_cleansed') == neighbourhood else 0
+    for rt in RESPONSE_TIMES:
+        features[f'host_response_time_{rt}'] = 1 if user_data.get('host_response_time') == rt else 0
+    
+    # Single-group cities (Manchester) always set their group
+    group = city.neighbourhood_groups.get(user_data.get('neighbourhood_cleansed'), city.default_group)
+    for name in sorted({city.default_group, *city.neighbourhood_groups.values()}):
+        features[f'neighbourhood_group_cleansed_{name}'] = 1 if name == group else 0
+    
+    features['instant_bookable'] = 1 if user_data.get('instant_bookable', False) else 0
+    
+    # Calculated host listings counts
+    total_listings = features['host_total_listings_count']
+    features['calculated_host_listings_count'] = total_listings
+    features['calculated_host_listings_count_private_rooms'] = total_listings if user_data.get('room_type') == 'Private room' else 0
+    features['calculated_host_listings_count_shared_rooms'] = total_listings if user_data.get('room_type') == 'Shared room' else 0
+    
+    return features
+
+# Derived features
+
+def derive_people_per_bedroom(user_data, values, results):
+    """People per bedroom from capacity"""
+    return {'people_per_bedroom': values['accommodates'] / max(values['bedrooms'], 1)}
+
+def derive_avg_review_score(user_data, values, results):
+    """Mean of the seven review dimensions"""
+    return {'avg_review_score': np.mean([values.get(col, 4.5) for col in REVIEW_SCORE_COLUMNS])}
 
-def preprocess_user_input(user_data, feature_columns, feature_defaults):
+def derive_text_quality(user_data, values, results):
+    """Overall text quality score and its percentile estimate"""
+    text_quality = calculate_overall_text_quality(results['name'], results['description'], results['amenities'])
+    return {
+        'overall_text_quality': text_quality,
+        'text_quality_percentile': min(100, text_quality * 2)
+    }
+
+def derive_text_appeal(user_data, values, results):
+    """Text appeal category one-hots"""
+    text_appeal = categorize_text_appeal(results['text_quality']['overall_text_quality'])
+    features = {}
+    for category in ['Low', 'Medium', 'High', 'Premium']:
+        features[f'text_quality_category_{category}'] = 1 if text_appeal == category else 0
+        features[f'text_appeal_category_{category}'] = 1 if text_appeal == category else 0
+    return features
+
+def derive_text_intelligence(user_data, values, results):
+    """Text intelligence score"""
+    return {'text_intelligence_score': calculate_text_intelligence_score(results['name'], results['description'])}
+
+def derive_reviews_per_month(user_data, values, results):
+    """Reviews per month of hosting (left at the default without a host_since date)"""
+    if values.get('host_days_active', 0) > 0:
+        months_active = values['host_days_active'] / 30.44
+        return {'reviews_per_month': values['number_of_reviews'] / max(months_active, 1)}
+    return {}
+
+# Feature graph
+# Each node declares the user_data keys (inputs) and upstream nodes (after) it
+# reads. Nodes are listed in dependency order.
+
+# reads lists the upstream outputs a derived node uses, so layouts can skip
+# computing anything neither the model nor a needed node reads.
+
+FeatureNode = namedtuple('FeatureNode', ['name', 'inputs', 'after', 'compute', 'reads'], defaults=(None,))
+
+LISTING_INPUTS = ('accommodates', 'bedrooms', 'bathrooms', 'beds', 'latitude', 'longitude',
+                  'number_of_reviews', 'host_total_listings_count', *REVIEW_SCORE_COLUMNS,
+                  'host_is_superhost', 'host_identity_verified', 'host_since', 'stay_date', 'room_type',
+                  'property_type', 'neighbourhood_cleansed', 'host_response_time', 'instant_bookable')
+
+# Extractor nodes read user_data directly and accept the set of outputs to
+# compute and the City whose tables encode location
+EXTRACTOR_NODES = ('name', 'description', 'url', 'amenities', 'listing')
+
+TEXT_QUALITY_READS = {
+    'name': ('name_luxury_score', 'name_location_score', 'name_comfort_score', 'name_view_score',
+             'name_mentions_private', 'name_mentions_entire'),
+    'description': ('desc_luxury_mentions', 'desc_experience_mentions', 'desc_cleanliness_mentions',
+                    'desc_safety_mentions', 'desc_comfort_mentions', 'desc_sentiment_score',
+                    'desc_facility_mentions', 'desc_location_mentions'),
+    'amenities': ('luxury_amenities_score', 'convenience_amenities_score', 'basic_amenities_score',
+                  'safety_amenities_count')
+}
+
+TEXT_INTELLIGENCE_READS = {
+    'name': ('name_word_count',),
+    'description': ('desc_readability', 'desc_word_count', 'desc_sentiment_score')
+}
+
+FEATURE_GRAPH = [
+    FeatureNode('name', ('name',), (), lambda user_data, values, results, include, city: extract_name_features(user_data.get('name', ''), include)),
+    FeatureNode('description', ('description',), (), lambda user_data, values, results, include, city: extract_description_features(user_data.get('description', ''), include)),
+    FeatureNode('url', ('picture_url',), (), lambda user_data, values, results, include, city: extract_url_features(user_data.get('picture_url', ''))),
+    FeatureNode('amenities', ('amenities',), (), lambda user_data, values, results, include, city: extract_all_amenity_features(user_data.get('amenities', ''), include)),
+    FeatureNode('listing', LISTING_INPUTS, (), lambda user_data, values, results, include, city: extract_listing_features(user_data, city)),
+    FeatureNode('people_per_bedroom', ('accommodates', 'bedrooms'), (), derive_people_per_bedroom,
+                {'listing': ('accommodates', 'bedrooms')}),
+    FeatureNode('avg_review_score', REVIEW_SCORE_COLUMNS, (), derive_avg_review_score,
+                {'listing': tuple(REVIEW_SCORE_COLUMNS)}),
+    FeatureNode('text_quality', (), ('name', 'description', 'amenities'), derive_text_quality, TEXT_QUALITY_READS),
+    FeatureNode('text_appeal', (), ('text_quality',), derive_text_appeal, {'text_quality': ('overall_text_quality',)}),
+    FeatureNode('text_intelligence', (), ('name', 'description'), derive_text_intelligence, TEXT_INTELLIGENCE_READS),
+    FeatureNode('reviews_per_month', ('host_since', 'stay_date', 'number_of_reviews'), (), derive_reviews_per_month,
+                {'listing': ('host_days_active', 'number_of_reviews')})
+]
+
+def run_feature_graph(user_data, feature_defaults, layout, vector, results, nodes=None, city=None):
     """
-    Complete preprocessing pipeline for user input
+    Compute graph nodes and write their outputs into the vector
     
     Args:
         user_data: dict with user inputs
-        feature_columns: list of expected feature names
         feature_defaults: dict with default values for all features
-    
-    Returns:
-        DataFrame ready for model prediction
+        layout: FeatureLayout compiled for these artifacts (or None to skip writing)
+        vector: feature vector to update in place
+        results: dict of node outputs, updated in place (upstream outputs are read from it)
+        nodes: names of nodes to compute (all nodes if None)
+        city: City tables (default: the layout's, or Manchester without a layout)
+    
+    With a layout, nodes whose outputs nothing needs are skipped and
+    extractors compute only the outputs in layout.needed.
+    """
+    if city is None:
+        city = layout.city if layout is not None else MANCHESTER
+    values = None
+    for node in FEATURE_GRAPH:
+        if nodes is not None and node.name not in nodes:
+            continue
+        include = layout.needed[node.name] if layout is not None else None
+        if include is not None and not include:
+            continue
+        
+        if node.name in EXTRACTOR_NODES:
+            output = node.compute(user_data, values, results, include, city)
+        else:
+            # Derived nodes read listing inputs falling back to defaults
+            if values is None:
+                values = {**feature_defaults, **results['listing']}
+            output = node.compute(user_data, values, results)
+        results[node.name] = output
+        if layout is not None:
+            layout.reset(vector, node.name)
+            layout.fill(vector, node.name, output)
+    return results
+
+_MISSING = object()
+
+
+class IncrementalPreprocessor:
     """
-    # Start with defaults
-    processed = feature_defaults.copy()
+    Session-scoped preprocessing that only recomputes nodes downstream of changed inputs
     
-    # Extract text features
-    name_features = extract_name_features(user_data.get('name', ''))
-    desc_features = extract_description_features(user_data.get('description', ''))
-    url_features = extract_url_features(user_data.get('picture_url', ''))
-    amenity_features = extract_all_amenity_features(user_data.get('amenities', ''))
+    Keeps the last inputs, node outputs and feature vector, so resubmitting a
+    form where only one slider moved skips the text extractors entirely.
+    """
     
-    # Update with extracted features
-    processed.update(name_features)
-    processed.update(desc_features)
-    processed.update(url_features)
-    processed.update(amenity_features)
+    def __init__(self, feature_columns, feature_defaults, layout=None, city=None):
+        self.feature_defaults = feature_defaults
+        self.layout = layout or compile_feature_layout(feature_columns, feature_defaults, city)
+        self.vector = self.layout.new_vector()
+        self.results = {}
+        self.last_input = None
+        self.last_recomputed = []
+    
+    def dirty_nodes(self, user_data):
+        """Names of nodes whose inputs changed since the last update"""
+        if self.last_input is None:
+            return [node.name for node in FEATURE_GRAPH]
+        
+        keys = set(user_data) | set(self.last_input)
+        changed = {key for key in keys if user_data.get(key, _MISSING) != self.last_input.get(key, _MISSING)}
+        
+        dirty = []
+        for node in FEATURE_GRAPH:
+            if changed.intersection(node.inputs) or any(name in dirty for name in node.after):
+                dirty.append(node.name)
+        return dirty
+    
+    def update(self, user_data):
+        """Bring the features up to date with user_data and return a model-ready DataFrame"""
+        dirty = self.dirty_nodes(user_data)
+        if dirty:
+            run_feature_graph(user_data, self.feature_defaults, self.layout, self.vector, self.results, nodes=set(dirty))
+        self.last_input = dict(user_data)
+        self.last_recomputed = dirty
+        return self.layout.to_frame(self.vector.copy())
+
+# Feature column contract
+
+# Extractor keys that feed a differently named model column
+COLUMN_ALIASES = {
+    'desc_caps_ratio': 'desc_capitals_ratio'
+}
+
+# Used when a model column is missing from feature_defaults.pkl
+FALLBACK_DEFAULTS = {
+    'price_per_person': 30,
+    'availability_rate_365': 0.5,
+    'availability_rate_30': 0.5,
+    'days_since_last_review': 30,
+    'reviews_per_month': 0.5,
+    'host_acceptance_rate': 90,
+    'host_response_rate': 95
+}
+
+# Representative input used to discover every key each extractor emits
+_PROBE_INPUT = {
+    'name': 'Probe listing', 'description': 'Probe description.',
+    'picture_url': 'https://a0.muscache.com/pictures/12345678/probe_original.jpg',
+    'amenities': 'Wifi', 'host_since': '2020-01-01', 'room_type': ROOM_TYPES[0]
+}
+
+
+class FeatureLayout:
+    """
+    Column-index map compiled once per set of model artifacts
     
-    # Basic numeric inputs
-    processed['accommodates'] = user_data.get('accommodates', 2)
-    processed['bedrooms'] = user_data.get('bedrooms', 1)
-    processed['bathrooms'] = user_data.get('bathrooms', 1.0)
-    processed['beds'] = user_data.get('beds', 1)
-    processed['latitude'] = user_data.get('latitude', 53.4808)
-    processed['longitude'] = user_data.get('longitude', -2.2426)
-    processed['number_of_reviews'] = user_data.get('number_of_reviews', 0)
-    processed['host_total_listings_count'] = user_data.get('host_total_listings_count', 1)
+    Each extractor group gets a list of (output key, column slot) pairs, so
+    preprocessing writes straight into a preallocated vector in model order.
+    needed holds, per group, the output keys worth computing: those with a
+    slot plus those read by a needed downstream node. city is the City
+    whose tables the extractors encode locations with.
+    """
     
-    # Review scores
-    processed['review_scores_rating'] = user_data.get('review_scores_rating', 4.5)
-    processed['review_scores_cleanliness'] = user_data.get('review_scores_cleanliness', 4.5)
-    processed['review_scores_checkin'] = user_data.get('review_scores_checkin', 4.5)
-    processed['review_scores_communication'] = user_data.get('review_scores_communication', 4.5)
-    processed['review_scores_location'] = user_data.get('review_scores_location', 4.5)
-    processed['review_scores_accuracy'] = user_data.get('review_scores_accuracy', 4.5)
-    processed['review_scores_value'] = user_data.get('review_scores_value', 4.5)
+    def __init__(self, feature_columns, defaults_vector, slots, unused_keys, unfilled_columns, needed,
+                 city=MANCHESTER):
+        self.feature_columns = list(feature_columns)
+        self.index = {col: i for i, col in enumerate(self.feature_columns)}
+        self.defaults_vector = defaults_vector
+        self.slots = slots
+        self.unused_keys = unused_keys
+        self.unfilled_columns = unfilled_columns
+        self.needed = needed
+        self.city = city
+    
+    def new_vector(self):
+        """Fresh feature vector initialised to the defaults"""
+        return self.defaults_vector.copy()
+    
+    def reset(self, vector, group):
+        """Restore one extractor's slots to their defaults"""
+        for _, slot in self.slots[group]:
+            vector[slot] = self.defaults_vector[slot]
+    
+    def fill(self, vector, group, features):
+        """Write one extractor's output into its slots"""
+        for key, slot in self.slots[group]:
+            if key in features:
+                vector[slot] = features[key]
+    
+    def to_frame(self, vector):
+        """Wrap one vector (or a 2D block of vectors) as a model-ready DataFrame"""
+        return pd.DataFrame(np.atleast_2d(vector), columns=self.feature_columns)
+    
+    def report(self):
+        """Human-readable summary of contract mismatches"""
+        lines = []
+        for group, keys in self.unused_keys.items():
+            if keys:
+                lines.append(f"{group} keys not used by the model: {', '.join(keys)}")
+        if self.unfilled_columns:
+            lines.append(f"Model columns only filled from defaults: {', '.join(self.unfilled_columns)}")
+        return '\n'.join(lines)
+
+
+def compile_feature_layout(feature_columns, feature_defaults, city=None):
+    """
+    Compile the column-index map for a model's feature columns and the
+    City they were trained on (default: Manchester)
     
-    # Host information
-    processed['host_is_superhost'] = 1 if user_data.get('host_is_superhost', False) else 0
-    processed['host_identity_verified'] = 1 if user_data.get('host_identity_verified', False) else 0
+    Logs extractor keys the model never sees and model columns that no
+    extractor fills, so artifact mismatches surface at load time.
+    """
+    city = city or MANCHESTER
+    feature_columns = list(feature_columns)
+    index = {col: i for i, col in enumerate(feature_columns)}
+    
+    defaults_vector = np.array([
+        feature_defaults.get(col, FALLBACK_DEFAULTS.get(col, 0)) for col in feature_columns
+    ], dtype=np.float64)
+    
+    outputs = run_feature_graph(_PROBE_INPUT, feature_defaults, None, None, {}, city=city)
+    
+    slots = {}
+    unused_keys = {}
+    filled = set()
+    for group, features in outputs.items():
+        slots[group] = []
+        unused_keys[group] = []
+        for key in features:
+            column = COLUMN_ALIASES.get(key, key)
+            if column in index:
+                slots[group].append((key, index[column]))
+                filled.add(column)
+            else:
+                unused_keys[group].append(key)
+    
+    unfilled_columns = [col for col in feature_columns if col not in filled]
+    
+    # Walk the graph backwards so a node's reads count only if the node is needed
+    needed = {}
+    demanded = {}
+    for node in reversed(FEATURE_GRAPH):
+        keys = {key for key, _ in slots.get(node.name, [])} | demanded.get(node.name, set())
+        needed[node.name] = frozenset(keys)
+        if keys:
+            for upstream, read_keys in (node.reads or {}).items():
+                demanded.setdefault(upstream, set()).update(read_keys)
+    
+    layout = FeatureLayout(feature_columns, defaults_vector, slots, unused_keys, unfilled_columns, needed, city)
+    report = layout.report()
+    if report:
+        logger.warning("Feature column contract mismatches:\n%s", report)
+    return layout
+
+# Complete preprocessing
+
+def build_feature_vector(user_data, feature_defaults, layout, out=None):
+    """
+    Fill one model-ordered feature vector for user input
     
-    # Host days active
-    if 'host_since' in user_data:
-        host_since = pd.to_datetime(user_data['host_since'])
-        reference_date = pd.Timestamp('2024-01-01')
-        processed['host_days_active'] = max(0, (reference_date - host_since).days)
-    
-    # Room type one-hot encoding
-    room_types = ['Entire home/apt', 'Private room', 'Shared room', 'Hotel room']
-    for rt in room_types:
-        key = f'room_type_{rt}'
-        if key in processed:
-            processed[key] = 1 if user_data.get('room_type') == rt else 0
-    
-    # Property type one-hot encoding  
-    property_types = ['Entire home', 'Entire condo', 'Private room', 'Entire rental unit',
-                     'Entire serviced apartment', 'Entire townhouse', 'Private room in home',
-                     'Private room in townhouse', 'Private room in condo', 
-                     'Private room in rental unit', 'Entire cottage',
-                     'Private room in bed and breakfast', 'Room in hotel']
-    for pt in property_types:
-        key = f'property_type_{pt}'
-        if key in processed:
-            processed[key] = 1 if user_data.get('property_type') == pt else 0
-    
-    # Neighbourhood one-hot encoding
-    neighbourhoods = [
-        'City Centre', 'Trafford District', 'Bury District', 'Bolton District',
-        'Salford District', 'Stockport District', 'Tameside District',
-        'Rochdale District', 'Oldham District', 'Wigan District',
-        'Harpurhey', 'Longsight', 'Hulme', 'Old Moat', 'Fallowfield',
-        'Whalley Range', 'Levenshulme', 'Didsbury West', 'Crumpsall',
-        'Moss Side', 'Bradford', 'Miles Platting and Newton Heath',
-        'Rusholme', 'Withington', 'Gorton South', 'Chorlton Park',
-        'Chorlton', 'Cheetham', 'Ardwick', 'Gorton North',
-        'Northenden', 'Woodhouse Park', 'Didsbury East'
-    ]
-    
-    for neighbourhood in neighbourhoods:
-        key = f'neighbourhood_cleansed_{neighbourhood}'
-        if key in processed:
-            processed[key] = 1 if user_data.get('neighbourhood_cleansed') == neighbourhood else 0
-    
-    # Manchester always 1
-    if 'neighbourhood_group_cleansed_Manchester' in processed:
-        processed['neighbourhood_group_cleansed_Manchester'] = 1
-    
-    # Host response time encoding
-    response_times = ['within an hour', 'within a few hours', 'within a day', 'a few days or more']
-    for rt in response_times:
-        key = f'host_response_time_{rt}'
-        if key in processed:
-            processed[key] = 1 if user_data.get('host_response_time') == rt else 0
-    
-    # Instant bookable
-    if 'instant_bookable' in processed:
-        processed['instant_bookable'] = 1 if user_data.get('instant_bookable', False) else 0
-    
-    # Host has profile pic
-    if 'host_has_profile_pic' in processed:
-        processed['host_has_profile_pic'] = 1
-    
-    # Derived features
-    accommodates = processed['accommodates']
-    bedrooms = processed['bedrooms']
-    
-    if 'price_per_person' in processed:
-        # Use median from similar listings (stored in defaults)
-        processed['price_per_person'] = feature_defaults.get('price_per_person', 30)
-    
-    if 'people_per_bedroom' in processed:
-        processed['people_per_bedroom'] = accommodates / max(bedrooms, 1)
-    
-    # Average review score
-    if 'avg_review_score' in processed:
-        review_cols = ['review_scores_rating', 'review_scores_cleanliness', 
-                      'review_scores_checkin', 'review_scores_communication',
-                      'review_scores_location', 'review_scores_accuracy', 'review_scores_value']
-        review_values = [processed.get(col, 4.5) for col in review_cols]
-        processed['avg_review_score'] = np.mean(review_values)
-    
-    # Calculate text quality scores
-    text_quality = calculate_overall_text_quality(name_features, desc_features, amenity_features)
-    if 'overall_text_quality' in processed:
-        processed['overall_text_quality'] = text_quality
-    
-    if 'text_quality_percentile' in processed:
-        # Estimate percentile based on score
-        processed['text_quality_percentile'] = min(100, text_quality * 2)
-    
-    text_appeal = categorize_text_appeal(text_quality)
-    if 'text_quality_category_Low' in processed:
-        processed['text_quality_category_Low'] = 1 if text_appeal == 'Low' else 0
-    if 'text_quality_category_Medium' in processed:
-        processed['text_quality_category_Medium'] = 1 if text_appeal == 'Medium' else 0
-    if 'text_quality_category_High' in processed:
-        processed['text_quality_category_High'] = 1 if text_appeal == 'High' else 0
-    if 'text_quality_category_Premium' in processed:
-        processed['text_quality_category_Premium'] = 1 if text_appeal == 'Premium' else 0
-    
-    # Text intelligence score
-    if 'text_intelligence_score' in processed:
-        processed['text_intelligence_score'] = calculate_text_intelligence_score(name_features, desc_features)
-    
-    # Text appeal category
-    if 'text_appeal_category_Low' in processed:
-        processed['text_appeal_category_Low'] = 1 if text_appeal == 'Low' else 0
-    if 'text_appeal_category_Medium' in processed:
-        processed['text_appeal_category_Medium'] = 1 if text_appeal == 'Medium' else 0
-    if 'text_appeal_category_High' in processed:
-        processed['text_appeal_category_High'] = 1 if text_appeal == 'High' else 0
-    if 'text_appeal_category_Premium' in processed:
-        processed['text_appeal_category_Premium'] = 1 if text_appeal == 'Premium' else 0
-    
-    # Availability rates
-    if 'availability_rate_365' in processed:
-        processed['availability_rate_365'] = feature_defaults.get('availability_rate_365', 0.5)
-    if 'availability_rate_30' in processed:
-        processed['availability_rate_30'] = feature_defaults.get('availability_rate_30', 0.5)
-    
-    # Days since last review
-    if 'days_since_last_review' in processed:
-        processed['days_since_last_review'] = feature_defaults.get('days_since_last_review', 30)
-    
-    # Reviews per month
-    if 'reviews_per_month' in processed:
-        if processed.get('host_days_active', 0) > 0:
-            months_active = processed['host_days_active'] / 30.44
-            processed['reviews_per_month'] = processed['number_of_reviews'] / max(months_active, 1)
-        else:
-            processed['reviews_per_month'] = feature_defaults.get('reviews_per_month', 0.5)
+    Args:
+        user_data: dict with user inputs
+        feature_defaults: dict with default values for all features
+        layout: FeatureLayout compiled for these artifacts
+        out: preallocated row to write into (a new vector if None)
     
-    # Host acceptance/response rate
-    if 'host_acceptance_rate' in processed:
-        processed['host_acceptance_rate'] = feature_defaults.get('host_acceptance_rate', 90)
-    if 'host_response_rate' in processed:
-        processed['host_response_rate'] = feature_defaults.get('host_response_rate', 95)
+    Returns:
+        the filled vector
+    """
+    if out is None:
+        out = layout.new_vector()
+    else:
+        out[:] = layout.defaults_vector
     
-    # Calculated host listings counts
-    if 'calculated_host_listings_count' in processed:
-        processed['calculated_host_listings_count'] = processed.get('host_total_listings_count', 1)
-    if 'calculated_host_listings_count_private_rooms' in processed:
-        if user_data.get('room_type') == 'Private room':
-            processed['calculated_host_listings_count_private_rooms'] = processed.get('host_total_listings_count', 1)
-        else:
-            processed['calculated_host_listings_count_private_rooms'] = 0
-    if 'calculated_host_listings_count_shared_rooms' in processed:
-        if user_data.get('room_type') == 'Shared room':
-            processed['calculated_host_listings_count_shared_rooms'] = processed.get('host_total_listings_count', 1)
-        else:
-            processed['calculated_host_listings_count_shared_rooms'] = 0
+    run_feature_graph(user_data, feature_defaults, layout, out, {})
+    return out
+
+def preprocess_user_input(user_data, feature_columns, feature_defaults, layout=None):
+    """
+    Complete preprocessing pipeline for user input
     
-    # Create DataFrame with all features in correct order
-    df = pd.DataFrame([processed])
+    Args:
+        user_data: dict with user inputs
+        feature_columns: list of expected feature names
+        feature_defaults: dict with default values for all features
+        layout: FeatureLayout compiled for these artifacts (compiled on the fly if None)
     
-    # Ensure all expected columns exist
-    for col in feature_columns:
-        if col not in df.columns:
-            df[col] = 0
+    Returns:
+        DataFrame ready for model prediction
+    """
+    if layout is None:
+        layout = compile_feature_layout(feature_columns, feature_defaults)
     
-    # Return in correct order
-    return df[feature_columns]
+    vector = build_feature_vector(user_data, feature_defaults, layout)
+    return layout.to_frame(vector)
@@ -0,0 +1,542 @@
+"""
+Prediction service: validation, preprocessing and scoring outside Streamlit,
+with an asyncio micro-batching front end for concurrent callers and a
+minimal JSON-over-HTTP endpoint
+
+Run with: python service.py --port 8000 [--cities bundles/cities] [--workers 4]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+import artifacts
+import calendar_features
+import market
+import preprocessing
+import validation
+
+# Models a caller can pick per request: the deployed model or its distilled lookup-table surrogate
+MODELS = ('full', 'surrogate')
+
+
+class PredictionService:
+    """
+    Scores listing inputs with the deployed model
+
+    Args:
+        model, scaler, feature_columns, defaults: loaded artifacts
+        model_version: identifier written to the audit log
+        audit: optional audit_log.PredictionAuditLog
+        drift_monitor: optional drift.DriftMonitor updated with every scored batch
+        market_index: optional market.MarketIndex for percentile ranks
+        surrogate: optional surrogate.LookupSurrogate distilled from model,
+            scored instead of it when a caller asks for model='surrogate'
+        surrogate_version: identifier written to the audit log for surrogate scores
+        city: preprocessing.City the model was trained on (default: Manchester),
+            which sets the neighbourhood encoding and validation
+    """
+
+    def __init__(self, model, scaler, feature_columns, defaults, model_version='unknown',
+                 audit=None, drift_monitor=None, market_index=None, surrogate=None, surrogate_version='unknown',
+                 city=None):
+        self.model = model
+        self.scaler = scaler
+        self.feature_columns = feature_columns
+        self.defaults = defaults
+        self.model_version = model_version
+        self.audit = audit
+        self.drift_monitor = drift_monitor
+        self.market_index = market_index
+        self.surrogate = surrogate
+        self.surrogate_version = surrogate_version
+        self.city = city or preprocessing.MANCHESTER
+        self.schema = validation.city_schema(self.city)
+        self.layout = preprocessing.compile_feature_layout(feature_columns, defaults, self.city)
+
+    def scorer(self, model='full'):
+        """(model, version) to score with; raises ValueError for an unknown or unloaded model"""
+        if model == 'full':
+            return self.model, self.model_version
+        if model == 'surrogate' and self.surrogate is not None:
+            return self.surrogate, self.surrogate_version
+        if model == 'surrogate':
+            raise ValueError("PredictionService was created without a surrogate")
+        raise ValueError(f"Unknown model: {model} (expected one of {', '.join(MODELS)})")
+
+    def score_records(self, records, model='full'):
+        """
+        Validate, preprocess and score a list of user_data dicts as one matrix
+        with the full model or the surrogate
+
+        Returns:
+            (predictions, errors) where predictions is a float array with NaN
+            for rejected rows and errors maps row position -> exception
+        """
+        start_time = time.perf_counter()
+        scorer, version = self.scorer(model)
+        errors = {}
+        accepted = []
+        for i, user_data in enumerate(records):
+            if not isinstance(user_data, dict):
+                errors[i] = validation.InputValidationError(
+                    [f"expected an object of listing fields, got {type(user_data).__name__}"])
+                continue
+            try:
+                validation.validate_user_input(user_data, self.schema)
+                accepted.append(i)
+            except validation.InputValidationError as e:
+                errors[i] = e
+
+        predictions = np.full(len(records), np.nan)
+        matrix = np.empty((len(accepted), len(self.feature_columns)))
+        built = []
+        for i in accepted:
+            # One record that preprocessing cannot handle only fails itself
+            try:
+                preprocessing.build_feature_vector(records[i], self.defaults, self.layout, out=matrix[len(built)])
+                built.append(i)
+            except Exception as e:
+                errors[i] = e
+        accepted, matrix = built, matrix[:len(built)]
+        if not accepted:
+            return predictions, errors
+
+        features = self.layout.to_frame(matrix)
+        predictions[accepted] = scorer.predict(self.scaler.transform(features))
+
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        if self.audit is not None:
+            for row, i in enumerate(accepted):
+                self.audit.record(records[i], matrix[row], version, predictions[i], latency_ms)
+        if self.drift_monitor is not None:
+            self.drift_monitor.update(matrix)
+
+        return predictions, errors
+
+    def predict(self, user_data, model='full'):
+        """Predicted nightly price for one listing; raises InputValidationError on bad input"""
+        predictions, errors = self.score_records([user_data], model)
+        if errors:
+            raise errors[0]
+        return float(predictions[0])
+
+    def price_calendar(self, user_data, start=None, nights=365, model='full'):
+        """
+        Nightly prices for one listing over consecutive stay dates, scored
+        in one batch; raises InputValidationError on bad input
+
+        Returns:
+            DataFrame from calendar_features.price_nights
+        """
+        scorer, _ = self.scorer(model)
+        validation.validate_user_input(user_data, self.schema)
+        return calendar_features.price_nights(scorer, self.scaler, self.layout, self.defaults,
+                                              user_data, start, nights)
+
+    def market_positions(self, records, predictions):
+        """
+        Percentile rank of each predicted price among comparable listings
+
+        Args:
+            records: list of user_data dicts (or DataFrame) that were scored
+            predictions: prices from score_records; NaN rows are ranked as NaN
+
+        Returns:
+            DataFrame with percentile, segment and n_listings per record
+        """
+        if self.market_index is None:
+            raise ValueError("PredictionService was created without a market_index")
+        records = pd.DataFrame(list(records)) if not isinstance(records, pd.DataFrame) else records
+        positions = self.market_index.percentile_ranks(
+            predictions,
+            records['neighbourhood_cleansed'],
+            records['room_type'],
+            records['accommodates']
+        )
+        positions.loc[np.isnan(np.asarray(predictions, dtype=np.float64)), 'percentile'] = np.nan
+        return positions
+
+
+def bundle_city(bundle):
+    """City whose tables a bundle's manifest carries (city_bundles.export_city_bundle), else Manchester"""
+    tables = bundle.manifest.get('metadata', {}).get('city')
+    return preprocessing.city_from_tables(tables) if tables else preprocessing.MANCHESTER
+
+def load_service(bundle_path=None, audit=None, drift_monitor=None, market_index=None, surrogate_path=None):
+    """
+    Load an artifact bundle (default: the original deployment) into a
+    PredictionService, optionally with a surrogate bundle distilled from it
+
+    Bundles for another city get no market index unless one is passed.
+
+    Raises:
+        ValueError if the surrogate was distilled from a different model
+    """
+    bundle = artifacts.load_bundle(bundle_path)
+    model_version = artifacts.model_version(bundle_path)
+    city = bundle_city(bundle)
+    if market_index is None and city == preprocessing.MANCHESTER:
+        market_index = market.load_market_index()
+    surrogate = None
+    if surrogate_path is not None:
+        surrogate = artifacts.load_bundle(surrogate_path)
+        source_version = surrogate.manifest.get('metadata', {}).get('source_version')
+        if source_version != model_version or surrogate.feature_columns != bundle.feature_columns:
+            raise ValueError(f"Surrogate {surrogate_path} was distilled from model {source_version}, "
+                             f"not {model_version}")
+    return PredictionService(
+        bundle.model,
+        bundle.scaler,
+        bundle.feature_columns,
+        bundle.defaults,
+        model_version=model_version,
+        audit=audit,
+        drift_monitor=drift_monitor,
+        market_index=market_index,
+        surrogate=surrogate.model if surrogate is not None else None,
+        surrogate_version=artifacts.model_version(surrogate_path) if surrogate is not None else 'unknown',
+        city=city
+    )
+
+# Micro-batching
+
+
+class MicroBatcher:
+    """
+    Collects concurrent predict() calls into batches scored on a worker thread
+
+    A batch is dispatched when max_batch_size requests are waiting or
+    max_wait_ms has passed since the first one arrived, whichever is first.
+    XGBoost releases the GIL while predicting, so the event loop keeps
+    accepting requests while a batch is being scored.
+    Requests for the full model and the surrogate share a batch and are
+    scored in one call per model.
+
+    Args:
+        service: PredictionService
+        max_wait_ms: longest a request waits for companions
+        max_batch_size: largest batch scored at once
+        workers: threads scoring batches concurrently
+    """
+
+    def __init__(self, service, max_wait_ms=5.0, max_batch_size=64, workers=1):
+        self.service = service
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.batch_sizes = []
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='micro-batch')
+        self._queue = None
+        self._dispatcher = None
+        self._stopped = False
+        # Scoring tasks in flight; the event loop only keeps weak references to tasks
+        self._tasks = set()
+
+    async def start(self):
+        """Start the dispatcher on the running event loop"""
+        self._queue = asyncio.Queue()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        """
+        Stop accepting work: requests not yet batched fail with RuntimeError,
+        batches being scored finish, then the scoring threads shut down
+        """
+        self._stopped = True
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._fail([self._queue.get_nowait()], RuntimeError("MicroBatcher stopped"))
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown, True)
+
+    @property
+    def idle(self):
+        """True when no request is queued or being scored"""
+        return (self._queue is None or self._queue.empty()) and not self._tasks
+
+    async def predict(self, user_data, model='full'):
+        """
+        Predicted price for one listing with the full model or the surrogate,
+        scored as part of a micro-batch
+
+        Raises:
+            ValueError for an unknown or unloaded model
+        """
+        if self._stopped:
+            raise RuntimeError("MicroBatcher stopped")
+        self.service.scorer(model)
+        if self._queue is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((user_data, model, future))
+        return await future
+
+    @staticmethod
+    def _fail(batch, error):
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            try:
+                while len(batch) < self.max_batch_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                self._fail(batch, RuntimeError("MicroBatcher stopped"))
+                raise
+
+            self.batch_sizes.append(len(batch))
+            task = asyncio.create_task(self._score(loop, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _score(self, loop, batch):
+        # One score_records call per model in the batch
+        by_model = {}
+        for request in batch:
+            by_model.setdefault(request[1], []).append(request)
+
+        for model, requests in by_model.items():
+            records = [user_data for user_data, _, _ in requests]
+            try:
+                predictions, errors = await loop.run_in_executor(
+                    self._executor, self.service.score_records, records, model)
+            except Exception as e:
+                self._fail(requests, e)
+                continue
+
+            for i, (_, _, future) in enumerate(requests):
+                if future.done():
+                    continue
+                if i in errors:
+                    future.set_exception(errors[i])
+                else:
+                    future.set_result(float(predictions[i]))
+
+
+class BatchingThread:
+    """
+    Micro-batching for blocking callers such as HTTP handler threads
+
+    An event loop on a background thread runs one MicroBatcher per
+    (service, model); predict() submits to it and waits for the price. The
+    thread starts on first use, so a server forked after creating this
+    (prefork.serve_forked) starts one per worker. Batchers for services
+    that are no longer live (evicted city bundles) are stopped once idle.
+
+    Args:
+        live_services: callable returning the services still being served
+        max_wait_ms, max_batch_size: MicroBatcher settings
+    """
+
+    def __init__(self, live_services=None, max_wait_ms=5.0, max_batch_size=64):
+        self.live_services = live_services
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+        self.loop = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # (id(service), model) -> (service, MicroBatcher); only touched on the loop thread
+        self._batchers = {}
+
+    def predict(self, service, user_data, model='full'):
+        """Price for one listing, scored in a micro-batch; raises like PredictionService.predict"""
+        return asyncio.run_coroutine_threadsafe(self._predict(service, user_data, model), self._running_loop()).result()
+
+    def stop(self):
+        """Stop every batcher and the event loop thread"""
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                return
+            asyncio.run_coroutine_threadsafe(self._stop_batchers(list(self._batchers)), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()
+            self._thread = None
+
+    def _running_loop(self):
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self.loop = asyncio.new_event_loop()
+                self._batchers = {}
+                self._thread = threading.Thread(target=self.loop.run_forever, name='micro-batch-loop', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+            return self.loop
+
+    async def _predict(self, service, user_data, model):
+        key = (id(service), model)
+        if key not in self._batchers:
+            service.scorer(model)
+            await self._prune()
+            batcher = MicroBatcher(service, self.max_wait_ms, self.max_batch_size)
+            await batcher.start()
+            self._batchers[key] = (service, batcher)
+        return await self._batchers[key][1].predict(user_data, model)
+
+    async def _prune(self):
+        if self.live_services is None:
+            return
+        live = {id(service) for service in self.live_services()}
+        await self._stop_batchers([key for key, (_, batcher) in self._batchers.items()
+                                   if key[0] not in live and batcher.idle])
+
+    async def _stop_batchers(self, keys):
+        batchers = [self._batchers.pop(key)[1] for key in keys]
+        await asyncio.gather(*(batcher.stop() for batcher in batchers))
+
+# HTTP endpoint
+
+
+class PredictionHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that owns the BatchingThread its handlers score through"""
+
+    # Listen backlog; the default of 5 resets connections from bursts of clients
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, batching):
+        super().__init__(server_address, handler_class)
+        self.batching = batching
+
+    def server_close(self):
+        super().server_close()
+        self.batching.stop()
+
+
+def make_http_server(service, host='127.0.0.1', port=8000, cities=None, max_wait_ms=5.0, max_batch_size=64):
+    """
+    Threaded HTTP server around a PredictionService (standard library only)
+
+    POST /predict takes one user_data JSON object and returns
+    {"price": ..., "model_version": ...}; input that fails validation is a
+    422 with the validation messages. POST /predict?model=surrogate scores
+    with the service's surrogate instead. With cities (a
+    city_bundles.CityBundleCache), POST /predict?city=<name> scores with
+    that city's bundle, loaded on first use. GET /health returns 200 once
+    loaded.
+
+    Handler threads do not score on their own: concurrent requests for the
+    same bundle and model are micro-batched (BatchingThread) with
+    max_wait_ms and max_batch_size, and server_close() stops the batchers.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, so load generators are not measuring connection set-up
+        protocol_version = 'HTTP/1.1'
+
+        def _send_json(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send_json(200, {'status': 'ok', 'model_version': service.model_version})
+            else:
+                self._send_json(404, {'error': f"Unknown path: {self.path}"})
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            if url.path != '/predict':
+                self._send_json(404, {'error': f"Unknown path: {self.path}"})
+                return
+            try:
+                user_data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if not isinstance(user_data, dict):
+                    raise ValueError("Expected a JSON object")
+                query = parse_qs(url.query)
+                model = query.get('model', ['full'])[-1]
+                target = service
+                if 'city' in query:
+                    if cities is None:
+                        raise ValueError("This server serves a single city")
+                    target = cities.get(query['city'][-1])
+                _, version = target.scorer(model)
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            try:
+                price = self.server.batching.predict(target, user_data, model)
+            except validation.InputValidationError as e:
+                self._send_json(422, {'error': str(e), 'errors': e.errors})
+                return
+            except Exception as e:
+                self._send_json(500, {'error': f"{type(e).__name__}: {e}"})
+                return
+            self._send_json(200, {'price': price, 'model_version': version})
+
+        def log_message(self, format, *args):
+            # One line per request would dominate the cost under load
+            pass
+
+    def live_services():
+        return [service] + (cities.services() if cities is not None else [])
+
+    batching = BatchingThread(live_services, max_wait_ms, max_batch_size)
+    return PredictionHTTPServer((host, port), Handler, batching)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--bundle', default=None, help="artifact bundle directory (default: the original deployment)")
+    parser.add_argument('--surrogate', default=None, help="surrogate bundle distilled from --bundle (surrogate.py)")
+    parser.add_argument('--cities', default=None, help="directory of per-city bundles served with ?city= (city_bundles.py)")
+    parser.add_argument('--budget-mb', type=float, default=None, help="memory budget for loaded city bundles")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help="longest a request waits to be batched")
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="forked worker processes sharing the listening socket (prefork.py)")
+    args = parser.parse_args()
+
+    cities = None
+    if args.cities is not None:
+        import city_bundles
+        cities = city_bundles.CityBundleCache(args.cities, args.budget_mb or city_bundles.DEFAULT_BUDGET_MB)
+    prediction_service = load_service(args.bundle, surrogate_path=args.surrogate)
+    server = make_http_server(prediction_service, args.host, args.port, cities,
+                              args.max_wait_ms, args.max_batch_size)
+    print(f"Serving predictions on http://{args.host}:{args.port}/predict"
+          + (f" with {args.workers} workers" if args.workers > 1 else ""))
+    if args.workers > 1:
+        import prefork
+        prefork.serve_forked(server, prediction_service, args.workers)
+    else:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,287 @@
+"""
+Distilled lookup-table surrogate: an additive model with one binned table
+per feature, fitted to the deployed XGBoost model's predictions
+
+Every feature is cut into at most MAX_BINS bins (one per value for discrete
+features, quantiles otherwise) and contributes one learned value per bin;
+a prediction is a bin lookup, a gather and a sum over a (features x bins)
+float32 table. It cannot represent interactions, so it is meant for
+high-volume callers (calendar fan-out, what-if sweeps) that trade a little
+fidelity for speed; fidelity against the full model is measured on held-out
+listings and form submissions and stored in the bundle manifest.
+
+Run with: python surrogate.py --bundle bundles/surrogate
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import lsqr
+
+import artifacts
+import drift
+import preprocessing
+
+TRAINING_DATA_PATH = 'airbnb_processed_data.csv'
+
+LINKS = ('log', 'identity')
+
+# Bins per feature, and rows binned per step (keeps the edge comparison in cache)
+MAX_BINS = 16
+CHUNK_ROWS = 4096
+# Batches up to this size are binned with one (rows x features x edges) comparison
+SMALL_BATCH = 8
+
+# Synthetic rows labelled by the full model on top of the training rows: each
+# is a training listing with SWAP_FRACTION of its features taken from others
+AUGMENT_ROWS = 20000
+SWAP_FRACTION = 0.1
+# Form submissions labelled by the full model, since served inputs carry
+# defaults the processed listings never do; and how many are held out
+SUBMISSION_ROWS = 5000
+HOLDOUT_SUBMISSIONS = 500
+# Ridge penalty on bin values; bins few rows fall in stay near zero
+RIDGE = 10.0
+# Smallest price the log link is fitted to
+MIN_PRICE = 1.0
+
+
+class LookupSurrogate:
+    """
+    Binned additive regressor: intercept + sum of per-feature table values,
+    through an optional log link
+
+    edges: (features x max edges) interior bin edges padded with +inf
+    table: (features x max edges + 2) float32 bin values; the last slot of
+        each row is for missing values
+    """
+
+    def __init__(self, edges, table, intercept, link='log'):
+        if link not in LINKS:
+            raise ValueError(f"Unknown link: {link}")
+        self.edges = np.asarray(edges, dtype=np.float32)
+        self.table = np.asarray(table, dtype=np.float32)
+        self.intercept = float(intercept)
+        self.link = link
+
+        n_features, n_slots = self.table.shape
+        # Features by descending edge count, so pass k of the binning loop
+        # only touches the leading features that have more than k edges
+        n_edges = np.isfinite(self.edges).sum(axis=1)
+        self._order = np.argsort(-n_edges, kind='stable')
+        self._sorted_edges = self.edges[self._order]
+        widths = [(n_edges > k).sum() for k in range(self.edges.shape[1])]
+        self._passes = [np.ascontiguousarray(self._sorted_edges[:width, k, None]) for k, width in enumerate(widths)]
+        self._bin_dtype = np.int8 if self.edges.shape[1] < 128 else np.int16
+        self._offsets = (self._order * n_slots)[:, None]
+        self._missing = self._offsets + n_slots - 1
+
+    @property
+    def nbytes(self):
+        """Bytes held by the edge and value tables"""
+        return self.edges.nbytes + self.table.nbytes
+
+    @property
+    def n_features(self):
+        return self.table.shape[0]
+
+    def slots(self, X):
+        """
+        Flat table index of every row's bin (number of edges <= value, or
+        the missing slot) for every feature, as a (features x rows) array
+        in descending edge-count feature order
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        out = np.empty((X.shape[1], len(X)), dtype=np.intp)
+        for lo in range(0, len(X), CHUNK_ROWS):
+            # Feature-major, so each pass compares contiguous blocks
+            chunk = np.ascontiguousarray(X[lo:lo + CHUNK_ROWS].T[self._order])
+            if chunk.shape[1] <= SMALL_BATCH:
+                # A few rows: one broadcast comparison beats a loop of tiny operations
+                bins = (chunk[:, :, None] >= self._sorted_edges[:, None, :]).sum(axis=2)
+            else:
+                bins = np.zeros(chunk.shape, dtype=self._bin_dtype)
+                for edges in self._passes:
+                    bins[:len(edges)] += chunk[:len(edges)] >= edges
+            out[:, lo:lo + CHUNK_ROWS] = bins + self._offsets
+            missing = np.isnan(chunk)
+            if missing.any():
+                out[:, lo:lo + CHUNK_ROWS][missing] = np.broadcast_to(self._missing, missing.shape)[missing]
+        return out
+
+    def decision_function(self, X):
+        """Prediction before the link: intercept + sum of bin values"""
+        return self.intercept + self.table.ravel()[self.slots(X)].sum(axis=0, dtype=np.float64)
+
+    def predict(self, X):
+        score = self.decision_function(X)
+        return np.exp(score) if self.link == 'log' else score
+
+# Distillation
+
+
+def augment_rows(X, n_rows, seed=0, swap_fraction=SWAP_FRACTION):
+    """
+    Synthetic inputs near the training distribution: random training rows
+    with a random swap_fraction of features copied from other random rows
+    """
+    rng = np.random.default_rng(seed)
+    base = X[rng.integers(0, len(X), size=n_rows)]
+    donors = X[rng.integers(0, len(X), size=n_rows)]
+    swapped = rng.random(base.shape) < swap_fraction
+    return np.where(swapped, donors, base)
+
+def bin_edges(X, max_bins=MAX_BINS):
+    """Padded (features x max edges) edge matrix, as drift.build_reference cuts features"""
+    edges_list = [drift._feature_edges(X[:, j], max_bins) for j in range(X.shape[1])]
+    edges = np.full((X.shape[1], max(1, max(len(e) for e in edges_list))), np.inf, dtype=np.float32)
+    for j, e in enumerate(edges_list):
+        edges[j, :len(e)] = e
+    return edges
+
+def fit_surrogate(X, teacher, link='log', max_bins=MAX_BINS, ridge=RIDGE):
+    """
+    Fit a LookupSurrogate to a model's predictions
+
+    The bin values are a ridge least-squares fit on the one-hot bin
+    indicators (one non-zero per feature per row), solved sparsely.
+
+    Args:
+        X: scaled inputs the teacher was evaluated on
+        teacher: the full model's predictions for X
+    """
+    X = np.asarray(X, dtype=np.float32)
+    target = np.log(np.maximum(teacher, MIN_PRICE)) if link == 'log' else np.asarray(teacher, dtype=np.float64)
+    edges = bin_edges(X, max_bins)
+    n_features, n_slots = edges.shape[0], edges.shape[1] + 2
+    empty = LookupSurrogate(edges, np.zeros((n_features, n_slots)), 0.0, link)
+
+    slots = np.ascontiguousarray(empty.slots(X).T)
+    design = sparse.csr_matrix(
+        (np.ones(slots.size), slots.ravel(), np.arange(0, slots.size + 1, n_features)),
+        shape=(len(X), n_features * n_slots)
+    )
+    # The intercept is the target mean, so the penalty only shrinks bin values
+    intercept = target.mean()
+    values = lsqr(design, target - intercept, damp=np.sqrt(ridge), atol=1e-8, btol=1e-8)[0]
+    return LookupSurrogate(edges, values.reshape(n_features, n_slots), intercept, link)
+
+def fidelity(surrogate_pred, full_pred, y=None):
+    """
+    How closely the surrogate tracks the full model
+
+    Returns:
+        dict of absolute errors (GBP), relative error, R^2 and Spearman rank
+        correlation against the full model, and RMSE of both against actual
+        prices when y is given
+    """
+    surrogate_pred = np.asarray(surrogate_pred, dtype=np.float64)
+    full_pred = np.asarray(full_pred, dtype=np.float64)
+    error = surrogate_pred - full_pred
+    relative = np.abs(error) / np.maximum(np.abs(full_pred), MIN_PRICE)
+    ranks = [pd.Series(values).rank().to_numpy() for values in (surrogate_pred, full_pred)]
+    metrics = {
+        'n_rows': len(error),
+        'mean_abs_error': float(np.abs(error).mean()),
+        'p95_abs_error': float(np.quantile(np.abs(error), 0.95)),
+        'max_abs_error': float(np.abs(error).max()),
+        'median_rel_error': float(np.median(relative)),
+        'within_10pct': float((relative <= 0.1).mean()),
+        'r2': float(1 - (error ** 2).sum() / ((full_pred - full_pred.mean()) ** 2).sum()),
+        'spearman': float(np.corrcoef(ranks[0], ranks[1])[0, 1])
+    }
+    if y is not None:
+        y = np.asarray(y, dtype=np.float64)
+        metrics['rmse_vs_price'] = float(np.sqrt(((surrogate_pred - y) ** 2).mean()))
+        metrics['full_rmse_vs_price'] = float(np.sqrt(((full_pred - y) ** 2).mean()))
+    return metrics
+
+def submission_rows(bundle, n, seed=0):
+    """
+    Scaled feature rows for app form submissions (loadtest.sample_submissions)
+    built by the serving pipeline, which fills what the form cannot express
+    with defaults and so scores inputs the processed listings do not contain
+    """
+    import loadtest
+
+    layout = preprocessing.compile_feature_layout(bundle.feature_columns, bundle.defaults)
+    matrix = np.empty((n, len(bundle.feature_columns)))
+    for row, user_data in enumerate(loadtest.sample_submissions(n, seed=seed)):
+        preprocessing.build_feature_vector(user_data, bundle.defaults, layout, out=matrix[row])
+    return bundle.scaler.transform(layout.to_frame(matrix)).astype(np.float32)
+
+def distill(bundle, data, link='log', augment=AUGMENT_ROWS, submissions=SUBMISSION_ROWS, seed=0):
+    """
+    Fit a surrogate to a bundle's model over the processed listings'
+    training split, augmented rows and form submissions, and measure its
+    fidelity on the test split and on separately sampled submissions
+
+    Returns:
+        (LookupSurrogate, {'listings': fidelity dict, 'submissions': fidelity dict})
+    """
+    import tuning
+
+    X = bundle.scaler.transform(data[bundle.feature_columns]).astype(np.float32)
+    train, _, test = tuning.split_indices(len(X))
+    parts = [X[train]]
+    if augment:
+        parts.append(augment_rows(X[train], augment, seed))
+    if submissions:
+        parts.append(submission_rows(bundle, submissions, seed))
+    X_fit = np.vstack(parts)
+    surrogate = fit_surrogate(X_fit, bundle.model.predict(X_fit), link)
+
+    held_out = submission_rows(bundle, HOLDOUT_SUBMISSIONS, seed + 1)
+    metrics = {
+        'listings': fidelity(surrogate.predict(X[test]), bundle.model.predict(X[test]),
+                             data[tuning.TARGET_COLUMN].to_numpy()[test]),
+        'submissions': fidelity(surrogate.predict(held_out), bundle.model.predict(held_out))
+    }
+    return surrogate, metrics
+
+def export_surrogate_bundle(path, source=None, data_path=TRAINING_DATA_PATH, link='log', augment=AUGMENT_ROWS,
+                            submissions=SUBMISSION_ROWS, seed=0, metadata=None):
+    """
+    Distil a bundle's model and save the surrogate as a bundle of its own,
+    with its fidelity in the manifest
+
+    Returns:
+        (manifest dict, fidelity dicts)
+    """
+    bundle = artifacts.load_bundle(source)
+    surrogate, metrics = distill(bundle, pd.read_csv(data_path), link, augment, submissions, seed)
+    metadata = {
+        'family': 'surrogate',
+        'link': link,
+        'source_version': artifacts.model_version(source),
+        'nbytes': surrogate.nbytes,
+        'fidelity': metrics,
+        **(metadata or {})
+    }
+    return artifacts.save_bundle(path, surrogate, bundle.scaler, bundle.feature_columns, bundle.defaults,
+                                 metadata), metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bundle', default=os.path.join('bundles', 'surrogate'))
+    parser.add_argument('--source', default=None, help="bundle with the full model (default: the original deployment)")
+    parser.add_argument('--link', default='log', choices=LINKS)
+    parser.add_argument('--augment', type=int, default=AUGMENT_ROWS, help="perturbed listings labelled by the full model")
+    parser.add_argument('--submissions', type=int, default=SUBMISSION_ROWS,
+                        help="form submissions labelled by the full model")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # Distil through the importable module so the pickled model does not reference __main__
+    import surrogate
+    manifest, metrics = surrogate.export_surrogate_bundle(args.bundle, args.source, link=args.link,
+                                                          augment=args.augment, submissions=args.submissions,
+                                                          seed=args.seed)
+    print(f"Saved surrogate ({manifest['metadata']['nbytes'] / 1024:.0f} KB, {args.link} link) to {args.bundle}")
+    for held_out, values in metrics.items():
+        print(f"fidelity vs the full model on {values['n_rows']:,} held-out {held_out}:")
+        print('  ' + ', '.join(f"{name} {value:.3f}" for name, value in values.items() if name != 'n_rows'))
@@ -0,0 +1,177 @@
+"""
+Hashed n-gram features for listing names and descriptions
+
+Word unigrams and bigrams are hashed straight into fixed column ranges (the
+hashing trick), so there is no vocabulary to fit, store or keep in sync:
+any process hashes any text to the same columns. The output is a scipy CSR
+matrix that is stacked next to the dense model features and handed to
+XGBoost as is, never densified.
+
+Large corpora are hashed chunk by chunk, optionally across processes, and
+written as one .npz shard per chunk, so memory depends on the chunk size
+rather than the corpus size.
+
+Run with: python text_hashing.py listings.csv --output text_hashed --n-jobs 4
+"""
+
+import argparse
+import glob
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+
+import batch_preprocessing
+
+# user_data key -> hashed columns reserved for it (a power of two)
+HASHED_FIELDS = {
+    'name': 2**12,
+    'description': 2**16
+}
+
+# Rows hashed per chunk (one shard file each)
+CHUNK_ROWS = 20000
+
+
+def build_hasher(n_features):
+    """
+    Stateless vectorizer: lowercase word 1-2 grams, counts scaled to unit
+    length per field so long descriptions do not outweigh short ones
+    """
+    return HashingVectorizer(n_features=n_features, ngram_range=(1, 2), alternate_sign=False,
+                             norm='l2', dtype=np.float32)
+
+# Built once per process; workers forked after import inherit them
+HASHERS = {field: build_hasher(n_features) for field, n_features in HASHED_FIELDS.items()}
+
+
+def n_hashed_columns(fields=HASHED_FIELDS):
+    return sum(fields.values())
+
+def _texts(values):
+    """Strings with missing values as empty text"""
+    return ['' if value is None or value != value else str(value) for value in values]
+
+def hash_texts(texts, fields=HASHED_FIELDS):
+    """
+    Hashed n-gram matrix for a batch of texts
+
+    Args:
+        texts: dict of field -> sequence of raw strings (None/NaN for
+            missing), or a DataFrame with those columns; absent fields give
+            empty columns
+
+    Returns:
+        float32 CSR matrix (rows x n_hashed_columns(fields)), fields in
+        HASHED_FIELDS order
+    """
+    n_rows = len(texts) if isinstance(texts, pd.DataFrame) else len(next(iter(texts.values())))
+    blocks = []
+    for field, n_features in fields.items():
+        if field in texts:
+            hasher = HASHERS[field] if n_features == HASHED_FIELDS.get(field) else build_hasher(n_features)
+            blocks.append(hasher.transform(_texts(texts[field])))
+        else:
+            blocks.append(sp.csr_matrix((n_rows, n_features), dtype=np.float32))
+    return sp.hstack(blocks, format='csr', dtype=np.float32)
+
+def stack_features(dense, hashed):
+    """
+    Dense model features followed by the hashed text columns, as one CSR
+    matrix that XGBoost (and scikit-learn) accept without densifying
+
+    Every dense cell is stored, zeros included: XGBoost treats entries
+    absent from a sparse matrix as missing, and RobustScaler maps each
+    feature's median to exactly 0.
+    """
+    dense = np.asarray(dense.to_numpy() if isinstance(dense, pd.DataFrame) else dense, dtype=np.float32)
+    n_rows, n_dense = dense.shape
+    block = sp.csr_matrix((dense.ravel(), np.tile(np.arange(n_dense, dtype=np.int32), n_rows),
+                           np.arange(0, n_rows * n_dense + 1, n_dense, dtype=np.int64)), shape=dense.shape)
+    return sp.hstack([block, hashed], format='csr', dtype=np.float32)
+
+# Streaming
+
+
+def _text_columns(chunk, fields):
+    """Only the raw strings of a chunk travel to a worker"""
+    return {field: _texts(chunk[field]) for field in fields if field in chunk}
+
+def iter_hashed_chunks(chunks, n_jobs=1, fields=HASHED_FIELDS):
+    """
+    Hash an iterable of DataFrame chunks, yielding one CSR matrix per chunk
+    in input order
+
+    With n_jobs > 1 chunks are hashed in a process pool with at most two
+    chunks per worker in flight, so a lazy input (pd.read_csv with
+    chunksize) is never read far ahead of the consumer.
+
+    Args:
+        chunks: iterable of DataFrames with name and/or description columns
+        n_jobs: worker processes (1 runs in-process, None uses every core)
+    """
+    if n_jobs == 1:
+        for chunk in chunks:
+            yield hash_texts(_text_columns(chunk, fields), fields)
+        return
+
+    n_jobs = n_jobs or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=n_jobs, mp_context=batch_preprocessing._pool_context()) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(hash_texts, _text_columns(chunk, fields), fields))
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def hash_csv(path, output_dir, chunk_rows=CHUNK_ROWS, n_jobs=1, fields=HASHED_FIELDS):
+    """
+    Hash the text columns of a listings CSV into numbered .npz shards
+
+    Returns:
+        dict of run statistics
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(output_dir, 'part-*.npz')):
+        os.remove(stale)
+
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = [field for field in fields if field in header]
+    if not usecols:
+        raise ValueError(f"{path} has none of the text columns {list(fields)}")
+    chunks = pd.read_csv(path, usecols=usecols, chunksize=chunk_rows, dtype=str)
+
+    rows = nonzeros = shards = 0
+    for matrix in iter_hashed_chunks(chunks, n_jobs, fields):
+        sp.save_npz(os.path.join(output_dir, f'part-{shards:05d}.npz'), matrix)
+        rows += matrix.shape[0]
+        nonzeros += matrix.nnz
+        shards += 1
+    return {'rows': rows, 'shards': shards, 'columns': n_hashed_columns(fields), 'nonzeros': nonzeros}
+
+def load_hashed(output_dir):
+    """Shards written by hash_csv, stacked back in row order"""
+    shards = sorted(glob.glob(os.path.join(output_dir, 'part-*.npz')))
+    return sp.vstack([sp.load_npz(shard) for shard in shards], format='csr')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('listings', help="CSV with name and/or description columns")
+    parser.add_argument('--output', default='text_hashed', help="directory for the .npz shards")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--n-jobs', type=int, default=1, help="worker processes (0 uses every core)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = hash_csv(args.listings, args.output, args.chunk_rows, args.n_jobs or None)
+    elapsed = time.perf_counter() - start
+    print(f"{stats['rows']:,} listings hashed into {stats['columns']:,} columns in {elapsed:.1f}s "
+          f"({stats['rows'] / elapsed:,.0f} rows/s): {stats['shards']} shards, "
+          f"{stats['nonzeros'] / max(stats['rows'], 1):.0f} non-zeros per row, written to {args.output}")
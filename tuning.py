@@ -0,0 +1,396 @@
+"""
+Hyperparameter search over the processed dataset with parallel, resumable
+and pruned trials; the winning configuration is saved as an artifact bundle
+
+Run with: python tuning.py --trials 25 --bundle bundles/tuned
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import RobustScaler
+
+import artifacts
+import audit_log
+import dedup
+
+TRAINING_DATA_PATH = 'airbnb_processed_data.csv'
+TARGET_COLUMN = 'price'
+CHECKPOINT_PATH = 'tuning_trials.jsonl'
+
+# Search spaces (sampled uniformly per parameter)
+
+SEARCH_SPACES = {
+    'xgboost': {
+        'n_estimators': [100, 200, 300, 500],
+        'max_depth': [3, 4, 5, 6, 8],
+        'learning_rate': [0.03, 0.05, 0.1, 0.2, 0.3],
+        'subsample': [0.7, 0.8, 1.0],
+        'colsample_bytree': [0.5, 0.7, 1.0],
+        'min_child_weight': [1, 3, 5],
+        'reg_lambda': [0.5, 1.0, 5.0]
+    },
+    'random_forest': {
+        'n_estimators': [100, 200, 300],
+        'max_depth': [None, 10, 20],
+        'min_samples_split': [2, 5, 10],
+        'min_samples_leaf': [1, 2, 4],
+        'max_features': [None, 'sqrt', 0.5]
+    }
+}
+
+# Pruning: validation RMSE is checked after these fractions of n_estimators
+RUNG_FRACTIONS = (0.25, 0.5)
+# A trial is pruned at a rung if it is worse than this quantile of earlier trials there
+PRUNE_QUANTILE = 0.5
+# Trials per family that always run to completion before pruning starts
+MIN_TRIALS_BEFORE_PRUNING = 4
+
+
+def sample_config(family, trial, seed):
+    """Parameters for one trial; the same (seed, trial) always gives the same config"""
+    rng = np.random.default_rng([seed, trial])
+    return {name: values[rng.integers(len(values))] for name, values in SEARCH_SPACES[family].items()}
+
+# Data
+
+
+def split_indices(n_rows, seed=42):
+    """60/20/20 train/validation/test row indices"""
+    train, rest = train_test_split(np.arange(n_rows), test_size=0.4, random_state=seed)
+    val, test = train_test_split(rest, test_size=0.5, random_state=seed)
+    return train, val, test
+
+def read_training_data(data_path=TRAINING_DATA_PATH, near_duplicates='keep'):
+    """
+    Processed listings, optionally with near-duplicate listings removed
+    (near_duplicates='drop' keeps the first listing of each group)
+    """
+    data = pd.read_csv(data_path)
+    if near_duplicates == 'drop':
+        data = dedup.drop_near_duplicates(data).reset_index(drop=True)
+    return data
+
+def load_dataset(feature_columns, data_path=TRAINING_DATA_PATH, seed=42, near_duplicates='keep'):
+    """
+    Train/validation/test split scaled with a RobustScaler fit on train
+
+    Returns:
+        dict of float32 arrays (X_train, y_train, X_val, y_val, X_test, y_test)
+    """
+    data = read_training_data(data_path, near_duplicates)
+    X = data[feature_columns].to_numpy(dtype=np.float64)
+    y = data[TARGET_COLUMN].to_numpy(dtype=np.float64)
+    train, val, test = split_indices(len(data), seed)
+
+    scaler = RobustScaler().fit(X[train])
+    arrays = {}
+    for name, rows in (('train', train), ('val', val), ('test', test)):
+        arrays[f'X_{name}'] = scaler.transform(X[rows]).astype(np.float32)
+        arrays[f'y_{name}'] = y[rows].astype(np.float32)
+    return arrays
+
+def share_arrays(arrays):
+    """
+    Copy arrays into shared memory once so workers can map them without pickling
+
+    Returns:
+        (blocks, spec) where blocks must be closed and unlinked by the caller
+        and spec is passed to worker processes
+    """
+    blocks = []
+    spec = {}
+    for name, array in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        spec[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, spec
+
+# Worker side
+
+# Per-process state: shared arrays plus DMatrix objects built once per worker
+_WORKER = {}
+
+
+def _init_worker(spec):
+    """Pool initializer: attach to the shared arrays"""
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _WORKER[f'{name}_block'] = block
+        _WORKER[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+def _dmatrices():
+    if 'dtrain' not in _WORKER:
+        _WORKER['dtrain'] = xgb.DMatrix(_WORKER['X_train'], label=_WORKER['y_train'], nthread=1)
+        _WORKER['dval'] = xgb.DMatrix(_WORKER['X_val'], nthread=1)
+    return _WORKER['dtrain'], _WORKER['dval']
+
+def _rmse(y_true, y_pred):
+    return float(np.sqrt(mean_squared_error(y_true, y_pred)))
+
+def _rung_rounds(n_estimators):
+    return [max(1, int(n_estimators * fraction)) for fraction in RUNG_FRACTIONS] + [n_estimators]
+
+def _run_xgboost(params, thresholds, seed):
+    dtrain, dval = _dmatrices()
+    booster_params = {
+        'objective': 'reg:squarederror',
+        'max_depth': params['max_depth'],
+        'eta': params['learning_rate'],
+        'subsample': params['subsample'],
+        'colsample_bytree': params['colsample_bytree'],
+        'min_child_weight': params['min_child_weight'],
+        'lambda': params['reg_lambda'],
+        'nthread': 1,
+        'seed': seed
+    }
+
+    booster = None
+    done = 0
+    scores = []
+    for rung, rounds in enumerate(_rung_rounds(params['n_estimators'])):
+        # Continue boosting from the previous rung
+        booster = xgb.train(booster_params, dtrain, num_boost_round=rounds - done, xgb_model=booster)
+        done = rounds
+        predictions = booster.predict(dval)
+        scores.append(_rmse(_WORKER['y_val'], predictions))
+        if rung < len(thresholds) and thresholds[rung] is not None and scores[-1] > thresholds[rung]:
+            return 'pruned', scores, None
+    return 'complete', scores, predictions
+
+def _run_random_forest(params, thresholds, seed):
+    model = RandomForestRegressor(
+        max_depth=params['max_depth'],
+        min_samples_split=params['min_samples_split'],
+        min_samples_leaf=params['min_samples_leaf'],
+        max_features=params['max_features'],
+        warm_start=True,
+        n_jobs=1,
+        random_state=seed
+    )
+
+    scores = []
+    for rung, n_trees in enumerate(_rung_rounds(params['n_estimators'])):
+        # warm_start adds trees to the existing forest
+        model.set_params(n_estimators=n_trees)
+        model.fit(_WORKER['X_train'], _WORKER['y_train'])
+        predictions = model.predict(_WORKER['X_val'])
+        scores.append(_rmse(_WORKER['y_val'], predictions))
+        if rung < len(thresholds) and thresholds[rung] is not None and scores[-1] > thresholds[rung]:
+            return 'pruned', scores, None
+    return 'complete', scores, predictions
+
+TRIAL_RUNNERS = {
+    'xgboost': _run_xgboost,
+    'random_forest': _run_random_forest
+}
+
+
+def run_trial(trial, family, params, thresholds, seed):
+    """
+    Train one configuration, stopping early at a rung where it is losing
+
+    Args:
+        thresholds: validation RMSE per rung above which the trial is pruned
+            (None entries never prune)
+
+    Returns:
+        JSON-serialisable trial record
+    """
+    start = time.perf_counter()
+    status, rung_rmse, predictions = TRIAL_RUNNERS[family](params, thresholds, seed)
+    record = {
+        'trial': trial,
+        'family': family,
+        'params': params,
+        'status': status,
+        'rung_rmse': rung_rmse,
+        'val_rmse': rung_rmse[-1] if status == 'complete' else None,
+        'val_r2': float(r2_score(_WORKER['y_val'], predictions)) if status == 'complete' else None,
+        'seconds': time.perf_counter() - start
+    }
+    return record
+
+# Search driver
+
+
+def read_checkpoint(path, header):
+    """Completed trial records from a checkpoint written by the same search"""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    if not lines or lines[0] != {'search': header}:
+        raise ValueError(f"{path} was written by a different search; remove it or choose another --checkpoint")
+    return lines[1:]
+
+def prune_thresholds(records, family):
+    """Per-rung RMSE thresholds from earlier trials of the same family"""
+    history = [r['rung_rmse'] for r in records if r['family'] == family]
+    if len(history) < MIN_TRIALS_BEFORE_PRUNING:
+        return [None] * len(RUNG_FRACTIONS)
+    thresholds = []
+    for rung in range(len(RUNG_FRACTIONS)):
+        scores = [h[rung] for h in history if len(h) > rung]
+        thresholds.append(float(np.quantile(scores, PRUNE_QUANTILE)) if scores else None)
+    return thresholds
+
+def _pool_context():
+    """Fork where available so workers inherit the imported libraries"""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('fork' if 'fork' in methods else None)
+
+def run_search(data, n_trials=25, families=('xgboost',), workers=None, checkpoint=CHECKPOINT_PATH,
+               seed=42, data_version=None):
+    """
+    Run (or resume) a random search
+
+    Trials already in the checkpoint are skipped; every finished trial is
+    appended to the checkpoint as soon as it completes.
+
+    Args:
+        data: arrays from load_dataset
+        n_trials: total trials including those already checkpointed
+        families: model families, assigned to trials round-robin
+        workers: processes (None uses every core, 1 runs in-process)
+
+    Returns:
+        list of all trial records
+    """
+    header = {'seed': seed, 'families': list(families), 'data_version': data_version}
+    records = read_checkpoint(checkpoint, header)
+    done = {r['trial'] for r in records}
+    pending = [t for t in range(n_trials) if t not in done]
+
+    if not records:
+        with open(checkpoint, 'w') as f:
+            f.write(json.dumps({'search': header}) + '\n')
+
+    def submit_args(trial):
+        family = families[trial % len(families)]
+        return trial, family, sample_config(family, trial, seed), prune_thresholds(records, family), seed
+
+    def save(record):
+        records.append(record)
+        with open(checkpoint, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        print(f"trial {record['trial']:>3} {record['family']:<13} {record['status']:<8} "
+              f"val_rmse={record['rung_rmse'][-1]:.2f} ({record['seconds']:.1f}s)")
+
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        _WORKER.clear()
+        _WORKER.update(data)
+        for trial in pending:
+            save(run_trial(*submit_args(trial)))
+        return records
+
+    blocks, spec = share_arrays(data)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context(),
+                                 initializer=_init_worker, initargs=(spec,)) as pool:
+            # Keep one trial per worker in flight so thresholds reflect the latest results
+            queue = list(pending)
+            running = set()
+            while queue or running:
+                while queue and len(running) < workers:
+                    running.add(pool.submit(run_trial, *submit_args(queue.pop(0))))
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    save(future.result())
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return records
+
+def best_trial(records):
+    """Completed trial with the lowest validation RMSE"""
+    complete = [r for r in records if r['status'] == 'complete']
+    if not complete:
+        raise ValueError("No completed trials to choose from")
+    return min(complete, key=lambda r: r['val_rmse'])
+
+def build_model(family, params, seed=42):
+    """Unfitted estimator for a trial configuration"""
+    if family == 'xgboost':
+        return xgb.XGBRegressor(objective='reg:squarederror', random_state=seed, **params)
+    return RandomForestRegressor(random_state=seed, n_jobs=-1, **params)
+
+def export_bundle(path, family, params, feature_columns, defaults, metadata=None,
+                  data_path=TRAINING_DATA_PATH, seed=42, near_duplicates='keep'):
+    """
+    Refit a configuration on train + validation and save a bundle
+
+    The scaler is refit on the same rows; the held-out test split is scored
+    and recorded in the manifest alongside metadata.
+    """
+    data = read_training_data(data_path, near_duplicates)
+    X = data[feature_columns]
+    y = data[TARGET_COLUMN]
+    train, val, test = split_indices(len(data), seed)
+    fit_rows = np.concatenate([train, val])
+    X_fit, y_fit = X.iloc[fit_rows], y.iloc[fit_rows]
+    X_test, y_test = X.iloc[test], y.iloc[test]
+
+    scaler = RobustScaler().fit(X_fit)
+    model = build_model(family, params, seed)
+    model.fit(scaler.transform(X_fit), y_fit)
+    predictions = model.predict(scaler.transform(X_test))
+
+    metadata = {
+        'family': family,
+        'params': params,
+        **(metadata or {}),
+        'test_rmse': _rmse(y_test, predictions),
+        'test_r2': float(r2_score(y_test, predictions)),
+        'data_version': audit_log.file_version(data_path),
+        'near_duplicates': near_duplicates
+    }
+    return artifacts.save_bundle(path, model, scaler, feature_columns, defaults, metadata)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trials', type=int, default=25)
+    parser.add_argument('--families', nargs='+', default=['xgboost'], choices=list(SEARCH_SPACES))
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--bundle', default=os.path.join('bundles', 'tuned'))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--near-duplicates', default='keep', choices=['keep', 'drop'],
+                        help="drop keeps one listing per near-duplicate group (see dedup.py)")
+    args = parser.parse_args()
+
+    base = artifacts.load_bundle()
+    data = load_dataset(base.feature_columns, seed=args.seed, near_duplicates=args.near_duplicates)
+    data_version = audit_log.file_version(TRAINING_DATA_PATH)
+    if args.near_duplicates == 'drop':
+        data_version += '+dedup'
+    records = run_search(data, args.trials, args.families, args.workers, args.checkpoint, args.seed,
+                         data_version=data_version)
+
+    winner = best_trial(records)
+    n_pruned = sum(r['status'] == 'pruned' for r in records)
+    print(f"{len(records)} trials ({n_pruned} pruned); best: trial {winner['trial']} "
+          f"{winner['family']} val_rmse={winner['val_rmse']:.2f} {winner['params']}")
+
+    manifest = export_bundle(args.bundle, winner['family'], winner['params'], base.feature_columns, base.defaults,
+                             {'trial': winner['trial'], 'val_rmse': winner['val_rmse']}, seed=args.seed,
+                             near_duplicates=args.near_duplicates)
+    print(f"Saved bundle to {args.bundle}: test RMSE £{manifest['metadata']['test_rmse']:.2f}, "
+          f"R² {manifest['metadata']['test_r2']:.3f}")
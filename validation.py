@@ -0,0 +1,236 @@
+"""
+Declarative input schema and validation for listing data, run before preprocessing
+"""
+
+import numpy as np
+import pandas as pd
+
+import preprocessing
+
+# Property types outside the one-hot list are grouped as 'Other' (all one-hots zero)
+OTHER_PROPERTY_TYPE = 'Other'
+
+# Input schema
+# type: text | category | int | number | bool | date
+# Dates must lie between min and today, or max_days_ahead days after today.
+# Fields are optional (preprocess_user_input has defaults), but if present must pass.
+
+INPUT_SCHEMA = {
+    'name': {'type': 'text', 'max_length': 200},
+    'description': {'type': 'text', 'max_length': 5000},
+    'picture_url': {'type': 'text', 'max_length': 2048},
+    'amenities': {'type': 'text', 'max_length': 20000},
+    'property_type': {'type': 'category', 'choices': preprocessing.PROPERTY_TYPES + [OTHER_PROPERTY_TYPE]},
+    'room_type': {'type': 'category', 'choices': preprocessing.ROOM_TYPES},
+    'neighbourhood_cleansed': {'type': 'category', 'choices': preprocessing.NEIGHBOURHOODS},
+    'host_response_time': {'type': 'category', 'choices': preprocessing.RESPONSE_TIMES},
+    'accommodates': {'type': 'int', 'min': 1, 'max': 16},
+    'bedrooms': {'type': 'int', 'min': 0, 'max': 10},
+    'beds': {'type': 'int', 'min': 0, 'max': 20},
+    'bathrooms': {'type': 'number', 'min': 0, 'max': 10},
+    'number_of_reviews': {'type': 'int', 'min': 0, 'max': 10000},
+    'host_total_listings_count': {'type': 'int', 'min': 1, 'max': 10000},
+    'review_scores_rating': {'type': 'number', 'min': 0, 'max': 5},
+    'review_scores_cleanliness': {'type': 'number', 'min': 0, 'max': 5},
+    'review_scores_accuracy': {'type': 'number', 'min': 0, 'max': 5},
+    'review_scores_checkin': {'type': 'number', 'min': 0, 'max': 5},
+    'review_scores_communication': {'type': 'number', 'min': 0, 'max': 5},
+    'review_scores_location': {'type': 'number', 'min': 0, 'max': 5},
+    'review_scores_value': {'type': 'number', 'min': 0, 'max': 5},
+    # Greater Manchester bounding box (city_schema swaps in another city's)
+    'latitude': {'type': 'number', 'min': 53.30, 'max': 53.70},
+    'longitude': {'type': 'number', 'min': -2.75, 'max': -1.90},
+    'host_since': {'type': 'date', 'min': '2008-01-01'},
+    'stay_date': {'type': 'date', 'min': '2008-01-01', 'max_days_ahead': 730},
+    'host_is_superhost': {'type': 'bool'},
+    'host_identity_verified': {'type': 'bool'},
+    'instant_bookable': {'type': 'bool'}
+}
+
+
+def city_schema(city):
+    """INPUT_SCHEMA with a City's neighbourhoods and bounding box"""
+    if city is None or city == preprocessing.MANCHESTER:
+        return INPUT_SCHEMA
+    min_lat, max_lat, min_lng, max_lng = city.bounds
+    return {
+        **INPUT_SCHEMA,
+        'neighbourhood_cleansed': {'type': 'category', 'choices': list(city.neighbourhoods)},
+        'latitude': {'type': 'number', 'min': min_lat, 'max': max_lat},
+        'longitude': {'type': 'number', 'min': min_lng, 'max': max_lng}
+    }
+
+
+class InputValidationError(ValueError):
+    """Raised when user input fails the schema; errors holds one message per problem"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+# Single record validation
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+def _date_range(spec):
+    """(earliest, latest, description) allowed for a date field"""
+    days_ahead = spec.get('max_days_ahead', 0)
+    latest = pd.Timestamp.now() + pd.Timedelta(days=days_ahead)
+    return pd.Timestamp(spec['min']), latest, f"{spec['min']} to {latest.date() if days_ahead else 'today'}"
+
+def _check_value(field, spec, value):
+    """Return an error message for one value, or None if it is valid"""
+    kind = spec['type']
+
+    if kind == 'text':
+        if not isinstance(value, str):
+            return f"{field}: expected text, got {type(value).__name__}"
+        if len(value) > spec['max_length']:
+            return f"{field}: {len(value)} characters exceeds limit of {spec['max_length']}"
+
+    elif kind == 'category':
+        if value not in spec['choices']:
+            return f"{field}: unknown value {value!r}"
+
+    elif kind in ('int', 'number'):
+        if isinstance(value, bool) or not isinstance(value, (int, float, np.integer, np.floating)):
+            return f"{field}: expected a number, got {type(value).__name__}"
+        if not np.isfinite(value):
+            return f"{field}: must be finite"
+        if kind == 'int' and float(value) != int(value):
+            return f"{field}: expected a whole number, got {value}"
+        if not spec['min'] <= value <= spec['max']:
+            return f"{field}: {value} outside range {spec['min']}-{spec['max']}"
+
+    elif kind == 'bool':
+        if not isinstance(value, (bool, np.bool_, int, np.integer)) or value not in (0, 1):
+            return f"{field}: expected true/false, got {value!r}"
+
+    elif kind == 'date':
+        try:
+            parsed = pd.Timestamp(value)
+        except (TypeError, ValueError):
+            return f"{field}: invalid date {value!r}"
+        earliest, latest, allowed = _date_range(spec)
+        if parsed < earliest or parsed > latest:
+            return f"{field}: {parsed.date()} outside {allowed}"
+
+    return None
+
+def validate_user_input(user_data, schema=INPUT_SCHEMA):
+    """
+    Validate a single user_data dict against the schema
+
+    Raises:
+        InputValidationError listing every failing field
+    """
+    errors = []
+    for field, spec in schema.items():
+        if field not in user_data or _is_missing(user_data[field]):
+            continue
+        error = _check_value(field, spec, user_data[field])
+        if error:
+            errors.append(error)
+
+    if errors:
+        raise InputValidationError(errors)
+
+# Batch validation
+
+
+def _column_errors(field, spec, column):
+    """Vectorised check of one column; returns (bad mask, message per bad row)"""
+    present = column.notna()
+    kind = spec['type']
+
+    if kind == 'text':
+        is_text = column.map(lambda v: isinstance(v, str), na_action='ignore').fillna(True).astype(bool)
+        # Not .str.len(): the accessor raises on columns with no strings at all
+        lengths = column.map(lambda v: len(v) if isinstance(v, str) else 0)
+        too_long = lengths > spec['max_length']
+        bad = present & (~is_text | too_long)
+        messages = np.where(
+            ~is_text, f"{field}: expected text",
+            f"{field}: " + lengths.astype(int).astype(str) + f" characters exceeds limit of {spec['max_length']}"
+        )
+
+    elif kind == 'category':
+        bad = present & ~column.isin(spec['choices'])
+        messages = f"{field}: unknown value " + column.astype(str).map(repr)
+
+    elif kind in ('int', 'number'):
+        # to_numeric would read True/False as 1/0; validate_user_input rejects them
+        is_bool = column.map(lambda v: isinstance(v, (bool, np.bool_)), na_action='ignore').fillna(False).astype(bool)
+        values = pd.to_numeric(column.mask(is_bool), errors='coerce')
+        not_numeric = present & values.isna()
+        out_of_range = values.notna() & ~values.between(spec['min'], spec['max'])
+        not_whole = values.notna() & (values != np.floor(values)) if kind == 'int' else pd.Series(False, index=column.index)
+        bad = not_numeric | out_of_range | not_whole
+        messages = np.where(
+            not_numeric, f"{field}: expected a number",
+            np.where(not_whole, f"{field}: expected a whole number",
+                     f"{field}: " + column.astype(str) + f" outside range {spec['min']}-{spec['max']}")
+        )
+
+    elif kind == 'bool':
+        bad = present & ~column.isin([True, False, 0, 1])
+        messages = f"{field}: expected true/false, got " + column.astype(str)
+
+    elif kind == 'date':
+        parsed = pd.to_datetime(column, errors='coerce')
+        invalid = present & parsed.isna()
+        earliest, latest, allowed = _date_range(spec)
+        out_of_range = parsed.notna() & ((parsed < earliest) | (parsed > latest))
+        bad = invalid | out_of_range
+        messages = np.where(invalid, f"{field}: invalid date", f"{field}: outside {allowed}")
+
+    else:
+        raise ValueError(f"Unknown schema type {kind!r} for {field}")
+
+    return bad.to_numpy(dtype=bool), np.asarray(messages, dtype=object)
+
+def validate_batch(records, schema=INPUT_SCHEMA):
+    """
+    Validate many records at once
+
+    Args:
+        records: DataFrame with one row per listing (or list of user_data dicts)
+        schema: field specifications
+
+    Returns:
+        (valid, errors) where valid is a boolean Series aligned to records
+        and errors maps row index -> list of messages for rejected rows
+    """
+    if not isinstance(records, pd.DataFrame):
+        records = pd.DataFrame(list(records))
+
+    bad_any = np.zeros(len(records), dtype=bool)
+    row_errors = {}
+
+    for field, spec in schema.items():
+        if field not in records.columns:
+            continue
+        bad, messages = _column_errors(field, spec, records[field])
+        if not bad.any():
+            continue
+        bad_any |= bad
+        for position in np.flatnonzero(bad):
+            row_errors.setdefault(records.index[position], []).append(messages[position])
+
+    valid = pd.Series(~bad_any, index=records.index, name='valid')
+    return valid, row_errors
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('records', help="CSV of listing inputs to validate")
+    args = parser.parse_args()
+
+    valid, errors = validate_batch(pd.read_csv(args.records))
+    for row, messages in errors.items():
+        print(f"row {row}: {'; '.join(messages)}")
+    print(f"{valid.sum():,} of {len(valid):,} records valid")